@@ -0,0 +1,330 @@
+import argparse
+import json
+import math
+import multiprocessing as mp
+import os
+import random
+import shutil
+import threading
+import time
+import torch
+import chess
+
+from backend.config import (
+    MODEL_DIR,
+    DEVICE,
+    ARENA_GAMES,
+    ARENA_WORKERS,
+    ARENA_GAMES_PER_TASK,
+    ARENA_OPENING_PLIES,
+    ARENA_MAX_PLIES,
+    ARENA_GATE_SCORE,
+    SERVED_MODEL_PATH,
+    SERVED_MODEL_POLL_INTERVAL
+)
+from backend.game_engine import GameEngine
+from backend.model import model_from_checkpoint, checkpoint_step
+from backend.utils import legal_action_indices, indices_to_mask, action_to_move
+
+_WORKER_MODELS = None
+
+
+def load_player(path: str):
+    """
+    Strict load of a checkpoint for play or serving. Unlike load_model, a
+    missing or unreadable file raises instead of yielding a fresh net that
+    would be scored (and possibly promoted) as if it were the checkpoint.
+    """
+    return model_from_checkpoint(torch.load(path, map_location=DEVICE)).eval()
+
+
+def _init_worker(candidate_path: str, incumbent_path: str):
+    global _WORKER_MODELS
+    # one intra-op thread per worker: parallelism comes from the process pool
+    torch.set_num_threads(1)
+    _WORKER_MODELS = (load_player(candidate_path), load_player(incumbent_path))
+
+
+def _greedy_moves(model, engines):
+    """
+    Highest-probability legal move for each engine's position, one forward
+    pass for all of them. Callers pass only unfinished games; a position
+    without legal moves still yields None rather than raising.
+    """
+    idxs_list = [legal_action_indices(e.board) for e in engines]
+    with torch.no_grad():
+        logits = model(torch.cat([e.state_tensor() for e in engines], dim=0))
+        mask = indices_to_mask(idxs_list, logits.device)
+        best = logits.masked_fill(~mask, -1e9).argmax(dim=-1).tolist()
+    moves = []
+    for engine, idx in zip(engines, best):
+        move = action_to_move(idx, engine.board)
+        if move is None or move not in engine.board.legal_moves:
+            move = next(iter(engine.board.legal_moves), None)
+        moves.append(move)
+    return moves
+
+
+def play_games(candidate, incumbent, seed: int, num_games: int, opening_plies: int = ARENA_OPENING_PLIES,
+               max_plies: int = ARENA_MAX_PLIES) -> list:
+    """
+    Play num_games games in lockstep, batching the positions each model has
+    to move in. Games come in pairs that share a random opening with colours
+    swapped. Moves are greedy, so the openings provide the variety. Returns
+    the candidate's score per game (1, 0.5 or 0) and the number of plies played.
+    """
+    rng = random.Random(seed)
+    games = []
+    opening = []
+    for i in range(num_games):
+        if i % 2 == 0:
+            opening = _random_opening(rng, opening_plies)
+        engine = GameEngine()
+        for move in opening:
+            engine.make_move(move)
+        games.append({"engine": engine, "candidate_white": i % 2 == 0})
+
+    def unfinished(gs):
+        return [g for g in gs if not g["engine"].is_game_over() and len(g["engine"].moves_played) < max_plies]
+
+    active = unfinished(games)
+    while active:
+        for model, is_candidate in ((candidate, True), (incumbent, False)):
+            # re-filter before each side: the other side's move may just have ended a game
+            active = unfinished(active)
+            to_move = [g for g in active
+                       if (g["engine"].board.turn == chess.WHITE) == (g["candidate_white"] == is_candidate)]
+            if not to_move:
+                continue
+            for g, move in zip(to_move, _greedy_moves(model, [g["engine"] for g in to_move])):
+                if move is not None:
+                    g["engine"].make_move(move)
+        active = unfinished(active)
+
+    results = []
+    for g in games:
+        res = g["engine"].result() or "1/2-1/2"        # unfinished at max_plies: adjudicated a draw
+        white_score = {"1-0": 1.0, "0-1": 0.0}.get(res, 0.5)
+        results.append((white_score if g["candidate_white"] else 1.0 - white_score, len(g["engine"].moves_played)))
+    return results
+
+
+def _random_opening(rng: random.Random, plies: int) -> list:
+    while True:
+        engine = GameEngine()
+        for _ in range(plies):
+            if engine.is_game_over():
+                break
+            engine.make_move(rng.choice(engine.legal_moves()))
+        if not engine.is_game_over():
+            return engine.moves_played
+
+
+def _worker_play(task):
+    seed, num_games, opening_plies, max_plies = task
+    candidate, incumbent = _WORKER_MODELS
+    return play_games(candidate, incumbent, seed, num_games, opening_plies, max_plies)
+
+
+# statistics ------------------------------------------------------------------------
+def elo_from_score(score: float) -> float:
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400.0 * math.log10(1.0 / score - 1.0)
+
+
+def elo_estimate(wins: int, draws: int, losses: int, z: float = 1.96) -> dict:
+    """Elo difference (candidate - incumbent) with a normal-approximation confidence interval."""
+    n = wins + draws + losses
+    if n == 0:
+        return {"score": None, "elo": 0.0, "elo_low": None, "elo_high": None}
+    score = (wins + 0.5 * draws) / n
+    var = (wins * (1.0 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / n
+    margin = z * math.sqrt(var / n)
+    return {
+        "score": score,
+        "elo": elo_from_score(score),
+        "elo_low": elo_from_score(score - margin),
+        "elo_high": elo_from_score(score + margin),
+    }
+
+
+# arena / gating ------------------------------------------------------------------------
+class Arena:
+    """
+    Plays a candidate checkpoint against an incumbent across a process
+    pool. Each task plays games_per_task games in lockstep so every forward
+    pass is batched, and results stream back as tasks finish.
+    """
+
+    def __init__(self, candidate_path: str, incumbent_path: str, num_workers: int = ARENA_WORKERS,
+                 games_per_task: int = ARENA_GAMES_PER_TASK, opening_plies: int = ARENA_OPENING_PLIES,
+                 max_plies: int = ARENA_MAX_PLIES, report_every: float = 5.0):
+        self.candidate_path = candidate_path
+        self.incumbent_path = incumbent_path
+        self.num_workers = max(1, int(num_workers))
+        self.games_per_task = max(2, int(games_per_task) // 2 * 2)    # colour-swapped pairs
+        self.opening_plies = opening_plies
+        self.max_plies = max_plies
+        self.report_every = report_every
+
+    def run(self, num_games: int = ARENA_GAMES, seed: int = 0) -> dict:
+        tasks = []
+        remaining = num_games
+        while remaining > 0:
+            n = min(self.games_per_task, remaining)
+            tasks.append((seed + len(tasks), n, self.opening_plies, self.max_plies))
+            remaining -= n
+
+        wins = draws = losses = plies = 0
+        start = time.perf_counter()
+        last_report = start
+        # a worker whose initializer raises is respawned forever: fail here instead
+        for path in (self.candidate_path, self.incumbent_path):
+            load_player(path)
+        ctx = mp.get_context("spawn")
+        with ctx.Pool(processes=min(self.num_workers, len(tasks)), initializer=_init_worker,
+                      initargs=(self.candidate_path, self.incumbent_path)) as pool:
+            for results in pool.imap_unordered(_worker_play, tasks):
+                for score, n_plies in results:
+                    wins += score == 1.0
+                    draws += score == 0.5
+                    losses += score == 0.0
+                    plies += n_plies
+                now = time.perf_counter()
+                if self.report_every and now - last_report >= self.report_every:
+                    done = wins + draws + losses
+                    print(f"arena: {done}/{num_games} games (+{wins} ={draws} -{losses}), "
+                          f"{done / (now - start):.2f} games/s")
+                    last_report = now
+
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        games = wins + draws + losses
+        return {
+            "candidate": self.candidate_path,
+            "incumbent": self.incumbent_path,
+            "games": games,
+            "wins": int(wins),
+            "draws": int(draws),
+            "losses": int(losses),
+            **elo_estimate(wins, draws, losses),
+            "seconds": elapsed,
+            "games_per_sec": games / elapsed,
+            "mean_plies": plies / games if games else 0.0,
+        }
+
+
+def promote(candidate_path: str, served_path: str = SERVED_MODEL_PATH):
+    """Atomically make candidate_path the served model (copy to a temp file, then os.replace)."""
+    os.makedirs(os.path.dirname(served_path) or ".", exist_ok=True)
+    tmp = served_path + ".tmp"
+    shutil.copyfile(candidate_path, tmp)
+    os.replace(tmp, served_path)
+
+
+def gate(candidate_path: str, served_path: str = SERVED_MODEL_PATH, num_games: int = ARENA_GAMES,
+         threshold: float = ARENA_GATE_SCORE, **arena_kwargs) -> dict:
+    """
+    Play candidate against the served model and promote it if its score
+    reaches threshold. With no served model yet the candidate is promoted
+    without a match. Every decision is appended to arena_history.jsonl.
+    """
+    if not os.path.exists(served_path):
+        load_player(candidate_path)      # never promote a file that cannot be served
+        promote(candidate_path, served_path)
+        report = {"candidate": candidate_path, "games": 0, "promoted": True, "reason": "no served model"}
+    else:
+        report = Arena(candidate_path, served_path, **arena_kwargs).run(num_games)
+        report["threshold"] = threshold
+        report["promoted"] = report["score"] is not None and report["score"] >= threshold
+        if report["promoted"]:
+            promote(candidate_path, served_path)
+    report["ts"] = int(time.time())
+    with open(os.path.join(os.path.dirname(served_path) or ".", "arena_history.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps(report) + "\n")
+    return report
+
+
+class ServedModelWatcher:
+    """
+    Polls the served model file and calls on_change(model) whenever a new one
+    is promoted. version counts promotions seen; step is the training step
+    the served checkpoint was saved at (step: that of the file served at start).
+    """
+
+    def __init__(self, path: str = SERVED_MODEL_PATH, on_change=None, interval: float = SERVED_MODEL_POLL_INTERVAL,
+                 step: int = 0):
+        self.path = path
+        self.on_change = on_change
+        self.interval = interval
+        self.version = 0
+        self.step = step
+        self._mtime = self._stat()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _stat(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def poll(self) -> bool:
+        mtime = self._stat()
+        if mtime is None or mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        ckpt = torch.load(self.path, map_location=DEVICE)
+        model = model_from_checkpoint(ckpt).eval()
+        self.step = checkpoint_step(ckpt)
+        self.version += 1
+        if self.on_change is not None:
+            self.on_change(model)
+        return True
+
+    def start(self):
+        def loop():
+            while not self._stop_event.wait(self.interval):
+                try:
+                    self.poll()
+                except Exception as e:
+                    print("Failed loading promoted model:", e)
+        self._thread = threading.Thread(target=loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play two checkpoints against each other, optionally gating promotion")
+    parser.add_argument("--candidate", default=os.path.join(MODEL_DIR, "latest_model.pth"))
+    parser.add_argument("--incumbent", default=SERVED_MODEL_PATH)
+    parser.add_argument("--games", type=int, default=ARENA_GAMES)
+    parser.add_argument("--workers", type=int, default=ARENA_WORKERS)
+    parser.add_argument("--games-per-task", type=int, default=ARENA_GAMES_PER_TASK)
+    parser.add_argument("--opening-plies", type=int, default=ARENA_OPENING_PLIES)
+    parser.add_argument("--max-plies", type=int, default=ARENA_MAX_PLIES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--gate", action="store_true",
+                        help="promote the candidate to the incumbent path if it scores at least --threshold")
+    parser.add_argument("--threshold", type=float, default=ARENA_GATE_SCORE)
+    args = parser.parse_args()
+
+    arena_kwargs = {"num_workers": args.workers, "games_per_task": args.games_per_task,
+                    "opening_plies": args.opening_plies, "max_plies": args.max_plies}
+    if args.gate:
+        report = gate(args.candidate, args.incumbent, args.games, args.threshold, **arena_kwargs)
+    else:
+        report = Arena(args.candidate, args.incumbent, **arena_kwargs).run(args.games, args.seed)
+
+    if report.get("games"):
+        print(f"candidate vs incumbent: +{report['wins']} ={report['draws']} -{report['losses']} "
+              f"(score {report['score']:.3f}), Elo {report['elo']:+.0f} "
+              f"[{report['elo_low']:+.0f}, {report['elo_high']:+.0f}], {report['games_per_sec']:.2f} games/s")
+    if args.gate:
+        print("promoted" if report["promoted"] else "not promoted", f"-> {args.incumbent}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import os
+
+# CPU only: hide any GPU before torch/backend pick a DEVICE
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+import argparse
+import json
+import platform
+import random
+import tempfile
+import time
+import numpy as np
+import torch
+import chess
+
+from backend.config import DATA_DIR, BATCH_SIZE, MODEL_ARCH, BENCH_REGRESSION_THRESHOLD
+from backend.game_engine import GameEngine
+from backend.model import build_model
+from backend.policy import choose_action_for_board
+from backend.replay_buffer import ReplayBuffer
+from backend.trainer import Trainer
+from backend.utils import board_to_tensor, legal_move_mask, planes_to_bitboards, boards_to_tensor
+
+_PIECES = [chess.QUEEN, chess.ROOK, chess.ROOK, chess.BISHOP, chess.KNIGHT, chess.PAWN, chess.PAWN, chess.PAWN]
+
+
+# corpora -----------------------------------------------------------------------------
+def _random_play(rng: random.Random, n: int, min_plies: int, max_plies: int) -> list:
+    boards = []
+    while len(boards) < n:
+        board = chess.Board()
+        target = rng.randint(min_plies, max_plies)
+        while len(board.move_stack) < target and not board.is_game_over():
+            board.push(rng.choice(list(board.legal_moves)))
+        if not board.is_game_over():
+            boards.append(board.copy(stack=False))
+    return boards
+
+
+def _random_placement(rng: random.Random, n: int, make_pieces) -> list:
+    """Kings plus make_pieces(rng) -> [(square, piece)], keeping only valid, undecided positions."""
+    boards = []
+    while len(boards) < n:
+        board = chess.Board(None)
+        board.turn = rng.choice([chess.WHITE, chess.BLACK])
+        wk, bk = rng.sample(chess.SQUARES, 2)
+        board.set_piece_at(wk, chess.Piece(chess.KING, chess.WHITE))
+        board.set_piece_at(bk, chess.Piece(chess.KING, chess.BLACK))
+        for sq, piece in make_pieces(rng):
+            if board.piece_at(sq) is None:
+                board.set_piece_at(sq, piece)
+        if board.is_valid() and not board.is_game_over():
+            boards.append(board)
+    return boards
+
+
+def _endgame_pieces(rng: random.Random):
+    out = []
+    for _ in range(rng.randint(1, 4)):
+        pt = rng.choice(_PIECES)
+        sq = rng.choice(chess.SQUARES[8:56]) if pt == chess.PAWN else rng.choice(chess.SQUARES)
+        out.append((sq, chess.Piece(pt, rng.choice([chess.WHITE, chess.BLACK]))))
+    return out
+
+
+def _promotion_pieces(rng: random.Random):
+    # pawns one step from promotion for both sides, with some pieces to capture on the back ranks
+    out = []
+    for _ in range(rng.randint(1, 3)):
+        out.append((chess.square(rng.randrange(8), 6), chess.Piece(chess.PAWN, chess.WHITE)))
+        out.append((chess.square(rng.randrange(8), 1), chess.Piece(chess.PAWN, chess.BLACK)))
+    for _ in range(rng.randint(0, 3)):
+        out.append((chess.square(rng.randrange(8), 7), chess.Piece(rng.choice(_PIECES[:5]), chess.BLACK)))
+        out.append((chess.square(rng.randrange(8), 0), chess.Piece(rng.choice(_PIECES[:5]), chess.WHITE)))
+    return out
+
+
+def build_corpora(n: int = 200, seed: int = 0) -> dict:
+    """Fixed-seed position sets: name -> list of boards."""
+    return {
+        "opening": _random_play(random.Random(seed), n, 0, 12),
+        "middlegame": _random_play(random.Random(seed + 1), n, 20, 60),
+        "endgame": _random_placement(random.Random(seed + 2), n, _endgame_pieces),
+        "promotion": _random_placement(random.Random(seed + 3), n, _promotion_pieces),
+    }
+
+
+# timing ------------------------------------------------------------------------------
+def time_op(fn, args_list, items_per_call: int = 1, warmup: int = 5, repeat: int = 1) -> dict:
+    """Call fn(*args) for every args in args_list (repeat times) and summarize per-call latency."""
+    for args in args_list[:warmup]:
+        fn(*args)
+    times = []
+    for _ in range(repeat):
+        for args in args_list:
+            t = time.perf_counter()
+            fn(*args)
+            times.append(time.perf_counter() - t)
+    us = np.array(times, dtype=np.float64) * 1e6
+    total = max(float(np.sum(times)), 1e-12)
+    return {
+        "calls": len(times),
+        "p50_us": float(np.percentile(us, 50)),
+        "p99_us": float(np.percentile(us, 99)),
+        "mean_us": float(np.mean(us)),
+        "per_sec": len(times) * items_per_call / total,
+    }
+
+
+def _played_engines(boards_per: int, seed: int) -> list:
+    rng = random.Random(seed)
+    engines = []
+    for plies in (20, 60, 120):
+        for _ in range(boards_per):
+            engine = GameEngine()
+            while len(engine.moves_played) < plies and not engine.is_game_over():
+                engine.make_move(rng.choice(list(engine.legal_moves())))
+            engines.append(engine)
+    return engines
+
+
+def run_benchmarks(positions: int = 200, seed: int = 0, train_steps: int = 30, arch: str = MODEL_ARCH,
+                   buffer_sizes=(10_000, 100_000, 1_000_000)) -> dict:
+    torch.manual_seed(seed)
+    random.seed(seed)
+    corpora = build_corpora(positions, seed)
+    model = build_model(arch).to("cpu").eval()
+    results = {}
+
+    for name, boards in corpora.items():
+        single = [(b,) for b in boards]
+        results[f"board_to_tensor[{name}]"] = time_op(board_to_tensor, single)
+        results[f"legal_move_mask[{name}]"] = time_op(legal_move_mask, single)
+        results[f"choose_action_for_board[{name}]"] = time_op(
+            lambda b: choose_action_for_board(b, model, epsilon=0.0), single)
+
+    # replay buffer filled with the corpora as pseudo-episodes
+    all_boards = [b for boards in corpora.values() for b in boards]
+    packed = planes_to_bitboards(boards_to_tensor(all_boards, device="cpu").numpy())
+    rng = np.random.default_rng(seed)
+    buffer = ReplayBuffer(sampling="uniform")
+    for i in range(0, len(all_boards), 40):
+        chunk = packed[i:i + 40]
+        buffer.add_packed(chunk, rng.integers(0, 4096, len(chunk)).tolist(), float(rng.choice([-1.0, 0.5, 1.0])))
+    results["ReplayBuffer.sample"] = time_op(buffer.sample, [(BATCH_SIZE,)] * 200, items_per_call=BATCH_SIZE)
+
+    trainer = Trainer(build_model(arch).to("cpu"))
+    # the trainer samples from .source, bound at construction; point both at the filled buffer
+    trainer.buffer = trainer.source = buffer
+    results["Trainer.train_step"] = time_op(trainer.train_step, [()] * train_steps, items_per_call=BATCH_SIZE, warmup=3)
+    assert trainer.steps == train_steps + min(3, train_steps), "train_step benchmark did not train"
+
+    engines = _played_engines(10, seed)
+    results["GameEngine.get_move_list"] = time_op(lambda e: e.get_move_list(), [(e,) for e in engines], repeat=20)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.pgn")
+        results["GameEngine.export_pgn"] = time_op(lambda e: e.export_pgn(path), [(e,) for e in engines])
+
+    results.update(bench_sampling_scaling(buffer_sizes, seed=seed))
+
+    return {
+        "meta": {
+            "ts": int(time.time()),
+            "seed": seed,
+            "positions": positions,
+            "arch": arch,
+            "torch": torch.__version__,
+            "threads": torch.get_num_threads(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+
+
+def bench_sampling_scaling(sizes=(10_000, 100_000, 1_000_000), seed: int = 0, calls: int = 200) -> dict:
+    """
+    ReplayBuffer.sample latency for uniform and prioritized (sum-tree) sampling
+    at several fill levels; both should stay roughly flat as the buffer grows.
+    Also times a priority update of one batch.
+    """
+    rng = np.random.default_rng(seed)
+    results = {}
+    for size in sizes:
+        for mode in ("uniform", "prioritized"):
+            buffer = ReplayBuffer(capacity=max(1, size // 50), max_positions=size, sampling=mode)
+            bitboards = rng.integers(0, 2 ** 63, size=(50, 12), dtype=np.uint64)
+            for _ in range(size // 50):
+                buffer.add_packed(bitboards, rng.integers(0, 4096, 50), 1.0)
+            results[f"ReplayBuffer.sample[{mode} n={size}]"] = time_op(
+                buffer.sample, [(BATCH_SIZE,)] * calls, items_per_call=BATCH_SIZE)
+            if mode == "prioritized":
+                batch = buffer.sample(BATCH_SIZE)
+                keys, losses = batch[4].numpy(), rng.random(BATCH_SIZE)
+                results[f"ReplayBuffer.update_priorities[n={size}]"] = time_op(
+                    buffer.update_priorities, [(keys, losses)] * calls, items_per_call=BATCH_SIZE)
+    return results
+
+
+# baselines ---------------------------------------------------------------------------
+def compare(current: dict, baseline: dict, threshold: float = BENCH_REGRESSION_THRESHOLD) -> list:
+    """Ops whose p50 got slower than baseline by more than threshold (fractional), as report rows."""
+    rows = []
+    for name, cur in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if old is None or not old.get("p50_us"):
+            continue
+        ratio = cur["p50_us"] / old["p50_us"]
+        rows.append({"op": name, "old_p50_us": old["p50_us"], "new_p50_us": cur["p50_us"],
+                     "ratio": ratio, "regressed": ratio > 1.0 + threshold})
+    return rows
+
+
+def print_results(report: dict):
+    print(f"{'op':<50} {'p50 us':>10} {'p99 us':>10} {'per sec':>12}")
+    for name, r in report["results"].items():
+        print(f"{name:<50} {r['p50_us']:>10.1f} {r['p99_us']:>10.1f} {r['per_sec']:>12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU benchmarks for the backend hot paths")
+    parser.add_argument("--positions", type=int, default=200, help="positions per corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--train-steps", type=int, default=30)
+    parser.add_argument("--arch", default=MODEL_ARCH)
+    parser.add_argument("--buffer-sizes", type=int, nargs="*", default=[10_000, 100_000, 1_000_000],
+                        help="replay buffer fill levels for the uniform vs prioritized sampling benchmark")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = torch default)")
+    parser.add_argument("--out", default=os.path.join(DATA_DIR, "bench_latest.json"), help="where to save results")
+    parser.add_argument("--baseline", help="previous results to compare against")
+    parser.add_argument("--threshold", type=float, default=BENCH_REGRESSION_THRESHOLD,
+                        help="fail if an op's p50 is slower than the baseline by more than this fraction")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    report = run_benchmarks(args.positions, args.seed, args.train_steps, args.arch, args.buffer_sizes)
+    print_results(report)
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold)
+        for r in rows:
+            flag = "REGRESSED" if r["regressed"] else ""
+            print(f"{r['op']:<50} {r['old_p50_us']:>10.1f} -> {r['new_p50_us']:>10.1f} ({r['ratio']:.2f}x) {flag}")
+        regressed = [r["op"] for r in rows if r["regressed"]]
+        if regressed:
+            raise SystemExit(f"{len(regressed)} op(s) regressed by more than {args.threshold:.0%}: {', '.join(regressed)}")
+
+
+if __name__ == "__main__":
+    main()
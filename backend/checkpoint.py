@@ -0,0 +1,171 @@
+import glob
+import os
+import threading
+import time
+import torch
+
+from backend.config import MODEL_DIR, CHECKPOINT_KEEP, CHECKPOINT_MIN_INTERVAL, CHECKPOINT_EVERY_STEPS
+from backend.model import model_checkpoint
+from backend.profiling import timed
+
+
+def _clone_to_cpu(obj):
+    """Deep-copy a (nested) state dict, moving every tensor to CPU."""
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: _clone_to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_clone_to_cpu(v) for v in obj)
+    return obj
+
+
+def atomic_torch_save(obj, path: str):
+    """torch.save to a temp file in the same directory, then rename over path."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        torch.save(obj, tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints off the hot path.
+
+    request() takes a CPU snapshot of the model/optimizer state when the
+    time/step policy says a save is due and hands it to a writer thread;
+    if a snapshot is still waiting to be written it is replaced, so bursts
+    of requests collapse into one write. Every write updates `filename`
+    (model weights + architecture tag, what load_model reads) and a versioned
+    ckpt_<step>.pth with optimizer state; the newest `keep` are kept.
+    """
+
+    def __init__(self, model, optimizer=None, directory: str = MODEL_DIR, filename: str = "latest_model.pth",
+                 keep: int = CHECKPOINT_KEEP, min_interval: float = CHECKPOINT_MIN_INTERVAL,
+                 every_steps: int = CHECKPOINT_EVERY_STEPS):
+        self.model = model
+        self.optimizer = optimizer
+        self.directory = directory
+        self.filename = filename
+        self.keep = keep
+        self.min_interval = min_interval
+        self.every_steps = every_steps
+
+        self._pending = None
+        self._writing = False
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()     # one writer touches the files at a time
+        self._thread = None
+        self._stopping = False
+
+        self._last_time = time.monotonic()
+        self._last_step = 0
+        self.writes = 0
+        self.coalesced = 0
+
+    # policy ------------------------------------------------------------------------
+    def due(self, step: int) -> bool:
+        if step == self._last_step:
+            return False                        # weights unchanged since the last save
+        if self.every_steps and step - self._last_step >= self.every_steps:
+            return True
+        return time.monotonic() - self._last_time >= self.min_interval
+
+    def _snapshot(self, step: int) -> dict:
+        return {
+            # a regular model checkpoint (load_model reads it) plus training state
+            **model_checkpoint(self.model, _clone_to_cpu(self.model.state_dict()), step),
+            "optimizer": _clone_to_cpu(self.optimizer.state_dict()) if self.optimizer is not None else None,
+            "ts": time.time(),
+        }
+
+    # async API ---------------------------------------------------------------------
+    def request(self, step: int, force: bool = False) -> bool:
+        """Queue a save if one is due (or force). Returns True if a snapshot was taken."""
+        if not force and not self.due(step):
+            return False
+        snapshot = self._snapshot(step)
+        self._last_time = time.monotonic()
+        self._last_step = step
+        self._ensure_thread()
+        with self._cond:
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = snapshot
+            self._cond.notify()
+        return True
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._writer_loop, daemon=True)
+            self._thread.start()
+
+    def _writer_loop(self):
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopping:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                snapshot, self._pending = self._pending, None
+                self._writing = True
+            try:
+                self._write(snapshot)
+            except Exception as e:
+                print("Checkpoint write failed:", e)
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+    def flush(self, timeout: float = 30.0):
+        """Wait until any queued snapshot has been written."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while (self._pending is not None or self._writing) and time.monotonic() < deadline:
+                self._cond.wait(timeout=0.1)
+
+    def stop(self):
+        self.flush()
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=5.0)
+
+    # sync API ----------------------------------------------------------------------
+    def save_now(self, step: int, filename: str = None) -> str:
+        """Snapshot and write synchronously (shutdown, explicit saves). Returns the model path."""
+        snapshot = self._snapshot(step)
+        self._last_time = time.monotonic()
+        self._last_step = step
+        return self._write(snapshot, filename)
+
+    # files -------------------------------------------------------------------------
+    @timed("checkpoint.write")
+    def _write(self, snapshot: dict, filename: str = None) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, filename or self.filename)
+        with self._write_lock:
+            atomic_torch_save(snapshot, os.path.join(self.directory, f"ckpt_{snapshot['step']:08d}.pth"))
+            # the step travels with the model file, so whoever serves it (arena promotion) knows its version
+            atomic_torch_save(model_checkpoint(self.model, snapshot["state_dict"], snapshot["step"]), path)
+            self.writes += 1
+            self._prune()
+        return path
+
+    def versions(self) -> list:
+        """Versioned checkpoint paths, oldest first."""
+        return sorted(glob.glob(os.path.join(self.directory, "ckpt_*.pth")))
+
+    def _prune(self):
+        if not self.keep:
+            return
+        for old in self.versions()[:-self.keep]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
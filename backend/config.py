@@ -1,17 +1,138 @@
+import os
 import torch
 DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 LEARNING_RATE = 1e-4
 BATCH_SIZE = 32
-REPLAY_BUFFER_SIZE = 2000
+REPLAY_BUFFER_SIZE = 2000          # episodes
+REPLAY_BUFFER_POSITIONS = 80000    # positions kept across all episodes (~110 bytes each)
 UPDATE_EVERY_N_GAMES = 1
 EPSILON = 0.05
+SAVE_EVERY_N_GAMES = 5
 
 # ACTION space:
 #  - 64*64 for normal from->to (4096)
 #  - 64*4  for promotions (256)
 ACTION_SIZE = 64*64 + 64*4  # 4096 + 256 = 4352
 
+# Policy network architecture (backend/model.py):
+#  - "dense":  conv trunk + 8192->1024->4352 dense head (original, ~12.8M params)
+#  - "conv":   same trunk, fully convolutional from/to-square head
+#  - "resnet": RES_BLOCKS residual blocks RES_WIDTH channels wide, conv head
+MODEL_ARCH = "dense"
+RES_BLOCKS = 6
+RES_WIDTH = 64
+
 # Use project-root relative directories (the app creates these at runtime)
 MODEL_DIR = "models"
 DATA_DIR = "data"
+
+# Headless self-play (backend/self_play.py)
+SELF_PLAY_WORKERS = os.cpu_count() or 1
+SELF_PLAY_MAX_PLIES = 400      # games longer than this are adjudicated as draws
+SELF_PLAY_REPORT_EVERY = 5.0   # seconds between games/sec reports
+
+# Micro-batching inference server (backend/inference.py)
+INFERENCE_MAX_BATCH = 64
+INFERENCE_MAX_WAIT_MS = 2.0    # how long the first queued request waits for company
+
+# Game sessions served by run.py (backend/sessions.py)
+MAX_SESSIONS = 256
+SESSION_IDLE_TIMEOUT = 30 * 60   # seconds before an untouched game is evicted
+
+# Checkpointing (backend/checkpoint.py)
+CHECKPOINT_KEEP = 5               # versioned ckpt_<step>.pth files to keep
+CHECKPOINT_MIN_INTERVAL = 60.0    # seconds between background saves
+CHECKPOINT_EVERY_STEPS = 500      # ...or sooner after this many train steps
+
+# Metrics log (backend/metrics.py)
+METRICS_RECENT = 500            # recent games / training entries kept in memory
+METRICS_FLUSH_EVERY = 20        # events buffered before an append...
+METRICS_FLUSH_INTERVAL = 10.0   # ...or seconds since the last flush
+METRICS_COMPACT_EVERY = 5000    # log lines before compaction into the snapshot
+
+# Position-keyed policy cache (backend/policy_cache.py)
+POLICY_CACHE_SIZE = 50000       # positions; ~250 bytes each
+
+# Move selection (backend/search.py)
+SEARCH_MODE = "policy"          # "policy": sample the raw policy net, "mcts": policy-guided search
+SEARCH_TIME_BUDGET = 1.0        # seconds per search move
+SEARCH_MAX_NODES = 2000         # node cap per search move (0 = time budget only)
+SEARCH_BATCH_SIZE = 16          # leaves evaluated per forward pass
+SEARCH_C_PUCT = 1.5
+
+# Inference weight snapshots (backend/weights.py)
+WEIGHT_PUBLISH_INTERVAL = 30.0     # seconds between publishing trained weights to inference...
+WEIGHT_PUBLISH_EVERY_STEPS = 0     # ...or after this many train steps (0 = time only)
+
+# Background training (backend/trainer.py, backend/data_pipeline.py)
+TRAIN_INTERVAL = 1.0            # seconds between training bursts (0 = train continuously)
+TRAIN_STEPS_PER_WAKEUP = 1      # optimizer steps per burst
+PREFETCH_WORKERS = 2            # threads assembling batches ahead of the optimizer
+PREFETCH_DEPTH = 8              # ready batches kept queued
+
+# CPU serving model (backend/export.py)
+INFERENCE_MODEL_PATH = os.path.join(MODEL_DIR, "inference_int8.pt")
+QUANTIZED_INFERENCE = False     # serve int8 dynamically quantized weights on CPU
+
+# Benchmarks (backend/bench.py)
+BENCH_REGRESSION_THRESHOLD = 0.10   # p50 slowdown vs. baseline that counts as a regression
+
+# Profiling (backend/profiling.py)
+PROFILE_SAMPLE_INTERVAL_MS = 5.0    # stack sampling period while the sampling profiler is on
+
+# PGN ingestion / supervised pretraining (backend/pgn_ingest.py)
+PGN_INGEST_WORKERS = os.cpu_count() or 1
+PGN_INGEST_CHUNK_GAMES = 64     # games parsed per worker task
+PGN_INGEST_MAX_INFLIGHT = 4     # chunks queued per worker (bounds memory)
+PGN_SHUFFLE_POSITIONS = 200000  # positions held in the pretraining shuffle pool
+
+# On-disk training dataset (backend/dataset.py)
+DATASET_DIR = os.path.join(DATA_DIR, "dataset")
+# Off by default: the first shard preallocates ~112 MB on disk, and training from the dataset
+# samples uniformly, so REPLAY_SAMPLING = "prioritized" and ARCHIVE_REBUILD_BUFFER no longer apply.
+USE_DATASET = False             # persist games to DATASET_DIR and train from it instead of the in-memory buffer
+DATASET_SHARD_POSITIONS = 1_000_000   # rows per shard (~112 MB on disk)
+DATASET_FLUSH_EVERY = 50        # appends between manifest updates
+
+# Checkpoint arena and promotion gating (backend/arena.py)
+ARENA_GAMES = 200
+ARENA_WORKERS = os.cpu_count() or 1
+ARENA_GAMES_PER_TASK = 16       # games a worker plays in lockstep (one batched forward per side per ply)
+ARENA_OPENING_PLIES = 6         # random opening plies, each played with both colours
+ARENA_MAX_PLIES = 300           # longer games are adjudicated as draws
+ARENA_GATE_SCORE = 0.55         # candidate score needed to replace the served model
+SERVED_MODEL_PATH = os.path.join(MODEL_DIR, "best_model.pth")
+GATED_SERVING = False           # serve SERVED_MODEL_PATH (promoted by the arena) instead of live trainer weights
+SERVED_MODEL_POLL_INTERVAL = 10.0   # seconds between checks for a newly promoted model
+
+# Opening book (backend/opening_book.py)
+OPENING_BOOK_PATH = os.path.join(DATA_DIR, "opening_book")    # <path>.npy probe table + build state
+USE_OPENING_BOOK = True         # ai_move plays book moves before asking the network
+OPENING_BOOK_MAX_PLY = 16       # default build depth; counts are kept to 40 plies, so a rebuild can go deeper
+OPENING_BOOK_MIN_WEIGHT = 3     # a move must have been played this often to be kept
+
+# Prioritized replay (backend/replay_buffer.py, backend/sum_tree.py)
+REPLAY_SAMPLING = "uniform"     # "uniform": episode then position, "prioritized": position-level by loss
+PRIORITY_ALPHA = 0.6            # how strongly priorities skew sampling (0 = uniform)
+PRIORITY_BETA = 0.4             # initial importance-sampling exponent...
+PRIORITY_BETA_STEPS = 100000    # ...annealed to 1 over this many train steps
+PRIORITY_EPS = 1e-3             # added to |loss| so no position drops to zero priority
+
+# CPU training performance mode (backend/perf.py, backend/trainer.py)
+TRAIN_THREADS = 0               # intra-op threads set by the training thread (0 = torch default)
+INFERENCE_THREADS = 0           # intra-op threads set by the inference server thread (0 = torch default)
+INTEROP_THREADS = 0             # process-wide inter-op pool, set once at startup (0 = torch default)
+TRAIN_CHANNELS_LAST = False     # channels_last weights/activations for the training forward/backward
+TRAIN_BF16 = False              # bf16 autocast for training on CPUs with native bf16 support
+TRAIN_COMPILE = False           # torch.compile the training model (first steps pay the compile time)
+PERF_PARITY_TOLERANCE = 0.05    # max relative deviation of the smoothed loss curve from eager fp32
+
+# Game archive (backend/game_archive.py)
+ARCHIVE_DIR = os.path.join(DATA_DIR, "archive")
+# On by default: a few bytes per game for moves plus one preallocated index segment (~2.6 MB) at a time.
+USE_ARCHIVE = True              # append every finished game (UI and self-play) to the archive
+ARCHIVE_CHUNK_GAMES = 256       # games per zlib-compressed chunk of moves.bin
+ARCHIVE_SEGMENT_GAMES = 1 << 16 # index rows per preallocated segment file (~2.6 MB); existing archives keep theirs
+ARCHIVE_FLUSH_EVERY = 20        # appends between manifest updates
+ARCHIVE_REBUILD_BUFFER = True   # refill the replay buffer from the archive at startup (ignored with USE_DATASET)
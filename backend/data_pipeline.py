@@ -0,0 +1,70 @@
+import queue
+import threading
+import time
+
+from backend.config import BATCH_SIZE, PREFETCH_WORKERS, PREFETCH_DEPTH, DEVICE
+
+
+class BatchPrefetcher:
+    """
+    Background threads that keep a queue of ready-to-train batches.
+
+    Each worker calls source.sample(batch_size) (ReplayBuffer or anything
+    with the same API), pins the contiguous tensors when training on CUDA
+    and queues them, so train steps only pay for the device copy.
+    """
+
+    def __init__(self, source, batch_size: int = BATCH_SIZE, num_workers: int = PREFETCH_WORKERS,
+                 depth: int = PREFETCH_DEPTH, pin_memory: bool = None):
+        self.source = source
+        self.batch_size = batch_size
+        self.num_workers = max(1, int(num_workers))
+        self.pin_memory = (DEVICE.type == "cuda") if pin_memory is None else pin_memory
+        self._queue = queue.Queue(maxsize=max(1, int(depth)))
+        self._stop_event = threading.Event()
+        self._threads = []
+        self.batches_built = 0
+
+    def _worker(self):
+        while not self._stop_event.is_set():
+            batch = self.source.sample(self.batch_size)
+            if len(batch[0]) == 0:
+                time.sleep(0.05)          # nothing to sample yet
+                continue
+            if self.pin_memory:
+                batch = tuple(t.pin_memory() for t in batch)
+            while not self._stop_event.is_set():
+                try:
+                    self._queue.put(batch, timeout=0.1)
+                    self.batches_built += 1
+                    break
+                except queue.Full:
+                    continue
+
+    def start(self):
+        if self.running():
+            return self
+        self._stop_event.clear()
+        self._threads = [threading.Thread(target=self._worker, daemon=True) for _ in range(self.num_workers)]
+        for t in self._threads:
+            t.start()
+        return self
+
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self._threads)
+
+    def stop(self):
+        self._stop_event.set()
+        for t in self._threads:
+            t.join(timeout=1.0)
+        self._threads = []
+
+    def get(self, timeout: float = None):
+        """Next prefetched (states, actions, rewards) batch, or None if none arrived in time."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
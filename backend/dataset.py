@@ -0,0 +1,207 @@
+import json
+import os
+import threading
+import numpy as np
+import torch
+
+from backend.config import DATASET_DIR, DATASET_SHARD_POSITIONS, DATASET_FLUSH_EVERY
+from backend.store_lock import WriterLock
+from backend.utils import planes_to_bitboards, bitboards_to_planes
+
+# column name -> (dtype, trailing shape)
+COLUMNS = {
+    "boards": (np.uint64, (12,)),
+    "actions": (np.int16, ()),
+    "rewards": (np.float32, ()),
+    "game_ids": (np.int64, ()),
+    "plies": (np.int16, ()),
+}
+MANIFEST_VERSION = 1
+
+
+class ShardedDataset:
+    """
+    Persistent, append-only training set on disk.
+
+    Positions live in fixed-size shards; every shard is one .npy file per
+    column (12 packed uint64 bitboards, action, reward, game id, ply),
+    preallocated to shard_positions rows and opened with numpy.memmap, so
+    random access across shards only pages in the rows it touches.
+    manifest.json records how many rows of each shard are valid and is
+    rewritten (atomically) after the data it covers has been flushed, so
+    a crash loses at most the last flush_every appends.
+
+    Same sampling API as ReplayBuffer: sample(batch_size) draws positions
+    uniformly over the whole dataset.
+
+    Only one process may open a directory for writing at a time (the app
+    and the self-play / PGN ingest CLIs share DATASET_DIR): a second writer
+    raises StoreLockedError. readonly=True readers are not limited.
+    """
+
+    def __init__(self, directory: str = DATASET_DIR, shard_positions: int = DATASET_SHARD_POSITIONS,
+                 flush_every: int = DATASET_FLUSH_EVERY, readonly: bool = False):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.flush_every = flush_every
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        self._unflushed = 0
+        self._writer_lock = None if readonly else WriterLock(directory).acquire()
+
+        self.shard_positions = shard_positions
+        self.shards = []            # [{"name": str, "count": int}]
+        self.next_game_id = 0
+        self.games = 0
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            self.shard_positions = manifest["shard_positions"]
+            self.shards = manifest["shards"]
+            self.next_game_id = manifest.get("next_game_id", 0)
+            self.games = manifest.get("games", 0)
+        elif not readonly:
+            os.makedirs(directory, exist_ok=True)
+
+        self._maps = [self._open_shard(s["name"]) for s in self.shards]
+        self._counts = np.array([s["count"] for s in self.shards], dtype=np.int64)
+        self._ends = np.cumsum(self._counts)
+
+    # shards ------------------------------------------------------------------------------
+    def _column_path(self, shard: str, column: str) -> str:
+        return os.path.join(self.directory, f"{shard}.{column}.npy")
+
+    def _open_shard(self, shard: str) -> dict:
+        mode = "r" if self.readonly else "r+"
+        return {c: np.load(self._column_path(shard, c), mmap_mode=mode) for c in COLUMNS}
+
+    def _new_shard(self):
+        name = f"shard_{len(self.shards):05d}"
+        maps = {}
+        for c, (dtype, shape) in COLUMNS.items():
+            maps[c] = np.lib.format.open_memmap(self._column_path(name, c), mode="w+", dtype=dtype,
+                                                shape=(self.shard_positions,) + shape)
+        self.shards.append({"name": name, "count": 0})
+        self._maps.append(maps)
+        self._counts = np.append(self._counts, 0)
+        self._ends = np.cumsum(self._counts)
+
+    # writing -----------------------------------------------------------------------------
+    def new_game_id(self) -> int:
+        with self._lock:
+            gid = self.next_game_id
+            self.next_game_id += 1
+            self.games += 1
+            return gid
+
+    def add(self, states, actions: list, reward: float, game_id: int = None, first_ply: int = 0):
+        """states: list of (1,12,8,8)/(12,8,8) tensors or a stacked tensor."""
+        if isinstance(states, (list, tuple)):
+            if not states:
+                return
+            states = torch.cat([s.reshape(1, 12, 8, 8) for s in states], dim=0)
+        self.add_packed(planes_to_bitboards(states.detach().cpu().numpy()), actions, reward, game_id, first_ply)
+
+    def add_packed(self, bitboards: np.ndarray, actions, reward: float, game_id: int = None, first_ply: int = 0):
+        """
+        Append one side's positions of a game. Both sides of a game share
+        game_id (from new_game_id()); plies are first_ply, first_ply+2, ...
+        """
+        if self.readonly:
+            raise RuntimeError("dataset opened read-only")
+        n = len(bitboards)
+        if n == 0:
+            return
+        if game_id is None:
+            game_id = self.new_game_id()
+        actions = np.asarray(actions, dtype=np.int16)
+        plies = (first_ply + 2 * np.arange(n)).astype(np.int16)
+
+        with self._lock:
+            done = 0
+            while done < n:
+                if not self.shards or self.shards[-1]["count"] >= self.shard_positions:
+                    self._new_shard()
+                shard, maps = self.shards[-1], self._maps[-1]
+                start = shard["count"]
+                k = min(n - done, self.shard_positions - start)
+                rows = slice(start, start + k)
+                maps["boards"][rows] = bitboards[done:done + k]
+                maps["actions"][rows] = actions[done:done + k]
+                maps["rewards"][rows] = reward
+                maps["game_ids"][rows] = game_id
+                maps["plies"][rows] = plies[done:done + k]
+                shard["count"] += k
+                self._counts[-1] = shard["count"]
+                done += k
+            self._ends = np.cumsum(self._counts)
+            self._unflushed += 1
+            if self.flush_every and self._unflushed >= self.flush_every:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self.readonly:
+            return
+        for maps in self._maps[-2:]:        # only the last shards can have unflushed rows
+            for m in maps.values():
+                m.flush()
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "shard_positions": self.shard_positions,
+            "shards": self.shards,
+            "next_game_id": self.next_game_id,
+            "games": self.games,
+            "positions": int(self._ends[-1]) if len(self._ends) else 0,
+        }
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.manifest_path)
+        self._unflushed = 0
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        self.flush()
+        if self._writer_lock is not None:
+            self._writer_lock.release()
+            self._writer_lock = None
+
+    # reading -----------------------------------------------------------------------------
+    def rows(self, indices: np.ndarray) -> dict:
+        """Columns for global position indices, gathered across shards."""
+        indices = np.asarray(indices, dtype=np.int64)
+        with self._lock:
+            shard_of = np.searchsorted(self._ends, indices, side="right")
+            starts = self._ends - self._counts
+            out = {c: np.empty((len(indices),) + shape, dtype=dtype) for c, (dtype, shape) in COLUMNS.items()}
+            for s in np.unique(shard_of):
+                sel = np.nonzero(shard_of == s)[0]
+                local = indices[sel] - starts[s]
+                for c in COLUMNS:
+                    out[c][sel] = self._maps[s][c][local]
+        return out
+
+    def sample(self, batch_size: int):
+        """
+        Returns (states (batch,12,8,8) float32, actions (batch,) long, rewards (batch,) float32)
+        as CPU tensors, or three empty lists if there is nothing to sample.
+        """
+        total = self.num_positions()
+        if total == 0 or batch_size <= 0:
+            return [], [], []
+        # sorted indices keep the page reads within each shard sequential
+        idx = np.sort(np.random.randint(0, total, size=batch_size))
+        cols = self.rows(idx)
+        perm = np.random.permutation(batch_size)
+        states = torch.from_numpy(bitboards_to_planes(cols["boards"][perm]).astype(np.float32))
+        return (states, torch.from_numpy(cols["actions"][perm].astype(np.int64)),
+                torch.from_numpy(cols["rewards"][perm]))
+
+    def num_positions(self) -> int:
+        return int(self._ends[-1]) if len(self._ends) else 0
+
+    def __len__(self):
+        return self.games
@@ -0,0 +1,135 @@
+import argparse
+import copy
+import os
+import random
+import time
+import warnings
+import numpy as np
+import torch
+import torch.nn as nn
+import chess
+
+from backend.config import MODEL_DIR, INFERENCE_MODEL_PATH
+from backend.model import load_model, model_from_checkpoint, checkpoint_step
+from backend.utils import boards_to_tensor, legal_move_masks
+
+
+def quantize_model(model: nn.Module) -> nn.Module:
+    """int8 dynamic quantization of the Linear layers (fc holds most of the weights). CPU only."""
+    model = copy.deepcopy(model).to("cpu").eval()
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def export_inference_model(checkpoint_path: str, out_path: str = INFERENCE_MODEL_PATH, quantize: bool = True) -> nn.Module:
+    """
+    Build the CPU serving model from a checkpoint: optionally int8-quantized,
+    TorchScript-traced and frozen. Saved to out_path (with the checkpoint's
+    training step as the "step" extra file) and returned.
+    """
+    ckpt = torch.load(checkpoint_path, map_location="cpu")
+    model = model_from_checkpoint(ckpt).to("cpu").eval()
+    if quantize:
+        model = quantize_model(model)
+    example = torch.zeros((1, 12, 8, 8), dtype=torch.float32)
+    with torch.no_grad(), warnings.catch_warnings():
+        # torch.jit is deprecated upstream but still the simplest frozen CPU artifact
+        warnings.simplefilter("ignore", FutureWarning)
+        traced = torch.jit.freeze(torch.jit.trace(model, example))
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    tmp = out_path + ".tmp"
+    traced.save(tmp, _extra_files={"step": str(checkpoint_step(ckpt))})
+    os.replace(tmp, out_path)
+    print(f"Exported inference model to {out_path}")
+    return traced
+
+
+def load_inference_model(path: str = INFERENCE_MODEL_PATH):
+    """(model, step) of an exported serving model; step is 0 for exports that predate it."""
+    extra = {"step": ""}
+    model = torch.jit.load(path, map_location="cpu", _extra_files=extra)
+    return model, int(extra["step"] or 0)
+
+
+def position_corpus(n: int = 256, seed: int = 0, max_plies: int = 80) -> list:
+    """Fixed-seed positions from random play, used for parity and latency checks."""
+    rng = random.Random(seed)
+    boards = []
+    board = chess.Board()
+    target = rng.randint(0, max_plies)
+    while len(boards) < n:
+        if board.is_game_over() or len(board.move_stack) >= target:
+            boards.append(board.copy(stack=False))
+            board = chess.Board()
+            target = rng.randint(0, max_plies)
+            continue
+        board.push(rng.choice(list(board.legal_moves)))
+    return boards
+
+
+def masked_policies(model, boards, batch_size: int = 64) -> torch.Tensor:
+    """(n, ACTION_SIZE) masked softmax of model over boards, on CPU."""
+    out = []
+    with torch.no_grad():
+        for i in range(0, len(boards), batch_size):
+            chunk = boards[i:i + batch_size]
+            logits = model(boards_to_tensor(chunk, device="cpu")).float()
+            mask = legal_move_masks(chunk, device="cpu")
+            out.append(torch.softmax(logits.masked_fill(~mask, -1e9), dim=-1))
+    return torch.cat(out, dim=0)
+
+
+def parity_check(reference, candidate, boards) -> dict:
+    """Top-1 agreement and mean KL(reference || candidate) of the masked policies."""
+    p = masked_policies(reference, boards)
+    q = masked_policies(candidate, boards)
+    top1 = (p.argmax(dim=-1) == q.argmax(dim=-1)).float().mean().item()
+    kl = (p * (torch.log(p.clamp_min(1e-12)) - torch.log(q.clamp_min(1e-12)))).sum(dim=-1)
+    return {"positions": len(boards), "top1_agreement": top1, "kl_mean": kl.mean().item(), "kl_max": kl.max().item()}
+
+
+def measure_latency(model, batch_size: int = 1, iters: int = 50, warmup: int = 5) -> dict:
+    """Forward-pass latency percentiles (ms) on CPU for a given batch size."""
+    x = torch.zeros((batch_size, 12, 8, 8), dtype=torch.float32)
+    times = []
+    with torch.no_grad():
+        for _ in range(warmup):
+            model(x)
+        for _ in range(iters):
+            t = time.perf_counter()
+            model(x)
+            times.append((time.perf_counter() - t) * 1000.0)
+    return {"batch": batch_size, "p50_ms": float(np.percentile(times, 50)), "p99_ms": float(np.percentile(times, 99))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a frozen int8 TorchScript model for CPU serving")
+    parser.add_argument("--checkpoint", default=os.path.join(MODEL_DIR, "latest_model.pth"))
+    parser.add_argument("--out", default=INFERENCE_MODEL_PATH)
+    parser.add_argument("--no-quantize", action="store_true", help="trace/freeze only, keep fp32 weights")
+    parser.add_argument("--positions", type=int, default=256, help="positions for the parity check")
+    parser.add_argument("--min-top1", type=float, default=0.95, help="fail if top-1 agreement is below this")
+    args = parser.parse_args()
+
+    reference = load_model(args.checkpoint).to("cpu").eval()
+    # exported next to the served file and only moved over it once parity passes
+    candidate_path = args.out + ".candidate"
+    exported = export_inference_model(args.checkpoint, candidate_path, quantize=not args.no_quantize)
+
+    parity = parity_check(reference, exported, position_corpus(args.positions))
+    print(f"parity: top-1 agreement {parity['top1_agreement']:.3f}, "
+          f"KL mean {parity['kl_mean']:.5f}, max {parity['kl_max']:.5f} over {parity['positions']} positions")
+    for batch in (1, 32):
+        ref, exp = measure_latency(reference, batch), measure_latency(exported, batch)
+        print(f"latency batch={batch}: fp32 p50 {ref['p50_ms']:.2f} ms -> exported p50 {exp['p50_ms']:.2f} ms "
+              f"({ref['p50_ms'] / max(exp['p50_ms'], 1e-9):.2f}x)")
+
+    if parity["top1_agreement"] < args.min_top1:
+        os.remove(candidate_path)
+        raise SystemExit(f"parity check failed: top-1 agreement {parity['top1_agreement']:.3f} < {args.min_top1}; "
+                         f"{args.out} left unchanged")
+    os.replace(candidate_path, args.out)
+    print(f"Installed {args.out}")
+
+
+if __name__ == "__main__":
+    main()
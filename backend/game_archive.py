@@ -0,0 +1,424 @@
+import argparse
+import calendar
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+import numpy as np
+import chess
+import chess.pgn
+
+from backend.config import (
+    ARCHIVE_DIR,
+    ARCHIVE_CHUNK_GAMES,
+    ARCHIVE_SEGMENT_GAMES,
+    ARCHIVE_FLUSH_EVERY
+)
+from backend.store_lock import WriterLock
+from backend.utils import board_bitboards, move_to_action, action_to_move, game_rewards
+
+# one row per game; the game id is the row number
+INDEX_DTYPE = np.dtype([
+    ("chunk_offset", np.uint64),    # byte offset of the game's compressed chunk in moves.bin
+    ("chunk_len", np.uint32),       # compressed chunk size; 0 while the game is still pending
+    ("move_start", np.uint32),      # first move of the game within the decompressed chunk
+    ("n_moves", np.uint16),
+    ("result", np.int8),            # RESULT_CODES
+    ("players", np.uint8),          # AI_WHITE | AI_BLACK
+    ("ts", np.int64),               # unix seconds when the game was archived
+    ("model_version", np.int32),    # training step of the weights that played (0 if unknown)
+    ("dataset_game_id", np.int64),  # id of the same game in the ShardedDataset, -1 if none
+])
+RESULT_CODES = {"1-0": 1, "0-1": -1, "1/2-1/2": 0, "*": 2}
+RESULT_NAMES = {v: k for k, v in RESULT_CODES.items()}
+AI_WHITE = 1
+AI_BLACK = 2
+MANIFEST_VERSION = 1
+_PENDING_HEADER = np.dtype([("game_id", np.uint64), ("n", np.uint16)])
+
+
+def encode_move(move: chess.Move) -> int:
+    """
+    The move's action index (utils.move_to_action) as uint16. Promotion actions
+    drop the destination, so bits 13-14 keep the direction (0 push, 1 capture
+    towards the a-file, 2 capture towards the h-file) to make decoding exact.
+    """
+    action = move_to_action(move)
+    if move.promotion is not None:
+        df = chess.square_file(move.to_square) - chess.square_file(move.from_square)
+        action |= {0: 0, -1: 1, 1: 2}[df] << 13
+    return action
+
+
+def decode_move(code: int, board: chess.Board) -> chess.Move:
+    action = code & 0x1FFF
+    if action < 64 * 64:
+        return action_to_move(action, board)
+    move = action_to_move(action, board)
+    if move is None:
+        return None
+    df = (0, -1, 1)[(code >> 13) & 3]
+    forward = 8 if board.turn == chess.WHITE else -8
+    return chess.Move(move.from_square, move.from_square + forward + df, move.promotion)
+
+
+class GameArchive:
+    """
+    Append-only store of every finished game.
+
+    Moves are stored as uint16 codes (encode_move) in zlib-compressed chunks
+    of chunk_games games, appended to moves.bin. Games not yet in a chunk
+    are kept in memory and appended to pending.bin, which is sealed into a
+    chunk once it holds chunk_games games. Per-game metadata (result,
+    timestamp, model version, who played, where the moves are) lives in
+    fixed-size INDEX_DTYPE segments opened with numpy.memmap, so lookup by
+    game id is one row read and filters scan only the index columns.
+    manifest.json records the game count and the valid length of
+    moves.bin; pending.bin records carry their game id, so a restart after
+    a crash recovers pending games and ignores stale ones.
+    One process at a time may open a directory for writing (a second writer
+    raises StoreLockedError); readonly=True readers are not limited.
+    """
+
+    def __init__(self, directory: str = ARCHIVE_DIR, chunk_games: int = ARCHIVE_CHUNK_GAMES,
+                 segment_games: int = ARCHIVE_SEGMENT_GAMES, flush_every: int = ARCHIVE_FLUSH_EVERY,
+                 readonly: bool = False):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, "manifest.json")
+        self.moves_path = os.path.join(directory, "moves.bin")
+        self.pending_path = os.path.join(directory, "pending.bin")
+        self.chunk_games = max(1, int(chunk_games))
+        self.flush_every = flush_every
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        self._unflushed = 0
+        # taken before the manifest is read: recovering pending.bin already writes
+        self._writer_lock = None if readonly else WriterLock(directory).acquire()
+
+        self.segment_games = segment_games
+        self.games = 0              # rows in the index
+        self.chunked = 0            # games [0, chunked) are in moves.bin
+        self.moves_bytes = 0
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            self.segment_games = manifest["segment_games"]
+            self.games = manifest["games"]
+            self.chunked = manifest["chunked"]
+            self.moves_bytes = manifest["moves_bytes"]
+        elif not readonly:
+            os.makedirs(directory, exist_ok=True)
+
+        self._segments = []
+        while len(self._segments) * self.segment_games < self.games:
+            self._segments.append(self._open_segment(len(self._segments)))
+        self._pending = OrderedDict()           # game id -> move codes, for games not yet chunked
+        self._chunk_cache = OrderedDict()       # chunk offset -> decompressed codes (a few, for reads)
+        self._recover_pending()
+
+    # storage -----------------------------------------------------------------------------
+    def _segment_path(self, i: int) -> str:
+        return os.path.join(self.directory, f"index_{i:05d}.npy")
+
+    def _open_segment(self, i: int):
+        return np.load(self._segment_path(i), mmap_mode="r" if self.readonly else "r+")
+
+    def _new_segment(self):
+        i = len(self._segments)
+        self._segments.append(np.lib.format.open_memmap(
+            self._segment_path(i), mode="w+", dtype=INDEX_DTYPE, shape=(self.segment_games,)))
+
+    def _row(self, game_id: int):
+        seg, row = divmod(int(game_id), self.segment_games)
+        return self._segments[seg][row]
+
+    def _recover_pending(self):
+        """Reload unchunked games from pending.bin; records already sealed into a chunk are skipped."""
+        if not os.path.exists(self.pending_path):
+            return
+        with open(self.pending_path, "rb") as f:
+            data = f.read()
+        pos = 0
+        while pos + _PENDING_HEADER.itemsize <= len(data):
+            header = np.frombuffer(data, _PENDING_HEADER, count=1, offset=pos)[0]
+            end = pos + _PENDING_HEADER.itemsize + 2 * int(header["n"])
+            if end > len(data):
+                break                           # torn final record
+            gid = int(header["game_id"])
+            if gid >= self.chunked:
+                self._pending[gid] = np.frombuffer(data, np.uint16, count=int(header["n"]),
+                                                   offset=pos + _PENDING_HEADER.itemsize).copy()
+            pos = end
+        if self._pending:
+            # games appended after the last manifest write: their index rows are already in the memmap
+            self.games = max(self.games, max(self._pending) + 1)
+            while len(self._segments) * self.segment_games < self.games:
+                self._segments.append(self._open_segment(len(self._segments)))
+
+    # writing -----------------------------------------------------------------------------
+    def append(self, moves, result: str, model_version: int = 0, players: int = 0,
+               dataset_game_id: int = None, ts: float = None) -> int:
+        """Archive one game (a list of chess.Move from the start position). Returns its game id."""
+        if self.readonly:
+            raise RuntimeError("archive opened read-only")
+        codes = np.array([encode_move(m) for m in moves], dtype=np.uint16)
+        with self._lock:
+            gid = self.games
+            if gid >= len(self._segments) * self.segment_games:
+                self._new_segment()
+            row = self._row(gid)
+            row["chunk_offset"] = 0
+            row["chunk_len"] = 0
+            row["move_start"] = 0
+            row["n_moves"] = len(codes)
+            row["result"] = RESULT_CODES.get(result, RESULT_CODES["*"])
+            row["players"] = players
+            row["ts"] = int(time.time() if ts is None else ts)
+            row["model_version"] = model_version
+            row["dataset_game_id"] = -1 if dataset_game_id is None else dataset_game_id
+
+            header = np.array([(gid, len(codes))], dtype=_PENDING_HEADER)
+            with open(self.pending_path, "ab") as f:
+                f.write(header.tobytes() + codes.tobytes())
+            self._pending[gid] = codes
+            self.games += 1
+            if len(self._pending) >= self.chunk_games:
+                self._seal_locked()
+            else:
+                self._unflushed += 1
+                if self.flush_every and self._unflushed >= self.flush_every:
+                    self._flush_locked()
+        return gid
+
+    def _seal_locked(self):
+        """Compress the pending games into one chunk at the end of moves.bin."""
+        if not self._pending:
+            return
+        gids = list(self._pending)
+        codes = list(self._pending.values())
+        blob = zlib.compress(np.concatenate(codes).tobytes(), 6)
+        mode = "r+b" if os.path.exists(self.moves_path) else "wb"
+        with open(self.moves_path, mode) as f:
+            f.seek(self.moves_bytes)
+            f.truncate()                        # drop a chunk torn by an earlier crash
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        start = 0
+        for gid, c in zip(gids, codes):
+            row = self._row(gid)
+            row["chunk_offset"] = self.moves_bytes
+            row["chunk_len"] = len(blob)
+            row["move_start"] = start
+            start += len(c)
+        self.moves_bytes += len(blob)
+        self.chunked = gids[-1] + 1
+        self._pending.clear()
+        self._flush_locked()
+        # everything in pending.bin is now covered by the manifest
+        open(self.pending_path, "wb").close()
+
+    def _flush_locked(self):
+        if self.readonly:
+            return
+        for seg in self._segments[-2:]:         # only the last segments can have unflushed rows
+            seg.flush()
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "segment_games": self.segment_games,
+            "games": self.games,
+            "chunked": self.chunked,
+            "moves_bytes": self.moves_bytes,
+        }
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.manifest_path)
+        self._unflushed = 0
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """Seal pending games into a (possibly short) chunk and write the manifest."""
+        if self.readonly:
+            return
+        with self._lock:
+            self._seal_locked()
+            self._flush_locked()
+            if self._writer_lock is not None:
+                self._writer_lock.release()
+                self._writer_lock = None
+
+    # reading -----------------------------------------------------------------------------
+    def __len__(self):
+        return self.games
+
+    def info(self, game_id: int) -> dict:
+        """Headers of one game in O(1)."""
+        if not 0 <= game_id < self.games:
+            raise KeyError(game_id)
+        row = self._row(game_id)
+        return {
+            "game_id": int(game_id),
+            "moves": int(row["n_moves"]),
+            "result": RESULT_NAMES[int(row["result"])],
+            "ts": int(row["ts"]),
+            "model_version": int(row["model_version"]),
+            "players": int(row["players"]),
+            "dataset_game_id": int(row["dataset_game_id"]),
+        }
+
+    def _chunk(self, offset: int, length: int) -> np.ndarray:
+        codes = self._chunk_cache.get(offset)
+        if codes is None:
+            with open(self.moves_path, "rb") as f:
+                f.seek(offset)
+                codes = np.frombuffer(zlib.decompress(f.read(length)), dtype=np.uint16)
+            self._chunk_cache[offset] = codes
+            if len(self._chunk_cache) > 4:
+                self._chunk_cache.popitem(last=False)
+        else:
+            self._chunk_cache.move_to_end(offset)
+        return codes
+
+    def move_codes(self, game_id: int) -> np.ndarray:
+        with self._lock:
+            if game_id in self._pending:
+                return self._pending[game_id]
+            if not 0 <= game_id < self.games:
+                raise KeyError(game_id)
+            row = self._row(game_id)
+            start, n = int(row["move_start"]), int(row["n_moves"])
+            return self._chunk(int(row["chunk_offset"]), int(row["chunk_len"]))[start:start + n]
+
+    def moves(self, game_id: int) -> list:
+        """The game's moves as chess.Move, replayed from the start position."""
+        board = chess.Board()
+        out = []
+        for code in self.move_codes(game_id):
+            move = decode_move(int(code), board)
+            if move is None or not board.is_legal(move):
+                break
+            board.push(move)
+            out.append(move)
+        return out
+
+    def select(self, result: str = None, since: float = None, until: float = None, model_version: int = None,
+               min_model_version: int = None, players: int = None) -> np.ndarray:
+        """
+        Ids of the games matching every given filter (timestamps in unix
+        seconds, until exclusive), in id order. Scans the index columns
+        segment by segment without touching the moves.
+        """
+        out = []
+        for i, seg in enumerate(self._segments):
+            n = min(self.segment_games, self.games - i * self.segment_games)
+            if n <= 0:
+                break
+            rows = seg[:n]
+            keep = np.ones(n, dtype=bool)
+            if result is not None:
+                keep &= rows["result"] == RESULT_CODES[result]
+            if since is not None:
+                keep &= rows["ts"] >= since
+            if until is not None:
+                keep &= rows["ts"] < until
+            if model_version is not None:
+                keep &= rows["model_version"] == model_version
+            if min_model_version is not None:
+                keep &= rows["model_version"] >= min_model_version
+            if players is not None:
+                keep &= rows["players"] == players
+            out.append(np.flatnonzero(keep) + i * self.segment_games)
+        return np.concatenate(out) if out else np.zeros(0, dtype=np.int64)
+
+    # export / replay ---------------------------------------------------------------------
+    def pgn(self, game_id: int) -> chess.pgn.Game:
+        info = self.info(game_id)
+        game = chess.pgn.Game()
+        game.headers["Event"] = "Archived game"
+        game.headers["Date"] = time.strftime("%Y.%m.%d", time.gmtime(info["ts"]))
+        game.headers["White"] = "AI" if info["players"] & AI_WHITE else "Human"
+        game.headers["Black"] = "AI" if info["players"] & AI_BLACK else "Human"
+        game.headers["Result"] = info["result"]
+        game.headers["GameId"] = str(game_id)
+        game.headers["ModelVersion"] = str(info["model_version"])
+        node = game
+        for move in self.moves(game_id):
+            node = node.add_variation(move)
+        return game
+
+    def export_pgn(self, path: str, game_ids=None) -> int:
+        """Stream games (all by default) to a PGN file one at a time. Returns how many were written."""
+        game_ids = range(self.games) if game_ids is None else game_ids
+        n = 0
+        with open(path, "w", encoding="utf-8") as f:
+            for gid in game_ids:
+                f.write(str(self.pgn(int(gid))) + "\n\n")
+                n += 1
+        return n
+
+    def encode_game(self, game_id: int):
+        """Per-side (bitboards (n,12) uint64, actions, reward) trajectories, as self-play stores them."""
+        result = self.info(game_id)["result"]
+        rewards = dict(zip((chess.WHITE, chess.BLACK), game_rewards(result)))
+        boards = {chess.WHITE: [], chess.BLACK: []}
+        actions = {chess.WHITE: [], chess.BLACK: []}
+        board = chess.Board()
+        for move in self.moves(game_id):
+            boards[board.turn].append(board_bitboards(board))
+            actions[board.turn].append(move_to_action(move))
+            board.push(move)
+        return [(np.array(boards[side], dtype=np.uint64).reshape(-1, 12), actions[side], rewards[side])
+                for side in (chess.WHITE, chess.BLACK) if actions[side]]
+
+    def fill_buffer(self, buffer, max_positions: int = None) -> int:
+        """
+        Refill a ReplayBuffer with the most recent archived games until
+        max_positions (default: the buffer's limit) are covered or its
+        episode capacity (two per game) is used. Returns the number of games added.
+        """
+        max_positions = buffer.max_positions if max_positions is None else max_positions
+        gids, total = [], 0
+        for gid in range(self.games - 1, -1, -1):
+            if 2 * (len(gids) + 1) > buffer.capacity or total >= max_positions:
+                break
+            gids.append(gid)
+            total += int(self._row(gid)["n_moves"])
+        # oldest first, so the buffer evicts in the same order it would have live
+        for gid in reversed(gids):
+            for bitboards, actions, reward in self.encode_game(gid):
+                buffer.add_packed(bitboards, actions, reward)
+        return len(gids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the game archive and export games to PGN")
+    parser.add_argument("--dir", default=ARCHIVE_DIR)
+    parser.add_argument("--result", choices=list(RESULT_CODES))
+    parser.add_argument("--since", help="YYYY-MM-DD (UTC)")
+    parser.add_argument("--until", help="YYYY-MM-DD (UTC), exclusive")
+    parser.add_argument("--model-version", type=int)
+    parser.add_argument("--min-model-version", type=int)
+    parser.add_argument("--export", help="write the selected games to this PGN file")
+    args = parser.parse_args()
+
+    def day(s):
+        return None if s is None else calendar.timegm(time.strptime(s, "%Y-%m-%d"))
+
+    archive = GameArchive(args.dir, readonly=True)
+    ids = archive.select(result=args.result, since=day(args.since), until=day(args.until),
+                         model_version=args.model_version, min_model_version=args.min_model_version)
+    print(f"{len(ids)} of {len(archive)} games match")
+    if args.export:
+        start = time.perf_counter()
+        n = archive.export_pgn(args.export, ids)
+        print(f"Exported {n} games to {args.export} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,20 @@
 import chess
 import chess.pgn
 from typing import Optional, List
+from backend.utils import BoardEncoder
 
 class GameEngine:
     def __init__(self):
         self.board = chess.Board()
         self.moves_played: List[chess.Move] = []
+        self.san_moves: List[str] = []
+        self.encoder = BoardEncoder(self.board)
 
     def reset(self):
         self.board.reset()
         self.moves_played = []
+        self.san_moves = []
+        self.encoder.reset(self.board)
 
     def legal_moves(self):
         return list(self.board.legal_moves)
@@ -17,10 +22,22 @@ class GameEngine:
     def make_move(self, move: chess.Move) -> bool:
         """Push move if legal and record it. Return True if made."""
         if move in self.board.legal_moves:
+            touched = BoardEncoder.touched_squares(self.board, move)
+            try:
+                san = self.board.san(move)
+            except Exception:
+                # fallback to UCI if SAN generation fails
+                san = move.uci()
             self.board.push(move)
             self.moves_played.append(move)
+            self.san_moves.append(san)
+            self.encoder.update(self.board, touched)
             return True
         return False
+
+    def state_tensor(self):
+        """Encoded current position, (1,12,8,8) on DEVICE; computed once per ply."""
+        return self.encoder.tensor()
     
     def is_game_over(self) -> bool:
         return self.board.is_game_over()
@@ -51,17 +68,8 @@ class GameEngine:
 
     def get_move_list(self) -> List[str]:
         """Return list of SAN strings for the moves played so far."""
-        temp = chess.Board()
-        san_list: List[str] = []
-        for mv in self.moves_played:
-            try:
-                san = temp.san(mv)
-            except Exception:
-                # fallback to UCI if SAN generation fails
-                san = mv.uci()
-            san_list.append(san)
-            temp.push(mv)
-        return san_list
-
-
+        return list(self.san_moves)
 
+    def moves_since(self, ply: int) -> List[str]:
+        """SAN strings of the moves played after the first `ply` plies."""
+        return self.san_moves[max(0, ply):]
@@ -0,0 +1,179 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+import numpy as np
+import torch
+import chess
+
+from backend.config import INFERENCE_MAX_BATCH, INFERENCE_MAX_WAIT_MS, INFERENCE_THREADS, DEVICE
+from backend.perf import use_intra_threads
+from backend.profiling import PROFILER
+from backend.utils import boards_to_tensor, legal_action_indices, indices_to_mask
+
+
+class _Request:
+    __slots__ = ("board", "state_t", "legal_idxs", "future", "t_submit")
+
+    def __init__(self, board, state_t, legal_idxs):
+        self.board = board
+        self.state_t = state_t
+        self.legal_idxs = legal_idxs
+        self.future = Future()
+        self.t_submit = time.perf_counter()
+
+
+class InferenceServer:
+    """
+    Micro-batching front end for ChessPolicyNet.
+
+    Many games/threads submit positions; a single worker thread collects
+    them for up to max_wait_ms (or until max_batch requests are queued),
+    runs one forward pass for the whole batch and resolves each request
+    with its masked policy as (legal action indices, probabilities).
+
+    Callers that are greenlets (eel) must not block on the future, or no
+    other caller can submit while they wait and batches never form; give
+    the server a cooperative sleep (eel.sleep) and result()/policy() poll
+    with it instead.
+    """
+
+    def __init__(self, model, max_batch: int = INFERENCE_MAX_BATCH, max_wait_ms: float = INFERENCE_MAX_WAIT_MS,
+                 device=DEVICE, threads: int = INFERENCE_THREADS, sleep=None):
+        self.model = model
+        self.sleep = sleep            # cooperative sleep(seconds) for waiting callers, None = block
+        self.device = device          # where the model lives ("cpu" for quantized models)
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max_wait_ms / 1000.0
+        self.threads = threads        # intra-op threads for the serving thread (0 = torch default)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+        # stats
+        self._stats_lock = threading.Lock()
+        self._batch_hist = {}
+        self._latencies = deque(maxlen=10000)    # seconds, submit -> result
+        self._requests = 0
+        self._batches = 0
+
+    # lifecycle ---------------------------------------------------------------
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return self
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._serve_loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+
+    def set_model(self, model):
+        # picked up by the next batch
+        self.model = model
+
+    # client API ----------------------------------------------------------------
+    def submit(self, board: chess.Board, state_t: torch.Tensor = None) -> Future:
+        """Queue a position; the future resolves to (legal_idxs, probs) numpy arrays."""
+        legal_idxs = legal_action_indices(board)
+        req = _Request(board.copy(stack=False) if state_t is None else None, state_t, legal_idxs)
+        if len(legal_idxs) == 0:
+            req.future.set_result((legal_idxs, np.zeros(0, dtype=np.float32)))
+            return req.future
+        self._queue.put(req)
+        return req.future
+
+    def result(self, future: Future, timeout: float = None):
+        """Wait for a submitted request, yielding to other greenlets if the server has a sleep."""
+        if self.sleep is not None:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not future.done():
+                if deadline is not None and time.monotonic() >= deadline:
+                    break                 # future.result(timeout=0) raises TimeoutError
+                self.sleep(0.0005)
+            timeout = 0 if not future.done() else None
+        return future.result(timeout=timeout)
+
+    def policy(self, board: chess.Board, state_t: torch.Tensor = None, timeout: float = None):
+        """Blocking submit(): returns (legal_idxs, probs)."""
+        return self.result(self.submit(board, state_t), timeout=timeout)
+
+    # worker ----------------------------------------------------------------------
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run_batch(self, batch):
+        t0 = time.perf_counter()
+        # encode positions that came without a precomputed tensor in one go
+        pending = [r for r in batch if r.state_t is None]
+        encoded = iter(boards_to_tensor([r.board for r in pending], self.device)) if pending else None
+        states = torch.cat([
+            r.state_t.reshape(1, 12, 8, 8).to(self.device) if r.state_t is not None else next(encoded).unsqueeze(0)
+            for r in batch
+        ], dim=0)
+        mask = indices_to_mask([r.legal_idxs for r in batch], self.device)
+
+        t1 = time.perf_counter()
+        with torch.no_grad():
+            logits = self.model(states).float()
+            t2 = time.perf_counter()
+            probs = torch.softmax(logits.masked_fill(~mask, -1e9), dim=-1).cpu().numpy()
+
+        now = time.perf_counter()
+        PROFILER.record("inference.encode", t1 - t0)
+        PROFILER.record("inference.forward", t2 - t1)
+        PROFILER.record("inference.mask", now - t2)
+        for i, r in enumerate(batch):
+            r.future.set_result((r.legal_idxs, probs[i, r.legal_idxs]))
+
+        with self._stats_lock:
+            n = len(batch)
+            self._batch_hist[n] = self._batch_hist.get(n, 0) + 1
+            self._batches += 1
+            self._requests += n
+            self._latencies.extend(now - r.t_submit for r in batch)
+
+    def _serve_loop(self):
+        use_intra_threads(self.threads)
+        while not self._stop_event.is_set():
+            batch = self._collect()
+            if not batch:
+                continue
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                for r in batch:
+                    if not r.future.done():
+                        r.future.set_exception(e)
+
+    # stats ------------------------------------------------------------------------
+    def stats(self) -> dict:
+        with self._stats_lock:
+            lat = np.array(self._latencies, dtype=np.float64) * 1000.0
+            return {
+                "queue_depth": self._queue.qsize(),
+                "requests": self._requests,
+                "batches": self._batches,
+                "mean_batch": (self._requests / self._batches) if self._batches else 0.0,
+                "batch_size_hist": dict(sorted(self._batch_hist.items())),
+                "latency_ms_p50": float(np.percentile(lat, 50)) if len(lat) else None,
+                "latency_ms_p99": float(np.percentile(lat, 99)) if len(lat) else None,
+            }
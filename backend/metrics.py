@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+from backend.config import DATA_DIR, METRICS_RECENT, METRICS_FLUSH_EVERY, METRICS_FLUSH_INTERVAL, METRICS_COMPACT_EVERY
+from backend.profiling import span
+
+
+class MetricsStore:
+    """
+    Game/training metrics with O(1) cost per event.
+
+    Events are buffered and appended to metrics.jsonl in batches; running
+    counters and fixed-size rings of recent entries live in memory. Every
+    compact_every events the counters and rings are written to
+    metrics_snapshot.json (atomically) and the log is truncated. On startup
+    the snapshot is loaded and any newer log lines are replayed; a legacy
+    perf.json is imported once if neither file exists.
+    """
+
+    def __init__(self, directory: str = DATA_DIR, recent: int = METRICS_RECENT,
+                 flush_every: int = METRICS_FLUSH_EVERY, flush_interval: float = METRICS_FLUSH_INTERVAL,
+                 compact_every: int = METRICS_COMPACT_EVERY):
+        self.directory = directory
+        self.log_path = os.path.join(directory, "metrics.jsonl")
+        self.snapshot_path = os.path.join(directory, "metrics_snapshot.json")
+        self.legacy_path = os.path.join(directory, "perf.json")
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+
+        self.counts = {"wins": 0, "losses": 0, "draws": 0, "total": 0}
+        self.training_steps = 0
+        self.recent_games = deque(maxlen=recent)
+        self.recent_training = deque(maxlen=recent)
+
+        self._seq = 0                 # sequence number of the last event
+        self._pending = []            # serialized events not yet on disk
+        self._since_compact = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self.load()
+
+    # loading -----------------------------------------------------------------------
+    def load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    snap = json.load(f)
+                self.counts.update(snap.get("counts", {}))
+                self.training_steps = snap.get("training_steps", 0)
+                self.recent_games.extend(snap.get("recent_games", []))
+                self.recent_training.extend(snap.get("recent_training", []))
+                snapshot_seq = self._seq = snap.get("seq", 0)
+            except Exception as e:
+                print("Failed loading metrics snapshot:", e)
+        elif not os.path.exists(self.log_path) and os.path.exists(self.legacy_path):
+            self._import_legacy()
+
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue          # torn last line after a crash
+                    if event.get("seq", 0) <= snapshot_seq:
+                        continue          # already folded into the snapshot
+                    self._apply(event)
+                    self._seq = max(self._seq, event.get("seq", 0))
+                    self._since_compact += 1
+
+    def _import_legacy(self):
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        except Exception:
+            return
+        for g in legacy.get("games", []):
+            self._apply({"type": "game", **g})
+        for t in legacy.get("training", []):
+            self._apply({"type": "train", **t})
+        # persist right away so the import happens only once
+        self._compact_locked()
+
+    def _apply(self, event: dict):
+        if event.get("type") == "game":
+            res = event.get("result")
+            if res == "1-0":
+                self.counts["wins"] += 1
+            elif res == "0-1":
+                self.counts["losses"] += 1
+            elif res == "1/2-1/2":
+                self.counts["draws"] += 1
+            self.counts["total"] += 1
+            self.recent_games.append({"ts": event.get("ts"), "result": res, "moves": event.get("moves")})
+        elif event.get("type") == "train":
+            self.training_steps += 1
+            self.recent_training.append({"ts": event.get("ts"), "loss": event.get("loss")})
+
+    # recording ---------------------------------------------------------------------
+    def _record(self, event: dict):
+        with self._lock:
+            self._seq += 1
+            event["seq"] = self._seq
+            self._apply(event)
+            self._pending.append(json.dumps(event, separators=(",", ":")))
+            if (len(self._pending) >= self.flush_every
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def record_game(self, result: str, moves: int, ts: int = None):
+        # result like "1-0", "0-1", "1/2-1/2"
+        self._record({"type": "game", "ts": int(ts or time.time()), "result": result, "moves": int(moves)})
+
+    def record_training(self, loss, ts: int = None):
+        self._record({"type": "train", "ts": int(ts or time.time()), "loss": None if loss is None else float(loss)})
+
+    # persistence -------------------------------------------------------------------
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        try:
+            with span("metrics.flush"), open(self.log_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(self._pending) + "\n")
+        except Exception as e:
+            print("Failed saving metrics:", e)
+            return
+        self._since_compact += len(self._pending)
+        self._pending = []
+        if self.compact_every and self._since_compact >= self.compact_every:
+            self._compact_locked()
+
+    def _compact_locked(self):
+        snap = {
+            "seq": self._seq,
+            "counts": self.counts,
+            "training_steps": self.training_steps,
+            "recent_games": list(self.recent_games),
+            "recent_training": list(self.recent_training),
+        }
+        tmp = self.snapshot_path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snap, f)
+            os.replace(tmp, self.snapshot_path)
+            # everything in the log is now covered by the snapshot
+            open(self.log_path, "w", encoding="utf-8").close()
+            self._since_compact = 0
+        except Exception as e:
+            print("Failed compacting metrics:", e)
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._compact_locked()
+
+    # queries -----------------------------------------------------------------------
+    def summary(self, n_games: int = 10, n_training: int = 5) -> dict:
+        with self._lock:
+            games = list(islice(reversed(self.recent_games), n_games))[::-1]
+            training = list(islice(reversed(self.recent_training), n_training))[::-1]
+            return {
+                "counts": dict(self.counts),
+                "recent_games": games,
+                "recent_training": training,
+            }
@@ -1,8 +1,14 @@
+import os
 import torch
 import torch.nn as nn
-from backend.config import ACTION_SIZE, DEVICE
+from backend.config import ACTION_SIZE, DEVICE, MODEL_ARCH, RES_BLOCKS, RES_WIDTH
+
+# checkpoints written as {"format_version", "arch", "arch_config", "state_dict"};
+# version 1 (a bare state_dict) is always the dense ChessPolicyNet
+CHECKPOINT_FORMAT_VERSION = 2
 
 class ChessPolicyNet(nn.Module):
+    arch = "dense"
 
     def __init__(self):
         super().__init__()
@@ -30,18 +36,172 @@ class ChessPolicyNet(nn.Module):
         x = self.conv_layers(x)
         logits = self.fc(x)
         return logits
-    
 
+    def arch_config(self) -> dict:
+        return {}
+
+
+class ConvPolicyHead(nn.Module):
+    """
+    Fully convolutional policy head. At every from-square it predicts 64
+    to-square logits plus 4 promotion logits (Q,R,B,N), which map directly
+    onto the action encoding: from*64 + to and 4096 + from*4 + piece.
+    """
+
+    def __init__(self, in_channels: int):
+        super().__init__()
+        self.conv = nn.Sequential(
+            nn.Conv2d(in_channels, in_channels, kernel_size=3, padding=1),
+            nn.ReLU(),
+            nn.Conv2d(in_channels, 64 + 4, kernel_size=1)
+        )
+
+    def forward(self, x):
+        out = self.conv(x)                                  # (batch, 68, 8, 8), rows run rank 8 -> 1
+        out = out.flip(2).reshape(out.shape[0], 68, 64)     # (batch, 68, from_square)
+        normal = out[:, :64, :].transpose(1, 2).reshape(out.shape[0], 64*64)
+        promo = out[:, 64:, :].transpose(1, 2).reshape(out.shape[0], 64*4)
+        return torch.cat([normal, promo], dim=1)
+
+
+class ConvPolicyNet(nn.Module):
+    """Same conv trunk as ChessPolicyNet with the dense layers replaced by ConvPolicyHead."""
+    arch = "conv"
+
+    def __init__(self):
+        super().__init__()
+        self.conv_layers = nn.Sequential(
+            nn.Conv2d(12, 64, kernel_size=3, padding=1),
+            nn.ReLU(),
+            nn.Conv2d(64, 128, kernel_size=3, padding=1),
+            nn.ReLU(),
+            nn.Conv2d(128, 128, kernel_size=3, padding=1),
+            nn.ReLU()
+        )
+        self.head = ConvPolicyHead(128)
+
+    def forward(self, x):
+        return self.head(self.conv_layers(x))
+
+    def arch_config(self) -> dict:
+        return {}
+
+
+class ResidualBlock(nn.Module):
+    def __init__(self, width: int):
+        super().__init__()
+        self.conv1 = nn.Conv2d(width, width, kernel_size=3, padding=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(width)
+        self.conv2 = nn.Conv2d(width, width, kernel_size=3, padding=1, bias=False)
+        self.bn2 = nn.BatchNorm2d(width)
+
+    def forward(self, x):
+        out = torch.relu(self.bn1(self.conv1(x)))
+        out = self.bn2(self.conv2(out))
+        return torch.relu(out + x)
 
-def load_model(model_path: str = None) -> ChessPolicyNet:
-    model = ChessPolicyNet().to(DEVICE)
+
+class ResidualPolicyNet(nn.Module):
+    """Residual tower of `blocks` blocks, `width` channels wide, with a ConvPolicyHead."""
+    arch = "resnet"
+
+    def __init__(self, blocks: int = RES_BLOCKS, width: int = RES_WIDTH):
+        super().__init__()
+        self.blocks = blocks
+        self.width = width
+        self.stem = nn.Sequential(
+            nn.Conv2d(12, width, kernel_size=3, padding=1, bias=False),
+            nn.BatchNorm2d(width),
+            nn.ReLU()
+        )
+        self.tower = nn.Sequential(*[ResidualBlock(width) for _ in range(blocks)])
+        self.head = ConvPolicyHead(width)
+
+    def forward(self, x):
+        return self.head(self.tower(self.stem(x)))
+
+    def arch_config(self) -> dict:
+        return {"blocks": self.blocks, "width": self.width}
+
+
+ARCHITECTURES = {
+    "dense": ChessPolicyNet,
+    "conv": ConvPolicyNet,
+    "resnet": ResidualPolicyNet,
+}
+
+
+def build_model(arch: str = MODEL_ARCH, arch_config: dict = None) -> nn.Module:
+    """Fresh model of the given architecture (defaults from backend/config.py) on DEVICE."""
+    if arch not in ARCHITECTURES:
+        raise ValueError(f"Unknown model architecture {arch!r}, expected one of {sorted(ARCHITECTURES)}")
+    return ARCHITECTURES[arch](**(arch_config or {})).to(DEVICE)
+
+
+def model_checkpoint(model: nn.Module, state_dict: dict = None, step: int = None) -> dict:
+    """Wrap a state_dict with the format version, architecture tag and (if given) the training step."""
+    ckpt = {
+        "format_version": CHECKPOINT_FORMAT_VERSION,
+        "arch": getattr(model, "arch", "dense"),
+        "arch_config": model.arch_config() if hasattr(model, "arch_config") else {},
+        "state_dict": model.state_dict() if state_dict is None else state_dict,
+    }
+    if step is not None:
+        ckpt["step"] = int(step)
+    return ckpt
+
+
+def checkpoint_state_dict(ckpt: dict) -> dict:
+    """The state_dict of a checkpoint in either format."""
+    if isinstance(ckpt, dict) and "format_version" in ckpt:
+        # versioned ckpt_*.pth files written before the fix kept their weights under "model"
+        return ckpt["state_dict"] or ckpt.get("model", {})
+    return ckpt
+
+
+def checkpoint_arch(ckpt: dict):
+    """(arch, arch_config) of a checkpoint; legacy bare state_dicts are the dense net."""
+    if isinstance(ckpt, dict) and "format_version" in ckpt:
+        return ckpt.get("arch", "dense"), ckpt.get("arch_config") or {}
+    return "dense", {}
+
+
+def checkpoint_step(ckpt: dict) -> int:
+    """Training step a checkpoint was saved at; 0 if it does not record one."""
+    if isinstance(ckpt, dict) and "format_version" in ckpt:
+        return int(ckpt.get("step", 0))
+    return 0
+
+
+def model_from_checkpoint(ckpt: dict) -> nn.Module:
+    """Fresh model of the checkpoint's architecture with its weights loaded."""
+    arch, arch_config = checkpoint_arch(ckpt)
+    model = build_model(arch, arch_config)
+    model.load_state_dict(checkpoint_state_dict(ckpt))
+    return model
+
+
+def load_model(model_path: str = None) -> nn.Module:
+    """
+    Load a checkpoint into a fresh model of the architecture it was saved
+    with (a new model uses MODEL_ARCH from config). A .pt path is a frozen
+    TorchScript serving model from backend/export.py and is returned as is
+    (CPU, inference only).
+    """
+    if model_path is not None and model_path.endswith(".pt") and os.path.exists(model_path):
+        model = torch.jit.load(model_path, map_location="cpu")
+        print(f"Loaded TorchScript model from {model_path}")
+        return model
 
     if model_path is not None:
         try:
-            model.load_state_dict(torch.load(model_path, map_location= DEVICE))
-            print(f"Loaded Model from {model_path}")
-        except:
+            ckpt = torch.load(model_path, map_location= DEVICE)
+            model = model_from_checkpoint(ckpt)
+            print(f"Loaded Model from {model_path} ({model.arch})")
+            return model
+        except FileNotFoundError:
             print("File Not Found, Starting Fresh")
+        except Exception as e:
+            print(f"Could not load {model_path} ({e}), Starting Fresh")
 
-    return model
-
+    return build_model()
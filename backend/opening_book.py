@@ -0,0 +1,336 @@
+import argparse
+import io
+import json
+import os
+import random
+import time
+import numpy as np
+import chess
+import chess.pgn
+import chess.polyglot
+
+from backend.config import (
+    OPENING_BOOK_PATH,
+    OPENING_BOOK_MAX_PLY,
+    OPENING_BOOK_MIN_WEIGHT,
+    DATASET_DIR
+)
+from backend.store_lock import WriterLock
+from backend.utils import action_to_move
+
+BOOK_MOVES = 8      # most-played moves kept per position
+BOOK_COUNT_MAX_PLY = 40     # depth counts are collected to; build(max_ply) picks the book depth below it
+
+# one open-addressing slot per position; key 0 marks an empty slot
+SLOT_DTYPE = np.dtype([
+    ("key", np.uint64),
+    ("total", np.uint32),
+    ("n", np.uint32),
+    ("moves", np.uint16, (BOOK_MOVES,)),
+    ("weights", np.uint32, (BOOK_MOVES,)),
+])
+# ply: the shallowest ply the position was reached at, for build(max_ply)
+COUNT_DTYPE = np.dtype([("key", np.uint64), ("move", np.uint16), ("weight", np.uint32), ("ply", np.uint8)])
+
+
+def encode_move(move: chess.Move) -> int:
+    # from | to << 6 | promotion piece << 12: unlike action codes this keeps capture-promotions apart
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(code: int) -> chess.Move:
+    return chess.Move(code & 63, (code >> 6) & 63, (code >> 12) or None)
+
+
+class OpeningBook:
+    """
+    Read side of the book: a power-of-two table of SLOT_DTYPE records,
+    memory-mapped from one .npy file and probed by the position's polyglot
+    Zobrist hash with linear probing, so a lookup touches one or two slots.
+    """
+
+    def __init__(self, path: str = OPENING_BOOK_PATH, max_ply: int = BOOK_COUNT_MAX_PLY,
+                 reload_interval: float = 30.0):
+        self.path = path
+        self.max_ply = max_ply
+        self.reload_interval = reload_interval
+        self.table = None
+        self.hits = 0
+        self.misses = 0
+        self._mtime = None
+        self._last_check = 0.0
+        self.load()
+
+    def table_path(self) -> str:
+        return self.path + ".npy"
+
+    def load(self) -> bool:
+        try:
+            mtime = os.stat(self.table_path()).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        # the builder replaces the file atomically, so a fresh map always sees a whole table
+        self.table = np.load(self.table_path(), mmap_mode="r")
+        self._mtime = mtime
+        return True
+
+    def maybe_reload(self):
+        """Pick up a rebuilt book; checks the file at most every reload_interval seconds."""
+        now = time.monotonic()
+        if now - self._last_check >= self.reload_interval:
+            self._last_check = now
+            self.load()
+
+    def __len__(self):
+        return 0 if self.table is None else int(np.count_nonzero(self.table["key"]))
+
+    def probe(self, board: chess.Board) -> list:
+        """[(move, weight), ...] for board, most played first; [] if out of book."""
+        if self.table is None or board.ply() >= self.max_ply:
+            return []
+        key = np.uint64(chess.polyglot.zobrist_hash(board))
+        mask = len(self.table) - 1
+        i = int(key) & mask
+        while True:
+            slot = self.table[i]
+            if slot["key"] == key:
+                break
+            if slot["key"] == 0:
+                self.misses += 1
+                return []
+            i = (i + 1) & mask
+        n = int(slot["n"])
+        out = []
+        for code, weight in zip(slot["moves"][:n], slot["weights"][:n]):
+            move = decode_move(int(code))
+            if board.is_legal(move):          # guards against hash collisions
+                out.append((move, int(weight)))
+        if out:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return out
+
+    def choose(self, board: chess.Board, rng=random):
+        """A book move sampled proportionally to its weight, or None if out of book."""
+        entries = self.probe(board)
+        if not entries:
+            return None
+        moves, weights = zip(*entries)
+        return rng.choices(moves, weights=weights, k=1)[0]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"positions": len(self), "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0}
+
+
+class BookBuilder:
+    """
+    Offline build side. Raw (hash, move, count, ply) records for every
+    position up to BOOK_COUNT_MAX_PLY are accumulated in <path>.counts.npy,
+    together with how far each source (dataset rows, PGN byte offsets) has
+    been read, so a rebuild only processes new games. build() then applies
+    the depth/weight thresholds and writes the probe table, so a later build
+    can use a larger max_ply without rereading anything. One builder per
+    book at a time (a second raises StoreLockedError) until close();
+    rebuild=True discards the accumulated counts first.
+    """
+
+    def __init__(self, path: str = OPENING_BOOK_PATH, rebuild: bool = False):
+        self.path = path
+        self._writer_lock = WriterLock(os.path.dirname(path) or ".", os.path.basename(path) + ".lock").acquire()
+        if rebuild:
+            for old in (self.counts_path(), self.sources_path()):
+                if os.path.exists(old):
+                    os.remove(old)
+        self.counts = np.zeros(0, dtype=COUNT_DTYPE)
+        self.sources = {"dataset_rows": {}, "pgn_offsets": {}}
+        self._new_keys, self._new_moves, self._new_plies = [], [], []
+        if os.path.exists(self.counts_path()):
+            counts = np.load(self.counts_path())
+            if counts.dtype != COUNT_DTYPE:
+                # counts saved before plies were recorded: kept, at ply 0 (always within max_ply)
+                upgraded = np.zeros(len(counts), dtype=COUNT_DTYPE)
+                for name in counts.dtype.names:
+                    upgraded[name] = counts[name]
+                counts = upgraded
+            self.counts = counts
+        if os.path.exists(self.sources_path()):
+            with open(self.sources_path(), "r", encoding="utf-8") as f:
+                self.sources.update(json.load(f))
+
+    def counts_path(self) -> str:
+        return self.path + ".counts.npy"
+
+    def sources_path(self) -> str:
+        return self.path + ".sources.json"
+
+    # collecting --------------------------------------------------------------------------
+    def add_moves(self, moves, board: chess.Board = None) -> int:
+        """Count the first BOOK_COUNT_MAX_PLY moves of one game. Returns how many were counted."""
+        board = chess.Board() if board is None else board
+        n = 0
+        for move in moves:
+            if board.ply() >= BOOK_COUNT_MAX_PLY or not board.is_legal(move):
+                break
+            self._new_keys.append(chess.polyglot.zobrist_hash(board))
+            self._new_moves.append(encode_move(move))
+            self._new_plies.append(board.ply())
+            board.push(move)
+            n += 1
+        return n
+
+    def add_pgn(self, pgn_path: str) -> int:
+        """Count the openings of the games in pgn_path not read by an earlier build."""
+        from backend.pgn_ingest import iter_games
+
+        offsets = self.sources["pgn_offsets"]
+        games = 0
+        end = offsets.get(os.path.abspath(pgn_path), 0)
+        for _start, end, text in iter_games(pgn_path, end):
+            game = chess.pgn.read_game(io.StringIO(text.decode("utf-8", errors="replace")))
+            if game is None or game.errors or game.board().uci_variant != "chess":
+                continue
+            if game.board().fen() != chess.STARTING_FEN:
+                continue
+            self.add_moves(game.mainline_moves())
+            games += 1
+        offsets[os.path.abspath(pgn_path)] = end
+        return games
+
+    def add_dataset(self, dataset_dir: str = DATASET_DIR) -> int:
+        """
+        Count the openings of games appended to a ShardedDataset since the last
+        build. Moves are replayed from the start position using the stored
+        action codes, in ply order, up to the first gap.
+        """
+        from backend.dataset import ShardedDataset
+
+        dataset = ShardedDataset(dataset_dir, readonly=True)
+        done = self.sources["dataset_rows"].get(os.path.abspath(dataset_dir), 0)
+        total = dataset.num_positions()
+        if total <= done:
+            return 0
+        cols = dataset.rows(np.arange(done, total))
+        keep = cols["plies"] < BOOK_COUNT_MAX_PLY
+        game_ids, plies, actions = cols["game_ids"][keep], cols["plies"][keep], cols["actions"][keep]
+        order = np.lexsort((plies, game_ids))
+        game_ids, plies, actions = game_ids[order], plies[order], actions[order]
+
+        games = 0
+        bounds = np.flatnonzero(np.diff(game_ids)) + 1
+        for g_plies, g_actions in zip(np.split(plies, bounds), np.split(actions, bounds)):
+            if len(g_plies) == 0 or g_plies[0] != 0:
+                continue
+            board = chess.Board()
+            moves = []
+            for ply, action in zip(g_plies, g_actions):
+                if ply != len(moves):
+                    break
+                move = action_to_move(int(action), board)
+                if move is None or not board.is_legal(move):
+                    break
+                moves.append(move)
+                board.push(move)
+            self.add_moves(moves)
+            games += 1
+        self.sources["dataset_rows"][os.path.abspath(dataset_dir)] = total
+        return games
+
+    # writing -----------------------------------------------------------------------------
+    def _merge(self):
+        if not self._new_keys:
+            return
+        new = np.zeros(len(self._new_keys), dtype=COUNT_DTYPE)
+        new["key"] = np.array(self._new_keys, dtype=np.uint64)
+        new["move"] = self._new_moves
+        new["weight"] = 1
+        new["ply"] = self._new_plies
+        allc = np.concatenate([self.counts, new])
+        order = np.lexsort((allc["move"], allc["key"]))
+        allc = allc[order]
+        starts = np.flatnonzero(np.r_[True, (allc["key"][1:] != allc["key"][:-1]) | (allc["move"][1:] != allc["move"][:-1])])
+        merged = allc[starts].copy()
+        merged["weight"] = np.add.reduceat(allc["weight"].astype(np.uint64), starts).astype(np.uint32)
+        merged["ply"] = np.minimum.reduceat(allc["ply"], starts)
+        self.counts = merged
+        self._new_keys, self._new_moves, self._new_plies = [], [], []
+
+    def build(self, min_weight: int = OPENING_BOOK_MIN_WEIGHT, max_ply: int = OPENING_BOOK_MAX_PLY) -> dict:
+        """
+        Merge new counts, save them, and write the probe table: positions
+        first reached at max_ply or deeper and moves played fewer than
+        min_weight times are dropped, and only the BOOK_MOVES most played
+        moves of each position are kept.
+        """
+        self._merge()
+        max_ply = min(int(max_ply), BOOK_COUNT_MAX_PLY)
+        counts = self.counts[(self.counts["weight"] >= min_weight) & (self.counts["ply"] < max_ply)]
+        bounds = np.flatnonzero(counts["key"][1:] != counts["key"][:-1]) + 1 if len(counts) else np.zeros(0, dtype=np.int64)
+        groups = np.split(counts, bounds) if len(counts) else []
+
+        size = 1
+        while size < max(2 * len(groups), 16):          # load factor <= 0.5
+            size *= 2
+        table = np.zeros(size, dtype=SLOT_DTYPE)
+        mask = size - 1
+        for group in groups:
+            key = group["key"][0]
+            if key == 0:
+                continue
+            top = group[np.argsort(-group["weight"].astype(np.int64), kind="stable")[:BOOK_MOVES]]
+            i = int(key) & mask
+            while table["key"][i] != 0:
+                i = (i + 1) & mask
+            slot = table[i:i + 1]
+            slot["key"] = key
+            slot["total"] = int(group["weight"].sum())
+            slot["n"] = len(top)
+            slot["moves"][0, :len(top)] = top["move"]
+            slot["weights"][0, :len(top)] = top["weight"]
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        for arr, path in ((self.counts, self.counts_path()), (table, self.path + ".npy")):
+            tmp = path + ".tmp.npy"
+            np.save(tmp, arr)
+            os.replace(tmp, path)
+        tmp = self.sources_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.sources, f)
+        os.replace(tmp, self.sources_path())
+        return {"positions": len(groups), "slots": size, "entries": len(counts), "raw_entries": len(self.counts)}
+
+    def close(self):
+        """Let another builder open the book."""
+        self._writer_lock.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the opening book from PGN files and/or the training dataset")
+    parser.add_argument("pgn", nargs="*", help="PGN files (.pgn/.bz2/.zst); only games new since the last build are read")
+    parser.add_argument("--dataset", nargs="?", const=DATASET_DIR, default=None, help="also read games from the dataset")
+    parser.add_argument("--out", default=OPENING_BOOK_PATH)
+    parser.add_argument("--max-ply", type=int, default=OPENING_BOOK_MAX_PLY)
+    parser.add_argument("--min-weight", type=int, default=OPENING_BOOK_MIN_WEIGHT,
+                        help="drop moves seen fewer times than this")
+    parser.add_argument("--rebuild", action="store_true", help="discard accumulated counts and start over")
+    args = parser.parse_args()
+
+    builder = BookBuilder(args.out, rebuild=args.rebuild)
+    start = time.perf_counter()
+    games = 0
+    for pgn in args.pgn:
+        games += builder.add_pgn(pgn)
+    if args.dataset:
+        games += builder.add_dataset(args.dataset)
+    stats = builder.build(args.min_weight, args.max_ply)
+    builder.close()
+    print(f"Opening book {args.out}.npy: {stats['positions']} positions from {games} new games "
+          f"({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
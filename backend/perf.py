@@ -0,0 +1,152 @@
+import argparse
+import random
+import sys
+import time
+import numpy as np
+import torch
+import chess
+
+from backend.config import (
+    BATCH_SIZE,
+    MODEL_ARCH,
+    TRAIN_THREADS,
+    INTEROP_THREADS,
+    TRAIN_CHANNELS_LAST,
+    TRAIN_BF16,
+    TRAIN_COMPILE,
+    PERF_PARITY_TOLERANCE
+)
+from backend.utils import boards_to_tensor, move_to_action
+
+
+# threads ------------------------------------------------------------------------------
+# torch's intra-op default, recorded before anything in this process changes it
+DEFAULT_INTRA_THREADS = torch.get_num_threads()
+
+
+def use_intra_threads(n: int):
+    """
+    Set torch's intra-op thread count from the calling thread (0 = the
+    default recorded at import). The count a thread sees is whatever was
+    last set anywhere unless it sets its own, so every thread that runs
+    torch work (trainer, inference server) calls this at its top, including
+    with 0.
+    """
+    torch.set_num_threads(int(n) if n and n > 0 else DEFAULT_INTRA_THREADS)
+
+
+def set_interop_threads(n: int = INTEROP_THREADS) -> bool:
+    """Size the process-wide inter-op pool. Only possible before torch first uses it."""
+    if not n or n <= 0:
+        return False
+    try:
+        torch.set_num_interop_threads(int(n))
+        return True
+    except RuntimeError as e:
+        print("Could not set inter-op threads:", e)
+        return False
+
+
+# precision / layout ---------------------------------------------------------------------
+def bf16_supported(device: torch.device) -> bool:
+    """bf16 autocast pays off on CPUs with native bf16 (AVX512-BF16/AMX) and on CUDA."""
+    if device.type == "cuda":
+        return torch.cuda.is_bf16_supported()
+    is_supported = getattr(torch.ops.mkldnn, "_is_mkldnn_bf16_supported", None)
+    return bool(torch.backends.mkldnn.is_available() and is_supported is not None and is_supported())
+
+
+def describe(trainer) -> dict:
+    return {
+        "threads": torch.get_num_threads(),
+        "interop_threads": torch.get_num_interop_threads(),
+        "channels_last": trainer.channels_last,
+        "bf16": trainer.bf16,
+        "compiled": trainer.compiled,
+    }
+
+
+# loss parity -------------------------------------------------------------------------
+def parity_batches(num_batches: int, batch_size: int = BATCH_SIZE, seed: int = 0) -> list:
+    """Fixed (states, actions) batches of random-play positions labelled with the move played next."""
+    rng = random.Random(seed)
+    boards, actions = [], []
+    while len(boards) < num_batches * batch_size:
+        board = chess.Board()
+        for _ in range(rng.randint(0, 80)):
+            if board.is_game_over():
+                break
+            move = rng.choice(list(board.legal_moves))
+            boards.append(board.copy(stack=False))
+            actions.append(move_to_action(move))
+            board.push(move)
+    states = boards_to_tensor(boards[:num_batches * batch_size], device="cpu")
+    actions = torch.tensor(actions[:num_batches * batch_size], dtype=torch.long)
+    return [(states[i:i + batch_size].contiguous(), actions[i:i + batch_size].contiguous())
+            for i in range(0, num_batches * batch_size, batch_size)]
+
+
+def run_curve(batches: list, arch: str = MODEL_ARCH, seed: int = 0, warmup: int = 3, **perf) -> dict:
+    """Train a fresh seeded model on batches; per-step losses and post-warmup samples/sec."""
+    from backend.model import build_model
+    from backend.trainer import Trainer
+
+    torch.manual_seed(seed)
+    trainer = Trainer(build_model(arch), **perf)
+    losses = []
+    start, counted = None, 0
+    for i, (states, actions) in enumerate(batches):
+        if i == warmup:
+            start = time.perf_counter()
+        losses.append(trainer.pretrain_step(states, actions))
+        if start is not None:
+            counted += len(actions)
+    elapsed = time.perf_counter() - start if start is not None else 0.0
+    return {"losses": losses, "samples_per_sec": counted / elapsed if elapsed > 0 else 0.0, "mode": describe(trainer)}
+
+
+def smoothed(values, window: int = 10) -> np.ndarray:
+    values = np.asarray(values, dtype=np.float64)
+    window = max(1, min(window, len(values)))
+    return np.convolve(values, np.ones(window) / window, mode="valid")
+
+
+def loss_parity(baseline: list, candidate: list, window: int = 10) -> float:
+    """Largest relative deviation between the moving-average loss curves."""
+    base, cand = smoothed(baseline, window), smoothed(candidate, window)
+    return float(np.max(np.abs(cand - base) / np.maximum(np.abs(base), 1e-8)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check a training performance mode against eager fp32: loss-curve parity and samples/sec")
+    parser.add_argument("--steps", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--arch", default=MODEL_ARCH)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=TRAIN_THREADS, help="intra-op threads for both runs")
+    parser.add_argument("--channels-last", action=argparse.BooleanOptionalAction, default=TRAIN_CHANNELS_LAST)
+    parser.add_argument("--bf16", action=argparse.BooleanOptionalAction, default=TRAIN_BF16)
+    parser.add_argument("--compile", action=argparse.BooleanOptionalAction, default=TRAIN_COMPILE)
+    parser.add_argument("--tolerance", type=float, default=PERF_PARITY_TOLERANCE)
+    args = parser.parse_args()
+
+    set_interop_threads()
+    use_intra_threads(args.threads)
+    batches = parity_batches(args.steps, args.batch_size, args.seed)
+    baseline = run_curve(batches, args.arch, args.seed, channels_last=False, bf16=False, compile_model=False)
+    candidate = run_curve(batches, args.arch, args.seed, channels_last=args.channels_last, bf16=args.bf16,
+                          compile_model=args.compile)
+
+    deviation = loss_parity(baseline["losses"], candidate["losses"])
+    print(f"mode: {candidate['mode']}")
+    print(f"eager fp32: {baseline['samples_per_sec']:.0f} samples/s, final loss {baseline['losses'][-1]:.4f}")
+    print(f"candidate:  {candidate['samples_per_sec']:.0f} samples/s, final loss {candidate['losses'][-1]:.4f} "
+          f"({candidate['samples_per_sec'] / max(baseline['samples_per_sec'], 1e-9):.2f}x)")
+    print(f"max smoothed loss deviation {deviation:.2%} (tolerance {args.tolerance:.0%})")
+    if deviation > args.tolerance:
+        sys.exit("loss curve diverged from the eager fp32 baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+import argparse
+import bz2
+import io
+import json
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+import numpy as np
+import torch
+import chess
+import chess.pgn
+
+from backend.config import (
+    BATCH_SIZE,
+    MODEL_DIR,
+    DATASET_DIR,
+    PGN_INGEST_WORKERS,
+    PGN_INGEST_CHUNK_GAMES,
+    PGN_INGEST_MAX_INFLIGHT,
+    PGN_SHUFFLE_POSITIONS,
+    TRAIN_THREADS
+)
+from backend.replay_buffer import ReplayBuffer
+from backend.utils import board_bitboards, move_to_action, game_rewards
+
+
+# reading -----------------------------------------------------------------------------
+def open_pgn(path: str):
+    """Binary stream of the (decompressed) PGN text. .bz2 is built in, .zst needs the zstandard package."""
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise SystemExit("reading .zst files needs the zstandard package (pip install zstandard)")
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+    return open(path, "rb")
+
+
+def iter_games(path: str, offset: int = 0):
+    """
+    Yield (start_offset, end_offset, game_bytes) for each game in the file.
+    Offsets count bytes of the decompressed stream, so they can be used to
+    resume; offset must be a game boundary (an end_offset from an earlier run).
+    Only one game is held in memory at a time.
+    """
+    with open_pgn(path) as f:
+        if offset:
+            if f.seekable() and not path.endswith((".bz2", ".zst")):
+                f.seek(offset)
+            else:
+                remaining = offset
+                while remaining:
+                    skipped = len(f.read(min(remaining, 1 << 20)))
+                    if not skipped:
+                        return
+                    remaining -= skipped
+        pos = start = offset
+        lines = []
+        in_moves = False
+        for line in f:
+            stripped = line.strip()
+            # a header line after movetext starts the next game
+            if stripped.startswith(b"[") and in_moves:
+                yield start, pos, b"".join(lines)
+                lines, start, in_moves = [], pos, False
+            if stripped and not stripped.startswith(b"["):
+                in_moves = True
+            lines.append(line)
+            pos += len(line)
+        if in_moves:
+            yield start, pos, b"".join(lines)
+
+
+def iter_chunks(path: str, offset: int = 0, chunk_games: int = PGN_INGEST_CHUNK_GAMES, max_games: int = 0):
+    """Yield (end_offset, [game_bytes, ...]) in chunks of chunk_games, stopping after max_games (0 = all)."""
+    chunk, end, games = [], offset, 0
+    for _start, end, text in iter_games(path, offset):
+        chunk.append(text)
+        games += 1
+        if len(chunk) >= chunk_games or games == max_games:
+            yield end, chunk
+            chunk = []
+            if games == max_games:
+                return
+    if chunk:
+        yield end, chunk
+
+
+# encoding (runs in the worker processes) ---------------------------------------------
+def _init_worker():
+    torch.set_num_threads(1)
+
+
+def encode_game(text: bytes, weighting: str = "imitation"):
+    """
+    Parse one game and encode its positions per side. Returns a list of
+    (bitboards (n,12) uint64, actions int16, weight, first ply) episodes, or
+    None for unparseable / non-standard games.
+    """
+    game = chess.pgn.read_game(io.StringIO(text.decode("utf-8", errors="replace")))
+    if game is None or game.errors:
+        return None
+    board = game.board()
+    if board.uci_variant != "chess":
+        return None
+    result = game.headers.get("Result", "*")
+    if weighting == "result":
+        if result not in ("1-0", "0-1", "1/2-1/2"):
+            return None
+        weight_w, weight_b = game_rewards(result)
+    else:
+        weight_w = weight_b = 1.0
+
+    boards = {chess.WHITE: [], chess.BLACK: []}
+    actions = {chess.WHITE: [], chess.BLACK: []}
+    first_ply = {board.turn: board.ply(), not board.turn: board.ply() + 1}
+    for move in game.mainline_moves():
+        boards[board.turn].append(board_bitboards(board))
+        actions[board.turn].append(move_to_action(move))
+        board.push(move)
+
+    episodes = []
+    for side, weight in ((chess.WHITE, weight_w), (chess.BLACK, weight_b)):
+        if actions[side]:
+            episodes.append((np.stack(boards[side]), np.asarray(actions[side], dtype=np.int16), float(weight),
+                             first_ply[side]))
+    return episodes
+
+
+def encode_chunk(texts, weighting: str = "imitation") -> dict:
+    games, bad = [], 0
+    for text in texts:
+        try:
+            eps = encode_game(text, weighting)
+        except Exception:
+            eps = None
+        if eps is None:
+            bad += 1
+            continue
+        games.append(eps)
+    return {"episodes": games, "games": len(games), "bad": bad,
+            "positions": sum(len(ep[1]) for eps in games for ep in eps)}
+
+
+# ingestion / pretraining ----------------------------------------------------------------
+def progress_path(pgn_path: str) -> str:
+    return pgn_path + ".progress.json"
+
+
+def load_progress(pgn_path: str) -> dict:
+    try:
+        with open(progress_path(pgn_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"offset": 0, "games": 0, "positions": 0}
+
+
+def save_progress(pgn_path: str, progress: dict):
+    tmp = progress_path(pgn_path) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(progress, f)
+    os.replace(tmp, progress_path(pgn_path))
+
+
+class PGNIngestor:
+    """
+    Streams a PGN file through a process pool and pretrains `trainer` on the
+    played moves. Parsed positions go into a fixed-size shuffle pool (a
+    ReplayBuffer), and passes * positions / batch_size supervised steps are
+    run as they arrive, so memory stays bounded however large the file is.
+    At most max_inflight chunks per worker are queued at any time.
+    With a ShardedDataset every parsed game is also appended to it.
+    """
+
+    def __init__(self, trainer=None, dataset=None, num_workers: int = PGN_INGEST_WORKERS,
+                 chunk_games: int = PGN_INGEST_CHUNK_GAMES, max_inflight: int = PGN_INGEST_MAX_INFLIGHT,
+                 shuffle_positions: int = PGN_SHUFFLE_POSITIONS, batch_size: int = BATCH_SIZE,
+                 passes: float = 1.0, weighting: str = "imitation", report_every: float = 5.0):
+        self.trainer = trainer
+        self.dataset = dataset
+        self.num_workers = max(1, int(num_workers))
+        self.chunk_games = chunk_games
+        self.max_inflight = max(1, int(max_inflight)) * self.num_workers
+        self.batch_size = batch_size
+        self.passes = passes
+        self.weighting = weighting
+        self.report_every = report_every
+        self.shuffle = ReplayBuffer(capacity=max(1, shuffle_positions // 10), max_positions=shuffle_positions,
+                                    sampling="uniform")
+        self._steps_due = 0.0
+        self.last_loss = None
+
+    def _consume(self, result: dict):
+        for episodes in result["episodes"]:
+            game_id = self.dataset.new_game_id() if self.dataset is not None else None
+            for bitboards, actions, weight, first_ply in episodes:
+                if self.trainer is not None:
+                    self.shuffle.add_packed(bitboards, actions, weight)
+                if self.dataset is not None:
+                    self.dataset.add_packed(bitboards, actions, weight, game_id, first_ply)
+        if self.trainer is None:
+            return
+        self._steps_due += result["positions"] * self.passes / self.batch_size
+        # let the pool fill a little before training so batches are mixed across games
+        if self.shuffle.num_positions() < min(self.shuffle.max_positions, self.batch_size * 16):
+            return
+        while self._steps_due >= 1.0:
+            states, actions, weights = self.shuffle.sample(self.batch_size)
+            self.last_loss = self.trainer.pretrain_step(states, actions, weights)
+            self._steps_due -= 1.0
+
+    def run(self, pgn_path: str, offset: int = 0, max_games: int = 0, save_every: int = 0,
+            on_checkpoint=None) -> dict:
+        """
+        Ingest pgn_path from byte offset. Every save_every games (and at the
+        end) on_checkpoint(progress) is called with the offset to resume from.
+        """
+        progress = {"offset": offset, "games": 0, "positions": 0, "bad": 0}
+        start = time.perf_counter()
+        last_report = start
+        last_save = 0
+        pending = deque()
+        ctx = mp.get_context("spawn")
+
+        def drain_one():
+            async_result, end_offset = pending.popleft()
+            result = async_result.get()
+            self._consume(result)
+            progress["offset"] = end_offset
+            progress["games"] += result["games"]
+            progress["bad"] += result["bad"]
+            progress["positions"] += result["positions"]
+
+        with ctx.Pool(processes=self.num_workers, initializer=_init_worker) as pool:
+            for end_offset, chunk in iter_chunks(pgn_path, offset, self.chunk_games, max_games):
+                pending.append((pool.apply_async(encode_chunk, (chunk, self.weighting)), end_offset))
+
+                while len(pending) >= self.max_inflight:
+                    drain_one()
+
+                now = time.perf_counter()
+                if self.report_every and now - last_report >= self.report_every:
+                    self._report(progress, now - start)
+                    last_report = now
+                if save_every and on_checkpoint is not None and progress["games"] - last_save >= save_every:
+                    on_checkpoint(dict(progress))
+                    last_save = progress["games"]
+            while pending:
+                drain_one()
+
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        progress["seconds"] = elapsed
+        progress["games_per_sec"] = progress["games"] / elapsed
+        progress["positions_per_sec"] = progress["positions"] / elapsed
+        if on_checkpoint is not None:
+            on_checkpoint(dict(progress))
+        self._report(progress, elapsed)
+        return progress
+
+    def _report(self, progress: dict, elapsed: float):
+        elapsed = max(elapsed, 1e-9)
+        loss = f", loss {self.last_loss:.4f}" if self.last_loss is not None else ""
+        print(f"ingest: {progress['games']} games ({progress['bad']} skipped), "
+              f"{progress['games'] / elapsed:.1f} games/s, {progress['positions'] / elapsed:.0f} positions/s, "
+              f"offset {progress['offset']}{loss}")
+
+
+def main():
+    from backend.dataset import ShardedDataset
+    from backend.model import load_model
+    from backend.perf import set_interop_threads, use_intra_threads
+    from backend.trainer import Trainer
+
+    parser = argparse.ArgumentParser(description="Stream a PGN dump (.pgn/.pgn.bz2/.pgn.zst) into supervised pretraining")
+    parser.add_argument("pgn")
+    parser.add_argument("--workers", type=int, default=PGN_INGEST_WORKERS)
+    parser.add_argument("--offset", type=int, default=None, help="byte offset to start from (default: resume)")
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress and start at the beginning")
+    parser.add_argument("--max-games", type=int, default=0)
+    parser.add_argument("--passes", type=float, default=1.0, help="average times each position is trained on")
+    parser.add_argument("--weighting", choices=["imitation", "result"], default="imitation",
+                        help="imitation: every move weight 1; result: weight by the game result as in self-play")
+    parser.add_argument("--save-every", type=int, default=10000, help="games between model/progress saves")
+    parser.add_argument("--model", default=os.path.join(MODEL_DIR, "latest_model.pth"))
+    parser.add_argument("--parse-only", action="store_true", help="parse and encode without training")
+    parser.add_argument("--dataset", nargs="?", const=DATASET_DIR, default=None,
+                        help=f"also append every game to a sharded dataset (default dir: {DATASET_DIR})")
+    args = parser.parse_args()
+
+    progress = {"offset": 0} if args.restart else load_progress(args.pgn)
+    offset = args.offset if args.offset is not None else progress.get("offset", 0)
+    if offset:
+        print(f"Resuming {args.pgn} at byte {offset}")
+
+    set_interop_threads()
+    use_intra_threads(TRAIN_THREADS)
+    trainer = None if args.parse_only else Trainer(load_model(args.model))
+    # continue the step count and optimizer state instead of pretraining from step 0
+    if trainer is not None and os.path.exists(args.model):
+        trainer.load_checkpoint(restore_model=False)
+    dataset = ShardedDataset(args.dataset) if args.dataset else None
+    ingestor = PGNIngestor(trainer, dataset, num_workers=args.workers, passes=args.passes, weighting=args.weighting)
+
+    done_games, done_positions = progress.get("games", 0), progress.get("positions", 0)
+
+    def on_checkpoint(p):
+        # the resume offset only moves forward once the model covering those games is on disk
+        if dataset is not None:
+            dataset.flush()
+        if trainer is not None:
+            trainer.save_model(os.path.basename(args.model))
+        if trainer is not None or dataset is not None:
+            save_progress(args.pgn, {"offset": p["offset"], "games": done_games + p["games"],
+                                     "positions": done_positions + p["positions"]})
+
+    ingestor.run(args.pgn, offset, max_games=args.max_games, save_every=args.save_every, on_checkpoint=on_checkpoint)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import random
+import numpy as np
+import torch
+import chess
+
+from backend.config import EPSILON
+from backend.inference import InferenceServer
+from backend.profiling import span
+from backend.utils import (
+    board_to_tensor,
+    legal_action_indices,
+    indices_to_mask,
+    masked_softmax,
+    action_to_move,
+    move_to_action
+)
+
+
+def policy_for_board(board: chess.Board, model, state_t=None, cache=None):
+    """
+    Masked policy of board as (legal action indices, probabilities).
+    model is a ChessPolicyNet or an InferenceServer that batches the forward pass;
+    cache is an optional PolicyCache consulted before running the network.
+    """
+    if cache is not None:
+        hit = cache.get(board)
+        if hit is not None:
+            return hit
+        legal_idxs, probs = policy_for_board(board, model, state_t)
+        cache.put(board, legal_idxs, probs)
+        return legal_idxs, probs
+
+    if isinstance(model, InferenceServer):
+        return model.policy(board, state_t)
+
+    with torch.no_grad():
+        with span("policy.encode"):
+            if state_t is None:
+                state_t = board_to_tensor(board)      # (1,12,8,8) on DEVICE
+            legal_idxs = legal_action_indices(board)
+        if len(legal_idxs) == 0:
+            return legal_idxs, np.zeros(0, dtype=np.float32)
+
+        with span("policy.forward"):
+            logits = model(state_t).squeeze(0)       # (ACTION_SIZE,)
+        with span("policy.mask"):
+            mask = indices_to_mask([legal_idxs])[0]  # boolean mask on DEVICE
+            probs = masked_softmax(logits, mask)
+    return legal_idxs, probs[torch.from_numpy(legal_idxs).to(probs.device)].cpu().numpy()
+
+
+def sample_action(board: chess.Board, legal_idxs, probs, epsilon: float = EPSILON):
+    """Epsilon-greedy sample from a policy returned by policy_for_board."""
+    if len(legal_idxs) == 0:
+        return None, None
+
+    # epsilon-greedy
+    if random.random() < epsilon:
+        idx = int(random.choice(legal_idxs))
+    else:
+        idx = int(legal_idxs[torch.multinomial(torch.as_tensor(probs, dtype=torch.float32), num_samples=1).item()])
+
+    move = action_to_move(idx, board)
+    # fallback if action_to_move produced illegal
+    if move is None or move not in board.legal_moves:
+        move = random.choice(list(board.legal_moves))
+        idx = move_to_action(move)
+    return idx, move
+
+
+def choose_action_for_board(board: chess.Board, model, epsilon: float = EPSILON, temperature: float = 1.0, state_t=None, cache=None):
+    """state_t: optional precomputed board_to_tensor(board), e.g. GameEngine.state_tensor()."""
+    legal_idxs, probs = policy_for_board(board, model, state_t, cache)
+    return sample_action(board, legal_idxs, probs, epsilon)
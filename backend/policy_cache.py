@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+import chess
+import chess.polyglot
+
+from backend.config import POLICY_CACHE_SIZE
+
+
+class PolicyCache:
+    """
+    LRU cache of masked policies keyed by the polyglot Zobrist hash of a board.
+
+    Entries are stored sparsely (legal action indices + probabilities), so
+    memory is bounded by max_entries * ~40 legal moves. version_fn returns the
+    version of the weights currently served; when it changes the cache is
+    cleared, so stale policies are never returned after new weights go live.
+    """
+
+    def __init__(self, max_entries: int = POLICY_CACHE_SIZE, version_fn=None):
+        self.max_entries = max(1, int(max_entries))
+        self.version_fn = version_fn
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(board: chess.Board) -> int:
+        return chess.polyglot.zobrist_hash(board)
+
+    def _check_version_locked(self):
+        if self.version_fn is None:
+            return
+        v = self.version_fn()
+        if v != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = v
+
+    def get(self, board: chess.Board):
+        """Return (legal_idxs, probs) or None."""
+        k = self.key(board)
+        with self._lock:
+            self._check_version_locked()
+            entry = self._entries.get(k)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(k)
+            self.hits += 1
+            return entry
+
+    def put(self, board: chess.Board, legal_idxs, probs):
+        entry = (np.asarray(legal_idxs, dtype=np.int16), np.asarray(probs, dtype=np.float32))
+        k = self.key(board)
+        with self._lock:
+            self._check_version_locked()
+            self._entries[k] = entry
+            self._entries.move_to_end(k)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,204 @@
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# config (and with it torch) is imported lazily so run.py can decorate its
+# eel functions before the heavy imports have happened
+
+_BUCKETS = 40        # bucket b holds durations in [2^(b-1), 2^b) microseconds
+
+
+class Histogram:
+    """Log2-bucketed latency histogram; recording is a couple of integer ops under a lock."""
+    __slots__ = ("counts", "n", "total", "max", "_lock")
+
+    def __init__(self):
+        self.counts = [0] * _BUCKETS
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        b = min(int(seconds * 1e6).bit_length(), _BUCKETS - 1)
+        with self._lock:
+            self.counts[b] += 1
+            self.n += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    @staticmethod
+    def _percentile_ms(counts, n, q: float, mx: float) -> float:
+        target = q * n
+        seen = 0
+        for b, c in enumerate(counts):
+            seen += c
+            if c and seen >= target:
+                # middle of the bucket, never above the largest value seen
+                return min((2 ** b) * 0.75 / 1000.0, mx * 1000.0)
+        return 0.0
+
+    def summary(self) -> dict:
+        with self._lock:
+            counts, n, total, mx = list(self.counts), self.n, self.total, self.max
+        return {
+            "count": n,
+            "total_ms": total * 1000.0,
+            "mean_ms": (total / n * 1000.0) if n else 0.0,
+            "p50_ms": self._percentile_ms(counts, n, 0.50, mx),
+            "p99_ms": self._percentile_ms(counts, n, 0.99, mx),
+            "max_ms": mx * 1000.0,
+        }
+
+
+class Profiler:
+    """Named timing spans feeding per-name histograms."""
+
+    def __init__(self):
+        self._hists = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str) -> Histogram:
+        h = self._hists.get(name)
+        if h is None:
+            with self._lock:
+                h = self._hists.setdefault(name, Histogram())
+        return h
+
+    def record(self, name: str, seconds: float):
+        self.histogram(name).record(seconds)
+
+    @contextmanager
+    def span(self, name: str):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(name).record(time.perf_counter() - t)
+
+    def timed(self, name: str = None):
+        """Decorator recording every call of the function under name (default: its qualified name)."""
+        def decorate(fn):
+            hist_name = name or fn.__qualname__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                t = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.histogram(hist_name).record(time.perf_counter() - t)
+            return wrapper
+        return decorate
+
+    @contextmanager
+    def locked(self, lock, name: str):
+        """Acquire lock, recording how long the acquire waited under name."""
+        t = time.perf_counter()
+        with lock:
+            self.histogram(name).record(time.perf_counter() - t)
+            yield
+
+    def summary(self) -> dict:
+        with self._lock:
+            items = list(self._hists.items())
+        return {name: h.summary() for name, h in sorted(items)}
+
+    def reset(self):
+        with self._lock:
+            self._hists = {}
+
+
+class StackSampler:
+    """
+    Sampling profiler: a thread snapshots every other thread's Python stack
+    each interval and counts them; stop() writes the counts in collapsed-stack
+    format ("thread;outer;...;inner count"), ready for flamegraph tools.
+    Costs nothing while not running.
+    """
+
+    def __init__(self, interval_ms: float = None, directory: str = None):
+        from backend.config import DATA_DIR, PROFILE_SAMPLE_INTERVAL_MS
+        interval_ms = PROFILE_SAMPLE_INTERVAL_MS if interval_ms is None else interval_ms
+        directory = DATA_DIR if directory is None else directory
+        self.interval = max(interval_ms, 0.1) / 1000.0
+        self.directory = directory
+        self.samples = 0
+        self._stacks = Counter()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running():
+            return self
+        self._stacks.clear()
+        self.samples = 0
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def _loop(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self) -> str:
+        """Stop sampling and write the collapsed stacks. Returns the file path (None if not running)."""
+        if not self.running():
+            return None
+        self._stop_event.set()
+        self._thread.join(timeout=2.0)
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"profile_{time.strftime('%Y%m%d_%H%M%S')}.collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+# process-wide profiler used by run.py and the backend hot paths
+PROFILER = Profiler()
+span = PROFILER.span
+timed = PROFILER.timed
+locked = PROFILER.locked
+
+_SAMPLER = None
+_SAMPLER_LOCK = threading.Lock()
+
+
+def set_sampling(enabled: bool, interval_ms: float = None) -> dict:
+    """Start or stop the process-wide stack sampler. Stopping writes the collapsed-stack file."""
+    global _SAMPLER
+    with _SAMPLER_LOCK:
+        if enabled:
+            if _SAMPLER is None or not _SAMPLER.running():
+                _SAMPLER = StackSampler(interval_ms).start()
+            return {"sampling": True, "path": None}
+        path = _SAMPLER.stop() if _SAMPLER is not None else None
+        samples = _SAMPLER.samples if _SAMPLER is not None else 0
+        _SAMPLER = None
+        return {"sampling": False, "path": path, "samples": samples}
+
+
+def sampling() -> bool:
+    return _SAMPLER is not None and _SAMPLER.running()
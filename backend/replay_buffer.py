@@ -1,41 +1,180 @@
-from collections import deque, namedtuple
-import random
-from backend.config import REPLAY_BUFFER_SIZE
+import threading
+import numpy as np
+import torch
+from backend.config import (
+    REPLAY_BUFFER_SIZE,
+    REPLAY_BUFFER_POSITIONS,
+    REPLAY_SAMPLING,
+    PRIORITY_ALPHA,
+    PRIORITY_BETA,
+    PRIORITY_EPS
+)
+from backend.sum_tree import SumTree
+from backend.utils import planes_to_bitboards, bitboards_to_planes
 
-Episode = namedtuple("Episode", ["states", "actions", "reward"])
 
 class ReplayBuffer:
-    def __init__(self, capacity: int = REPLAY_BUFFER_SIZE):
+    """
+    Preallocated ring buffer of positions.
+
+    Each position is stored as 12 uint64 bitboards plus an int16 action,
+    a float32 reward and the id of the episode it came from. Episodes are
+    kept in a second ring (start, length) so sampling can still pick an
+    episode first and then a position inside it, as before.
+    `capacity` is the maximum number of episodes, `max_positions` the
+    maximum number of positions across all of them; the oldest episodes
+    are evicted when either limit is reached.
+
+    sampling="prioritized" samples positions (not episodes) with probability
+    proportional to priority^alpha from a SumTree over the slots. New
+    positions get the current maximum priority, update_priorities() feeds
+    back per-sample losses, and sample() also returns importance-sampling
+    weights and the keys needed for that update.
+    """
+
+    def __init__(self, capacity: int = REPLAY_BUFFER_SIZE, max_positions: int = REPLAY_BUFFER_POSITIONS,
+                 sampling: str = REPLAY_SAMPLING, alpha: float = PRIORITY_ALPHA, beta: float = PRIORITY_BETA):
         self.capacity = capacity
-        self.buffer = deque(maxlen=capacity)
+        self.max_positions = max_positions
+        if sampling not in ("uniform", "prioritized"):
+            raise ValueError(f"unknown sampling mode {sampling!r}")
+        self.sampling = sampling
+        self.alpha = alpha
+        self.beta = beta              # IS exponent; the trainer anneals it towards 1
+        self.tree = SumTree(max_positions) if sampling == "prioritized" else None
+        self._max_priority = 1.0
+
+        # position columns
+        self.boards = np.zeros((max_positions, 12), dtype=np.uint64)
+        self.actions = np.zeros(max_positions, dtype=np.int16)
+        self.rewards = np.zeros(max_positions, dtype=np.float32)
+        self.episode_ids = np.full(max_positions, -1, dtype=np.int64)
+        self._pos_head = 0          # next write slot
+        self._pos_count = 0         # live positions
+
+        # episode ring: start slot and length of each live episode
+        self._ep_start = np.zeros(capacity, dtype=np.int64)
+        self._ep_len = np.zeros(capacity, dtype=np.int64)
+        self._ep_first = 0          # ring index of the oldest episode
+        self._ep_count = 0
+        self._next_episode_id = 0
+
+        self._lock = threading.Lock()
+
+    def _evict_oldest(self):
+        if self.tree is not None:
+            # evicted slots must not be sampled before they are overwritten
+            slots = (self._ep_start[self._ep_first] + np.arange(self._ep_len[self._ep_first])) % self.max_positions
+            self.tree.update(slots, 0.0)
+        self._pos_count -= int(self._ep_len[self._ep_first])
+        self._ep_first = (self._ep_first + 1) % self.capacity
+        self._ep_count -= 1
+
+    def add(self, states, actions: list, reward: float):
+        """states: list of (1,12,8,8)/(12,8,8) tensors or a stacked tensor."""
+        if isinstance(states, (list, tuple)):
+            if not states:
+                return
+            states = torch.cat([s.reshape(1, 12, 8, 8) for s in states], dim=0)
+        bitboards = planes_to_bitboards(states.detach().cpu().numpy())
+        self.add_packed(bitboards, actions, reward)
 
-    def add(self, states: list, actions: list, reward: float):
-        episode = Episode(states=states, actions=actions, reward=reward)
-        self.buffer.append(episode)
+    def add_packed(self, bitboards: np.ndarray, actions, reward: float):
+        """Add an episode already packed with utils.planes_to_bitboards."""
+        n = len(bitboards)
+        if n == 0:
+            return
+        if n > self.max_positions:
+            # keep the tail of an over-long episode
+            bitboards, actions = bitboards[-self.max_positions:], actions[-self.max_positions:]
+            n = self.max_positions
+
+        with self._lock:
+            while self._ep_count and (self._ep_count >= self.capacity or self._pos_count + n > self.max_positions):
+                self._evict_oldest()
+
+            slots = (self._pos_head + np.arange(n)) % self.max_positions
+            self.boards[slots] = bitboards
+            self.actions[slots] = np.asarray(actions, dtype=np.int16)
+            self.rewards[slots] = reward
+            self.episode_ids[slots] = self._next_episode_id
+            if self.tree is not None:
+                self.tree.update(slots, self._max_priority ** self.alpha)
+
+            ep = (self._ep_first + self._ep_count) % self.capacity
+            self._ep_start[ep] = self._pos_head
+            self._ep_len[ep] = n
+            self._ep_count += 1
+            self._next_episode_id += 1
+            self._pos_head = (self._pos_head + n) % self.max_positions
+            self._pos_count += n
 
     def sample(self, batch_size: int):
-        if len(self.buffer) == 0 or batch_size <= 0:
-            return [], [], []
+        """
+        Returns (states (batch,12,8,8) float32, actions (batch,) long, rewards (batch,) float32)
+        as CPU tensors. In prioritized mode two more tensors follow:
+        importance-sampling weights (batch,) float32 and keys (batch,2) long
+        for update_priorities(). If there is nothing to sample, the same
+        number of values is returned, each an empty list.
+        """
+        if self._ep_count == 0 or batch_size <= 0:
+            return ([], [], [], [], []) if self.tree is not None else ([], [], [])
+        if self.tree is not None:
+            return self._sample_prioritized(batch_size)
 
-        # if we have enough unique episodes, sample without replacement,
-        # otherwise allow repeats with choices
-        if len(self.buffer) >= batch_size:
-            sampled_episodes = random.sample(self.buffer, k=batch_size)
-        else:
-            sampled_episodes = random.choices(self.buffer, k=batch_size)
+        with self._lock:
+            # if we have enough unique episodes, sample without replacement,
+            # otherwise allow repeats
+            replace = self._ep_count < batch_size
+            eps = np.random.choice(self._ep_count, size=batch_size, replace=replace)
+            eps = (self._ep_first + eps) % self.capacity
+            offsets = (np.random.random(batch_size) * self._ep_len[eps]).astype(np.int64)
+            slots = (self._ep_start[eps] + offsets) % self.max_positions
 
-        sampled_states, sampled_actions, sampled_rewards = [], [], []
+            boards = self.boards[slots]
+            actions = self.actions[slots].astype(np.int64)
+            rewards = self.rewards[slots].copy()
 
-        for ep in sampled_episodes:
-            if not ep.states:
-                continue
-            idx = random.randrange(len(ep.states))
-            sampled_states.append(ep.states[idx])
-            sampled_actions.append(ep.actions[idx])
-            sampled_rewards.append(ep.reward)
+        states = torch.from_numpy(bitboards_to_planes(boards).astype(np.float32))
+        return states, torch.from_numpy(actions), torch.from_numpy(rewards)
 
-        return sampled_states, sampled_actions, sampled_rewards
+    def _sample_prioritized(self, batch_size: int):
+        with self._lock:
+            slots = self.tree.sample(batch_size)
+            probs = self.tree.get(slots) / self.tree.total()
+            # IS weights (N * P)^-beta, normalized by the largest in the batch
+            weights = (self._pos_count * np.maximum(probs, 1e-12)) ** (-self.beta)
+            weights = (weights / weights.max()).astype(np.float32)
+            keys = np.stack([slots, self.episode_ids[slots]], axis=1)
 
-    def __len__(self):
-        return len(self.buffer)
+            boards = self.boards[slots]
+            actions = self.actions[slots].astype(np.int64)
+            rewards = self.rewards[slots].copy()
 
+        states = torch.from_numpy(bitboards_to_planes(boards).astype(np.float32))
+        return (states, torch.from_numpy(actions), torch.from_numpy(rewards),
+                torch.from_numpy(weights), torch.from_numpy(keys))
+
+    def update_priorities(self, keys, losses):
+        """
+        Set the priority of sampled positions from their per-sample losses.
+        keys come from sample(); positions overwritten since then are skipped.
+        """
+        if self.tree is None:
+            return
+        keys = np.asarray(keys, dtype=np.int64).reshape(-1, 2)
+        priorities = np.abs(np.asarray(losses, dtype=np.float64)).ravel() + PRIORITY_EPS
+        with self._lock:
+            oldest_live = self._next_episode_id - self._ep_count
+            live = (self.episode_ids[keys[:, 0]] == keys[:, 1]) & (keys[:, 1] >= oldest_live)
+            if not live.any():
+                return
+            slots, priorities = keys[live, 0], priorities[live]
+            self._max_priority = max(self._max_priority, float(priorities.max()))
+            self.tree.update(slots, priorities ** self.alpha)
+
+    def num_positions(self) -> int:
+        return self._pos_count
+
+    def __len__(self):
+        return self._ep_count
@@ -0,0 +1,198 @@
+import math
+import time
+import torch
+import chess
+
+from backend.config import SEARCH_TIME_BUDGET, SEARCH_MAX_NODES, SEARCH_BATCH_SIZE, SEARCH_C_PUCT
+from backend.inference import InferenceServer
+from backend.utils import boards_to_tensor, legal_move_masks, indices_to_mask, action_to_move, move_to_action
+
+PIECE_VALUES = {chess.PAWN: 1, chess.KNIGHT: 3, chess.BISHOP: 3, chess.ROOK: 5, chess.QUEEN: 9}
+
+
+def material_value(board: chess.Board) -> float:
+    """Material balance for the side to move, squashed to (-1, 1)."""
+    diff = 0
+    for pt, val in PIECE_VALUES.items():
+        diff += val * (chess.popcount(board.pieces_mask(pt, chess.WHITE)) - chess.popcount(board.pieces_mask(pt, chess.BLACK)))
+    if board.turn == chess.BLACK:
+        diff = -diff
+    return math.tanh(diff / 8.0)
+
+
+def terminal_value(board: chess.Board):
+    """Value for the side to move if the game is over, else None."""
+    outcome = board.outcome(claim_draw=False)
+    if outcome is None:
+        return None
+    if outcome.winner is None:
+        return 0.0
+    return 1.0 if outcome.winner == board.turn else -1.0
+
+
+class Node:
+    # value_sum is from the point of view of the player who made `move`
+    __slots__ = ("parent", "move", "prior", "children", "visits", "value_sum", "expanded")
+
+    def __init__(self, parent=None, move=None, prior: float = 1.0):
+        self.parent = parent
+        self.move = move
+        self.prior = prior
+        self.children = {}
+        self.visits = 0
+        self.value_sum = 0.0
+        self.expanded = False
+
+    def q(self) -> float:
+        return self.value_sum / self.visits if self.visits else 0.0
+
+
+class MCTS:
+    """
+    PUCT search using ChessPolicyNet as the move prior.
+
+    The network has no value head, so leaves are scored by material (and
+    exact results at terminal positions). Each iteration selects up to
+    batch_size leaves using virtual loss and evaluates them with a single
+    forward pass. The tree is kept between calls and re-rooted at the
+    current position when it descends from the previous root.
+    """
+
+    def __init__(self, model, c_puct: float = SEARCH_C_PUCT, batch_size: int = SEARCH_BATCH_SIZE):
+        self.model = model
+        self.c_puct = c_puct
+        self.batch_size = max(1, int(batch_size))
+        self.root = None
+        self._root_stack = None
+        self.last_stats = {}
+
+    def reset(self):
+        self.root = None
+        self._root_stack = None
+
+    # tree reuse ------------------------------------------------------------------
+    def _reroot(self, board: chess.Board):
+        stack = board.move_stack
+        if self.root is not None and self._root_stack is not None and stack[:len(self._root_stack)] == self._root_stack:
+            node = self.root
+            for mv in stack[len(self._root_stack):]:
+                node = node.children.get(mv)
+                if node is None:
+                    break
+            if node is not None:
+                node.parent = None
+                self.root = node
+                self._root_stack = list(stack)
+                return True
+        self.root = Node()
+        self._root_stack = list(stack)
+        return False
+
+    # evaluation ------------------------------------------------------------------
+    def _priors(self, boards):
+        """List of (legal_idxs, probs) for boards, one forward pass for the batch."""
+        if isinstance(self.model, InferenceServer):
+            futures = [self.model.submit(b) for b in boards]
+            return [self.model.result(f) for f in futures]
+        idxs_list = legal_move_masks(boards, sparse=True)
+        with torch.no_grad():
+            logits = self.model(boards_to_tensor(boards))
+            mask = indices_to_mask(idxs_list, logits.device)
+            probs = torch.softmax(logits.masked_fill(~mask, -1e9), dim=-1).cpu().numpy()
+        return [(idxs, probs[i, idxs]) for i, idxs in enumerate(idxs_list)]
+
+    def _expand(self, node: Node, board: chess.Board, legal_idxs, probs):
+        priors = {}
+        for idx, p in zip(legal_idxs, probs):
+            priors[int(idx)] = float(p)
+            mv = action_to_move(int(idx), board)
+            if mv is not None:
+                node.children[mv] = Node(node, mv, float(p))
+        # capture-promotions share an action index with the push; give them the same prior
+        for mv in board.legal_moves:
+            if mv not in node.children:
+                node.children[mv] = Node(node, mv, priors.get(move_to_action(mv), 1e-3))
+        node.expanded = True
+
+    # search ----------------------------------------------------------------------
+    def _select_child(self, node: Node) -> Node:
+        sqrt_n = math.sqrt(max(node.visits, 1))
+        best, best_score = None, -float("inf")
+        for child in node.children.values():
+            score = child.q() + self.c_puct * child.prior * sqrt_n / (1 + child.visits)
+            if score > best_score:
+                best, best_score = child, score
+        return best
+
+    @staticmethod
+    def _backup(node: Node, value: float, virtual: bool):
+        # value is for the side to move at the leaf, i.e. against the player who moved into it
+        v = -value
+        while node is not None:
+            if virtual:
+                node.value_sum += 1.0       # undo the virtual loss
+            else:
+                node.visits += 1
+            node.value_sum += v
+            v = -v
+            node = node.parent
+
+    @staticmethod
+    def _apply_virtual_loss(node: Node):
+        while node is not None:
+            node.visits += 1
+            node.value_sum -= 1.0
+            node = node.parent
+
+    def search(self, board: chess.Board, time_budget: float = SEARCH_TIME_BUDGET, max_nodes: int = SEARCH_MAX_NODES):
+        """Search from board within the budget. Returns (best move, stats)."""
+        start = time.perf_counter()
+        reused = self._reroot(board)
+        reused_visits = self.root.visits
+        nodes = 0
+
+        if board.is_game_over():
+            return None, {}
+
+        while True:
+            if max_nodes and nodes >= max_nodes:
+                break
+            if time_budget and time.perf_counter() - start >= time_budget and self.root.expanded:
+                break
+
+            leaves, seen = [], set()
+            for _ in range(self.batch_size):
+                node, b = self.root, board.copy(stack=False)
+                while node.expanded and node.children:
+                    node = self._select_child(node)
+                    b.push(node.move)
+                tv = terminal_value(b)
+                if tv is not None:
+                    self._backup(node, tv, virtual=False)
+                    nodes += 1
+                    continue
+                if id(node) in seen:
+                    break
+                seen.add(id(node))
+                self._apply_virtual_loss(node)
+                leaves.append((node, b))
+
+            if leaves:
+                for (node, b), (idxs, probs) in zip(leaves, self._priors([b for _, b in leaves])):
+                    self._expand(node, b, idxs, probs)
+                    self._backup(node, material_value(b), virtual=True)
+                nodes += len(leaves)
+
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        best = max(self.root.children.values(), key=lambda c: c.visits)
+        self.last_stats = {
+            "nodes": nodes,
+            "seconds": elapsed,
+            "nodes_per_sec": nodes / elapsed,
+            "root_visits": self.root.visits,
+            "reused_visits": reused_visits if reused else 0,
+            "best_move": best.move.uci(),
+            "best_visits": best.visits,
+            "best_q": best.q(),
+        }
+        return best.move, self.last_stats
@@ -0,0 +1,226 @@
+import argparse
+import os
+import multiprocessing as mp
+import time
+import chess
+import numpy as np
+import torch
+
+from backend.config import (
+    EPSILON,
+    SELF_PLAY_WORKERS,
+    SELF_PLAY_MAX_PLIES,
+    SELF_PLAY_REPORT_EVERY,
+    MODEL_DIR,
+    DATASET_DIR,
+    USE_DATASET,
+    ARCHIVE_DIR,
+    USE_ARCHIVE,
+    TRAIN_THREADS
+)
+from backend.game_engine import GameEngine
+from backend.game_archive import GameArchive, AI_WHITE, AI_BLACK
+from backend.model import build_model, load_model, model_checkpoint, checkpoint_arch, checkpoint_state_dict
+from backend.policy import choose_action_for_board
+from backend.utils import game_rewards, planes_to_bitboards
+
+# per-process model, built once by _init_worker
+_WORKER_MODEL = None
+_WORKER_EPSILON = EPSILON
+_WORKER_MAX_PLIES = SELF_PLAY_MAX_PLIES
+
+
+def _init_worker(checkpoint, epsilon: float, max_plies: int):
+    global _WORKER_MODEL, _WORKER_EPSILON, _WORKER_MAX_PLIES
+    # one intra-op thread per worker: parallelism comes from the process pool
+    torch.set_num_threads(1)
+    arch, arch_config = checkpoint_arch(checkpoint)
+    model = build_model(arch, arch_config)
+    model.load_state_dict(checkpoint_state_dict(checkpoint))
+    model.eval()
+    _WORKER_MODEL = model
+    _WORKER_EPSILON = epsilon
+    _WORKER_MAX_PLIES = max_plies
+
+
+def play_game(model, epsilon: float = EPSILON, max_plies: int = SELF_PLAY_MAX_PLIES) -> dict:
+    """
+    Play one game of the model against itself.
+    Returns per-side states (packed (n,12) uint64 bitboards), actions and rewards.
+    """
+    engine = GameEngine()
+    states = {chess.WHITE: [], chess.BLACK: []}
+    actions = {chess.WHITE: [], chess.BLACK: []}
+
+    while not engine.is_game_over() and len(engine.moves_played) < max_plies:
+        turn = engine.board.turn
+        state_t = engine.state_tensor()
+        idx, move = choose_action_for_board(engine.board, model, epsilon, state_t=state_t)
+        if move is None:
+            break
+        states[turn].append(state_t.cpu().numpy())
+        actions[turn].append(idx)
+        engine.make_move(move)
+
+    # games cut off at max_plies are scored as draws
+    res = engine.result() or "1/2-1/2"
+    reward_w, reward_b = game_rewards(res)
+
+    def _stack(side):
+        if not states[side]:
+            return np.zeros((0, 12), dtype=np.uint64)
+        return planes_to_bitboards(np.concatenate(states[side]))
+
+    return {
+        "result": res,
+        "moves": len(engine.moves_played),
+        "move_list": engine.moves_played,
+        "states_w": _stack(chess.WHITE),
+        "actions_w": actions[chess.WHITE],
+        "reward_w": reward_w,
+        "states_b": _stack(chess.BLACK),
+        "actions_b": actions[chess.BLACK],
+        "reward_b": reward_b,
+    }
+
+
+def _worker_play(_game_idx: int) -> dict:
+    with torch.no_grad():
+        return play_game(_WORKER_MODEL, _WORKER_EPSILON, _WORKER_MAX_PLIES)
+
+
+class SelfPlayRunner:
+    """
+    Plays headless self-play games on a pool of worker processes and streams
+    each finished game into the trainer's replay buffer (and the game
+    archive, if given) as it arrives.
+    """
+
+    def __init__(self, trainer, num_workers: int = SELF_PLAY_WORKERS, epsilon: float = EPSILON,
+                 max_plies: int = SELF_PLAY_MAX_PLIES, report_every: float = SELF_PLAY_REPORT_EVERY,
+                 archive=None):
+        self.trainer = trainer
+        self.archive = archive
+        self.num_workers = max(1, int(num_workers))
+        self.epsilon = epsilon
+        self.max_plies = max_plies
+        self.report_every = report_every
+        self.games_played = 0
+        self.positions_played = 0
+        self.results = {"1-0": 0, "0-1": 0, "1/2-1/2": 0}
+        self._model_version = 0
+
+    def _snapshot_weights(self):
+        # workers always run on CPU copies of the current weights
+        model = self.trainer.model
+        return model_checkpoint(model, {k: v.detach().cpu().clone() for k, v in model.state_dict().items()})
+
+    def _store(self, game: dict):
+        game_id = self.trainer.new_game_id()
+        if game["actions_w"]:
+            self.trainer.store_packed_game(game["states_w"], game["actions_w"], game["reward_w"], game_id, 0)
+        if game["actions_b"]:
+            self.trainer.store_packed_game(game["states_b"], game["actions_b"], game["reward_b"], game_id, 1)
+        if self.archive is not None:
+            # workers play with the weights snapshotted when run() started
+            self.archive.append(game["move_list"], game["result"], model_version=self._model_version,
+                                players=AI_WHITE | AI_BLACK, dataset_game_id=game_id)
+
+    def run(self, num_games: int, on_game=None) -> dict:
+        """
+        Play num_games games and store them in the replay buffer.
+        on_game(game) is called in this process after each game is stored
+        (e.g. to run a train step). Returns throughput stats.
+        """
+        ctx = mp.get_context("spawn")
+        self._model_version = self.trainer.steps
+        start = time.perf_counter()
+        last_report = start
+        games = 0
+        positions = 0
+
+        with ctx.Pool(
+            processes=self.num_workers,
+            initializer=_init_worker,
+            initargs=(self._snapshot_weights(), self.epsilon, self.max_plies),
+        ) as pool:
+            for game in pool.imap_unordered(_worker_play, range(num_games)):
+                self._store(game)
+                games += 1
+                positions += game["moves"]
+                self.results[game["result"]] = self.results.get(game["result"], 0) + 1
+                if on_game is not None:
+                    on_game(game)
+
+                now = time.perf_counter()
+                if self.report_every and now - last_report >= self.report_every:
+                    elapsed = now - start
+                    print(f"self-play: {games}/{num_games} games, "
+                          f"{games / elapsed:.2f} games/s, {positions / elapsed:.1f} positions/s")
+                    last_report = now
+
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        self.games_played += games
+        self.positions_played += positions
+        stats = {
+            "games": games,
+            "positions": positions,
+            "seconds": elapsed,
+            "games_per_sec": games / elapsed,
+            "positions_per_sec": positions / elapsed,
+            "results": dict(self.results),
+        }
+        print(f"self-play done: {games} games in {elapsed:.1f}s ({stats['games_per_sec']:.2f} games/s)")
+        return stats
+
+
+def main():
+    from backend.dataset import ShardedDataset
+    from backend.perf import set_interop_threads, use_intra_threads
+    from backend.trainer import Trainer
+
+    parser = argparse.ArgumentParser(description="Headless self-play data generation")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=SELF_PLAY_WORKERS)
+    parser.add_argument("--epsilon", type=float, default=EPSILON)
+    parser.add_argument("--max-plies", type=int, default=SELF_PLAY_MAX_PLIES)
+    parser.add_argument("--train-steps-per-game", type=int, default=1,
+                        help="train steps to run after each stored game (0 = collect only)")
+    parser.add_argument("--model", default=os.path.join(MODEL_DIR, "latest_model.pth"))
+    parser.add_argument("--no-save", action="store_true", help="do not save the model when done")
+    parser.add_argument("--dataset", default=DATASET_DIR if USE_DATASET else None,
+                        help="sharded dataset the games are appended to (and trained from)")
+    parser.add_argument("--no-dataset", action="store_true", help="keep games in the in-memory replay buffer only")
+    parser.add_argument("--archive", default=ARCHIVE_DIR if USE_ARCHIVE else None,
+                        help="game archive every finished game is appended to")
+    parser.add_argument("--no-archive", action="store_true")
+    args = parser.parse_args()
+
+    # train steps run on this thread; the workers pin themselves to one thread each
+    set_interop_threads()
+    use_intra_threads(TRAIN_THREADS)
+    model = load_model(args.model)
+    dataset = ShardedDataset(args.dataset) if args.dataset and not args.no_dataset else None
+    trainer = Trainer(model, dataset)
+    # continue the step count and optimizer state, so checkpoints and archived games carry real steps
+    if os.path.exists(args.model):
+        trainer.load_checkpoint(restore_model=False)
+    archive = GameArchive(args.archive) if args.archive and not args.no_archive else None
+    runner = SelfPlayRunner(trainer, num_workers=args.workers, epsilon=args.epsilon, max_plies=args.max_plies,
+                            archive=archive)
+
+    def on_game(_game):
+        for _ in range(args.train_steps_per_game):
+            trainer.train_step()
+
+    runner.run(args.games, on_game=on_game)
+    if dataset is not None:
+        dataset.close()
+    if archive is not None:
+        archive.close()
+    if not args.no_save:
+        trainer.save_model("latest_model.pth")
+
+
+if __name__ == "__main__":
+    main()
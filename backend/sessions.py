@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+import chess
+from gevent.lock import RLock
+
+from backend.config import MAX_SESSIONS, SESSION_IDLE_TIMEOUT
+from backend.game_engine import GameEngine
+from backend.utils import game_rewards
+from backend.game_archive import AI_WHITE, AI_BLACK
+
+
+class GameSession:
+    """One game: its own GameEngine plus the per-side trajectories recorded for training."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.engine = GameEngine()
+        self.states = {chess.WHITE: [], chess.BLACK: []}
+        self.actions = {chess.WHITE: [], chess.BLACK: []}
+        self.ai_sides = set()         # colours that had a move chosen by the AI, for the archive
+        # eel serves every call as a greenlet on one thread, and ai_move yields mid-move
+        # (inference, search, startup waits): a greenlet-aware lock, threading's would not exclude
+        self.lock = RLock()
+        self.last_used = time.monotonic()
+        # MCTS tree kept between plies when the AI plays in search mode
+        self.searcher = None
+
+    def record(self, state_t, action: int, ai: bool = False):
+        """Record the state before a move and the action taken, for the side to move."""
+        turn = self.engine.board.turn
+        self.states[turn].append(state_t)
+        self.actions[turn].append(int(action))
+        if ai:
+            self.ai_sides.add(turn)
+
+    def clear_trajectories(self):
+        self.states = {chess.WHITE: [], chess.BLACK: []}
+        self.actions = {chess.WHITE: [], chess.BLACK: []}
+        self.ai_sides = set()
+
+    def reset(self):
+        self.engine.reset()
+        self.clear_trajectories()
+        if self.searcher is not None:
+            self.searcher.reset()
+
+
+class SessionManager:
+    """
+    Maps session ids to isolated GameSessions.
+    Sessions idle for longer than idle_timeout seconds are evicted, and once
+    max_sessions are live the least recently used one makes room for a new one.
+    With an archive attached, finished games are also appended to it, tagged
+    with model_version() of the weights that played.
+    """
+
+    def __init__(self, trainer, max_sessions: int = MAX_SESSIONS, idle_timeout: float = SESSION_IDLE_TIMEOUT,
+                 archive=None, model_version=None):
+        self.trainer = trainer
+        self.archive = archive
+        self.model_version = model_version
+        self.max_sessions = max(1, int(max_sessions))
+        self.idle_timeout = idle_timeout
+        self._sessions = OrderedDict()        # session_id -> GameSession, LRU order
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def get(self, session_id: str) -> GameSession:
+        """Return the session for session_id, creating it if needed."""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                self._evict_idle_locked(now)
+                while len(self._sessions) >= self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted += 1
+                session = GameSession(session_id)
+                self._sessions[session_id] = session
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_used = now
+            return session
+
+    def close(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def _evict_idle_locked(self, now: float):
+        while self._sessions:
+            sid, oldest = next(iter(self._sessions.items()))
+            if now - oldest.last_used < self.idle_timeout:
+                break
+            del self._sessions[sid]
+            self.evicted += 1
+
+    def evict_idle(self) -> int:
+        """Drop sessions idle for longer than idle_timeout. Returns how many were removed."""
+        with self._lock:
+            before = len(self._sessions)
+            self._evict_idle_locked(time.monotonic())
+            return before - len(self._sessions)
+
+    def finish_game(self, session: GameSession) -> str:
+        """
+        Hand a finished game's trajectories to the trainer (and the whole game
+        to the archive) and clear them. Call with session.lock held. Returns the game result.
+        """
+        res = session.engine.result() or "1/2-1/2"
+        reward_w, reward_b = game_rewards(res)
+        # ReplayBuffer.add is locked, so sessions can finish concurrently
+        game_id = self.trainer.new_game_id()
+        if session.states[chess.WHITE]:
+            self.trainer.store_game(session.states[chess.WHITE], session.actions[chess.WHITE], reward_w, game_id, 0)
+        if session.states[chess.BLACK]:
+            self.trainer.store_game(session.states[chess.BLACK], session.actions[chess.BLACK], reward_b, game_id, 1)
+        if self.archive is not None and session.engine.moves_played:
+            players = (AI_WHITE if chess.WHITE in session.ai_sides else 0) | (AI_BLACK if chess.BLACK in session.ai_sides else 0)
+            self.archive.append(session.engine.moves_played, res,
+                                model_version=self.model_version() if self.model_version is not None else 0,
+                                players=players, dataset_game_id=game_id)
+        session.clear_trajectories()
+        return res
+
+    def __len__(self):
+        return len(self._sessions)
@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# deliberately free of torch/backend imports: run.py imports this before anything heavy
+
+
+class Startup:
+    """
+    Runs the expensive part of application startup on a background thread
+    and records how long each phase took.
+
+    The initializer marks named milestones (e.g. "core", "model") as they
+    become usable; callers block in wait(name) only while that milestone is
+    still pending. report() gives the per-phase timings, measured from t0
+    (normally taken as the first statement of run.py).
+    """
+
+    def __init__(self, t0: float = None):
+        self.t0 = time.perf_counter() if t0 is None else t0
+        self.phases = {}              # name -> seconds, in completion order
+        self.milestones = {}          # name -> seconds since t0
+        self.error = None
+        self._events = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _event(self, name: str) -> threading.Event:
+        with self._lock:
+            return self._events.setdefault(name, threading.Event())
+
+    @contextmanager
+    def phase(self, name: str):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - t
+
+    def mark(self, name: str):
+        """Milestone reached: wake everyone waiting for it."""
+        self.milestones[name] = time.perf_counter() - self.t0
+        self._event(name).set()
+
+    def ready(self, name: str) -> bool:
+        return self._event(name).is_set()
+
+    def wait(self, name: str, timeout: float = None, sleep=None):
+        """
+        Block until milestone name is reached. Raises if the initializer failed first.
+        sleep(seconds), if given, is used to poll instead of blocking on the event;
+        pass a cooperative sleep (gevent/eel.sleep) when waiting inside a greenlet,
+        where a blocking wait would stall every other greenlet on the hub.
+        """
+        event = self._event(name)
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def pending():
+            if sleep is None:
+                return not event.wait(0.05)
+            if event.is_set():
+                return False
+            sleep(0.05)
+            return True
+
+        while pending():
+            if self.error is not None:
+                raise RuntimeError(f"startup failed: {self.error!r}")
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"startup milestone {name!r} not reached within {timeout}s")
+
+    def start(self, initializer):
+        """Run initializer(self) on a daemon thread."""
+        def run():
+            try:
+                initializer(self)
+            except Exception as e:
+                self.error = e
+                print("Startup failed:", repr(e))
+        self._thread = threading.Thread(target=run, name="startup", daemon=True)
+        self._thread.start()
+        return self
+
+    def report(self) -> dict:
+        return {
+            "phases_s": dict(self.phases),
+            "milestones_s": dict(self.milestones),
+            "error": repr(self.error) if self.error is not None else None,
+        }
+
+    def save_report(self, path: str):
+        """Append this start's report to a JSON-lines file for tracking startup time across versions."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"ts": int(time.time()), **self.report()}) + "\n")
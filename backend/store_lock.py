@@ -0,0 +1,48 @@
+import os
+
+try:
+    import fcntl
+except ImportError:         # Windows
+    fcntl = None
+    import msvcrt
+
+
+class StoreLockedError(RuntimeError):
+    """Another writer already holds the store."""
+
+
+class WriterLock:
+    """
+    Exclusive lock on <directory>/<name>, held while a store is open for
+    writing so two processes (the app and a CLI) never interleave writes to
+    the same files. The OS drops the lock when the holder exits, even after
+    a crash, so a stale lock file never blocks anyone. Readers do not lock.
+    """
+
+    def __init__(self, directory: str, name: str = "writer.lock"):
+        self.path = os.path.join(directory, name)
+        self._fd = None
+
+    def acquire(self) -> "WriterLock":
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        except OSError:
+            os.close(fd)
+            raise StoreLockedError(f"{os.path.dirname(self.path)} is already open for writing in another process "
+                                   f"(lock {self.path}); stop it or use a different directory") from None
+        self._fd = fd
+        return self
+
+    def release(self):
+        if self._fd is None:
+            return
+        if fcntl is None:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        os.close(self._fd)      # closing the descriptor drops a flock
+        self._fd = None
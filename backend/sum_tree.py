@@ -0,0 +1,51 @@
+import numpy as np
+
+
+class SumTree:
+    """
+    Binary sum-tree over `capacity` non-negative priorities, stored as a flat
+    array: node i has children 2i and 2i+1, leaves start at `size` (the
+    capacity rounded up to a power of two) and node 1 holds the total.
+    update() and sample() are vectorized over a batch and cost
+    O(batch * log capacity).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = int(capacity)
+        size = 1
+        while size < self.capacity:
+            size *= 2
+        self.size = size
+        self.depth = size.bit_length() - 1
+        self.tree = np.zeros(2 * size, dtype=np.float64)
+
+    def total(self) -> float:
+        return float(self.tree[1])
+
+    def get(self, idx) -> np.ndarray:
+        return self.tree[self.size + np.asarray(idx, dtype=np.int64)]
+
+    def update(self, idx, priorities):
+        """Set leaf priorities and refresh every ancestor."""
+        nodes = self.size + np.asarray(idx, dtype=np.int64).ravel()
+        self.tree[nodes] = np.broadcast_to(np.asarray(priorities, dtype=np.float64), nodes.shape)
+        for _ in range(self.depth):
+            nodes = np.unique(nodes >> 1)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values: np.ndarray) -> np.ndarray:
+        """Leaf index whose cumulative-priority interval contains each value in [0, total)."""
+        values = np.array(values, dtype=np.float64)
+        nodes = np.ones(len(values), dtype=np.int64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            go_right = values >= self.tree[left]
+            values -= np.where(go_right, self.tree[left], 0.0)
+            nodes = left + go_right
+        return np.minimum(nodes - self.size, self.capacity - 1)
+
+    def sample(self, batch_size: int, rng=np.random) -> np.ndarray:
+        """Stratified sample: one leaf from each of batch_size equal slices of the total mass."""
+        total = self.total()
+        bounds = (np.arange(batch_size) + rng.random_sample(batch_size)) * (total / batch_size)
+        return self.find(np.minimum(bounds, np.nextafter(total, 0)))
@@ -6,103 +6,300 @@ import torch.nn as nn
 import torch.optim as optim
 
 from typing import List
+from collections import deque
 from backend.config import (
     LEARNING_RATE,
     BATCH_SIZE,
     MODEL_DIR,
-    DEVICE
+    DEVICE,
+    TRAIN_INTERVAL,
+    TRAIN_STEPS_PER_WAKEUP,
+    PRIORITY_BETA,
+    PRIORITY_BETA_STEPS,
+    TRAIN_THREADS,
+    TRAIN_CHANNELS_LAST,
+    TRAIN_BF16,
+    TRAIN_COMPILE
 )
 
 from backend.utils import masked_softmax
 from backend.replay_buffer import ReplayBuffer
-from backend.model import ChessPolicyNet
-import os
+from backend.model import ChessPolicyNet, checkpoint_state_dict
+from backend.checkpoint import CheckpointWriter
+from backend.weights import WeightPublisher
+from backend.data_pipeline import BatchPrefetcher
+from backend.profiling import timed, locked
+from backend.perf import use_intra_threads, bf16_supported, describe
 
 class Trainer:
-    def __init__(self, model: ChessPolicyNet):
+    def __init__(self, model: ChessPolicyNet, dataset=None, channels_last: bool = TRAIN_CHANNELS_LAST,
+                 bf16: bool = TRAIN_BF16, compile_model: bool = TRAIN_COMPILE, threads: int = TRAIN_THREADS):
         self.model = model
+        # performance mode: the parameters stay fp32 and self.model stays the eager module
+        # (checkpoints and inference snapshots); only the training forward goes through self._forward
+        self.channels_last = bool(channels_last)
+        if self.channels_last:
+            self.model.to(memory_format=torch.channels_last)
+        self.bf16 = bool(bf16) and bf16_supported(DEVICE)
+        if bf16 and not self.bf16:
+            print("bf16 autocast not supported on this device, training in fp32")
+        self.compiled = bool(compile_model) and hasattr(torch, "compile")
+        self._forward = torch.compile(self.model) if self.compiled else self.model
+        self.threads = threads
         self.optimizer = optim.Adam(self.model.parameters(), lr=LEARNING_RATE)
         self.loss_fn = nn.CrossEntropyLoss(reduction="none")
         self.buffer = ReplayBuffer()
+        # with a ShardedDataset, games are persisted there and batches sampled from it
+        self.dataset = dataset
+        self.source = dataset if dataset is not None else self.buffer
+        self.steps = 0
+        self.samples_trained = 0
+        self._rate_window = deque(maxlen=64)     # (time, samples_trained) for samples/sec
+        self.prefetcher = None
+        # serializes optimizer steps against each other and against checkpoint snapshots
+        self._lock = threading.Lock()
+        self.checkpoints = CheckpointWriter(self.model, self.optimizer)
+        # set by request_checkpoint(); the next optimizer step takes the snapshot
+        self._checkpoint_due = False
+        # self.model is the training copy; inference reads self.weights.current()
+        self.weights = WeightPublisher(self.model)
         # background training controls
         self._stop_event = None
         self._bg_thread = None
 
-    def store_game(self, states: List[torch.Tensor], actions: List[int], reward: float):
-        # states: list of tensors (1,12,8,8) or (12,8,8) — normalize to (1,12,8,8)
-        norm_states = []
-        for s in states:
-            if s.dim() == 3:
-                norm_states.append(s.unsqueeze(0))
-            else:
-                norm_states.append(s)
-        self.buffer.add(norm_states, actions, float(reward))
+    def new_game_id(self):
+        """Id shared by both sides' trajectories of one game (None without a dataset)."""
+        return self.dataset.new_game_id() if self.dataset is not None else None
+
+    def store_game(self, states: List[torch.Tensor], actions: List[int], reward: float,
+                   game_id: int = None, first_ply: int = 0):
+        # states: list of tensors (1,12,8,8) or (12,8,8); the buffer packs them into bitboards
+        if self.dataset is not None:
+            self.dataset.add(states, actions, float(reward), game_id, first_ply)
+        else:
+            self.buffer.add(states, actions, float(reward))
+
+    def store_packed_game(self, bitboards, actions: List[int], reward: float,
+                          game_id: int = None, first_ply: int = 0):
+        # bitboards: (n,12) uint64 from utils.planes_to_bitboards
+        if self.dataset is not None:
+            self.dataset.add_packed(bitboards, actions, float(reward), game_id, first_ply)
+        else:
+            self.buffer.add_packed(bitboards, actions, float(reward))
 
+    def _next_batch(self):
+        # prefer a prefetched batch, fall back to sampling inline
+        if self.prefetcher is not None and self.prefetcher.running():
+            batch = self.prefetcher.get(timeout=0.5)
+            if batch is not None:
+                return batch
+        if self.source.num_positions() == 0:
+            return None
+        batch = self.source.sample(BATCH_SIZE)
+        if len(batch[0]) == 0:
+            return None
+        return batch
+
+    @timed("trainer.train_step")
     def train_step(self):
-        if len(self.buffer) == 0:
+        batch = self._next_batch()
+        if batch is None:
             return None
-        
-        states, actions, rewards = self.buffer.sample(BATCH_SIZE)
-        if len(states) == 0:
+        if len(batch) == 5:
+            # prioritized replay: IS-weighted loss, then feed per-sample losses back as priorities
+            states, actions, rewards, is_weights, keys = batch
+            loss, per_sample = self._optimize(states, actions, rewards, is_weights)
+            self.buffer.update_priorities(keys.numpy(), per_sample)
+            self.buffer.beta = min(1.0, PRIORITY_BETA + (1.0 - PRIORITY_BETA) * self.steps / max(1, PRIORITY_BETA_STEPS))
+            return loss
+        states, actions, rewards = batch
+        return self._optimize(states, actions, rewards)[0]
+
+    @timed("trainer.pretrain_step")
+    def pretrain_step(self, states: torch.Tensor, actions: torch.Tensor, weights: torch.Tensor = None):
+        """
+        Supervised step on an external batch (e.g. positions from a PGN dump):
+        plain cross-entropy towards the played move, optionally per-sample weighted.
+        """
+        if len(actions) == 0:
             return None
-        
-        # states is list of tensors shaped (1,12,8,8) -> concat -> (batch,12,8,8)
-        states_tensor = torch.cat(states, dim=0).to(DEVICE)
-        actions_tensor = torch.tensor(actions, dtype=torch.long).to(DEVICE)
-        rewards_tensor = torch.tensor(rewards, dtype=torch.float32).to(DEVICE)
+        if weights is None:
+            weights = torch.ones(len(actions), dtype=torch.float32)
+        return self._optimize(states, actions, weights)[0]
 
-        self.model.train()
-        logits = self.model(states_tensor)
+    def _optimize(self, states, actions, rewards, is_weights=None):
+        """One optimizer step. Returns (mean loss, per-sample reward-weighted losses as numpy)."""
+        # batches are contiguous CPU tensors (pinned on CUDA): (batch,12,8,8), (batch,), (batch,)
+        states_tensor = states.to(DEVICE, non_blocking=True)
+        if self.channels_last:
+            states_tensor = states_tensor.contiguous(memory_format=torch.channels_last)
+        actions_tensor = actions.to(DEVICE, non_blocking=True)
+        rewards_tensor = rewards.to(DEVICE, non_blocking=True)
 
-        base_losses = self.loss_fn(logits, actions_tensor)          # (batch,)
-        weighted_losses = base_losses * rewards_tensor              # reward-weighted
+        with locked(self._lock, "trainer.lock_wait"):
+            self.model.train()
+            logits = self._train_forward(states_tensor)
 
-        loss = weighted_losses.mean()
+            base_losses = self.loss_fn(logits.float(), actions_tensor)  # (batch,)
+            weighted_losses = base_losses * rewards_tensor              # reward-weighted
 
-        # Backprop
-        self.optimizer.zero_grad()
-        loss.backward()
-        self.optimizer.step()
+            if is_weights is not None:
+                loss = (weighted_losses * is_weights.to(DEVICE, non_blocking=True)).mean()
+            else:
+                loss = weighted_losses.mean()
+
+            # Backprop
+            self.optimizer.zero_grad()
+            loss.backward()
+            self.optimizer.step()
+            self.steps += 1
+            self.samples_trained += len(actions)
+            self._rate_window.append((time.perf_counter(), self.samples_trained))
+            published = self.weights.maybe_publish(self.steps, notify=False)
+            if self._checkpoint_due:
+                # snapshot between steps, on the training thread, not on whoever asked for it
+                self._checkpoint_due = False
+                self.checkpoints.request(self.steps, force=True)
+        # subscribers (e.g. quantizing the served copy) run outside the trainer lock
+        if published:
+            self.weights.notify()
+
+        return float(loss.item()), weighted_losses.detach().cpu().numpy()
+
+    def _train_forward(self, states_tensor):
+        with torch.autocast(DEVICE.type, dtype=torch.bfloat16, enabled=self.bf16):
+            if not self.compiled:
+                return self._forward(states_tensor)
+            try:
+                return self._forward(states_tensor)
+            except Exception as e:
+                # e.g. no working C compiler for the inductor backend
+                print("torch.compile failed, training eagerly:", e)
+                self.compiled = False
+                self._forward = self.model
+                return self._forward(states_tensor)
 
-        return float(loss.item())
+    def stats(self) -> dict:
+        """Step/sample counters and recent samples/sec throughput."""
+        rate = 0.0
+        if len(self._rate_window) >= 2:
+            (t0, n0), (t1, n1) = self._rate_window[0], self._rate_window[-1]
+            if t1 > t0:
+                rate = (n1 - n0) / (t1 - t0)
+        return {
+            "steps": self.steps,
+            "samples": self.samples_trained,
+            "samples_per_sec": rate,
+            "buffer_episodes": len(self.source),
+            "buffer_positions": self.source.num_positions(),
+            "prefetch_queue": self.prefetcher.qsize() if self.prefetcher is not None else 0,
+            "perf": describe(self),
+        }
     
+    @timed("trainer.save_model")
     def save_model(self,filename = "latest_model.pth"):
-        path = os.path.join(MODEL_DIR, filename)
-        os.makedirs(MODEL_DIR, exist_ok=True)
-        torch.save(self.model.state_dict(), path)
+        """Synchronous, atomic save (also writes a versioned checkpoint with optimizer state)."""
+        with self._lock:
+            path = self.checkpoints.save_now(self.steps, filename)
         print(f"Model saved to {path}")
 
+    def request_checkpoint(self, force: bool = False) -> bool:
+        """
+        Cheap to call from hot paths: when the checkpoint policy says a save
+        is due it is only marked, and the next optimizer step snapshots the
+        weights for the background writer. force snapshots right away, on
+        the calling thread.
+        """
+        if force:
+            with self._lock:
+                return self.checkpoints.request(self.steps, force=True)
+        if not self.checkpoints.due(self.steps):
+            return False
+        self._checkpoint_due = True
+        return True
+
+    def load_checkpoint(self, restore_model: bool = True) -> bool:
+        """
+        Restore optimizer state and step count (and the model weights unless
+        restore_model=False) from the newest versioned checkpoint.
+        """
+        versions = self.checkpoints.versions()
+        if not versions:
+            return False
+        ckpt = torch.load(versions[-1], map_location=DEVICE)
+        with self._lock:
+            if restore_model:
+                self.model.load_state_dict(checkpoint_state_dict(ckpt))
+            if ckpt.get("optimizer") is not None:
+                self.optimizer.load_state_dict(ckpt["optimizer"])
+            self.steps = int(ckpt.get("step", 0))
+            if restore_model:
+                self.weights.publish(self.steps, notify=False)
+        if restore_model:
+            self.weights.notify()
+        print(f"Loaded checkpoint from {versions[-1]}")
+        return True
+
+    def close(self):
+        """Stop background work and write a final checkpoint."""
+        self.stop_background_training()
+        self.checkpoints.stop()
+        self.save_model()
+        if self.dataset is not None:
+            self.dataset.close()
+
     def load_model(self, filename = "latest_model.pth"):
         path = os.path.join(MODEL_DIR, filename)
         try:
-            self.model.load_state_dict(torch.load(path, map_location=DEVICE))
+            with self._lock:
+                self.model.load_state_dict(checkpoint_state_dict(torch.load(path, map_location=DEVICE)))
+                self.weights.publish(self.steps, notify=False)
+            self.weights.notify()
             print(f"Loaded model from {path}")
         except FileNotFoundError:
             print("⚠ No saved model found. Starting fresh.")
 
     # Background training control ------------------------------------------------
-    def _train_loop(self, interval: float, save_every: int, loss_callback):
+    def _train_loop(self, interval: float, save_every: int, loss_callback, steps_per_wakeup: int):
+        use_intra_threads(self.threads)
         i = 0
         while not self._stop_event.is_set():
-            loss = self.train_step()
-            if loss is not None and loss_callback is not None:
+            # run a burst of steps, report their mean loss once
+            losses = []
+            for _ in range(max(1, steps_per_wakeup)):
+                if self._stop_event.is_set():
+                    break
+                loss = self.train_step()
+                if loss is None:
+                    break
+                losses.append(loss)
+            if losses and loss_callback is not None:
                 try:
-                    loss_callback(loss)
+                    loss_callback(sum(losses) / len(losses))
                 except Exception:
                     pass
             i += 1
             if save_every and (i % save_every) == 0:
                 try:
-                    self.save_model()
+                    self.request_checkpoint()
                 except Exception:
                     pass
-            time.sleep(interval)
+            if interval:
+                time.sleep(interval)
+            elif not losses:
+                time.sleep(0.1)          # continuous mode, but nothing to train on yet
 
-    def start_background_training(self, interval: float = 1.0, save_every: int = 10, loss_callback=None):
+    def start_background_training(self, interval: float = TRAIN_INTERVAL, save_every: int = 10, loss_callback=None,
+                                  steps_per_wakeup: int = TRAIN_STEPS_PER_WAKEUP):
+        """
+        Train on a daemon thread: every `interval` seconds run `steps_per_wakeup`
+        steps (interval=0 trains continuously). Batches are prefetched in the background.
+        """
         if self._bg_thread and self._bg_thread.is_alive():
             return
+        self.prefetcher = BatchPrefetcher(self.source).start()
         self._stop_event = threading.Event()
-        self._bg_thread = threading.Thread(target=self._train_loop, args=(interval, save_every, loss_callback), daemon=True)
+        self._bg_thread = threading.Thread(target=self._train_loop, args=(interval, save_every, loss_callback, steps_per_wakeup), daemon=True)
         self._bg_thread.start()
         print("Background trainer started.")
 
@@ -112,4 +309,6 @@ class Trainer:
         self._stop_event.set()
         if self._bg_thread:
             self._bg_thread.join(timeout=2.0)
-        print("Background trainer stopped.")
\ No newline at end of file
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+        print("Background trainer stopped.")
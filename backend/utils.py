@@ -1,59 +1,181 @@
+import numpy as np
 import torch
 import chess
 from backend.config import ACTION_SIZE, DEVICE
 
+# plane order: white P,N,B,R,Q,K then black P,N,B,R,Q,K
+def board_bitboards(board: chess.Board) -> np.ndarray:
+    """Return the 12 piece bitboards of board as a (12,) uint64 array."""
+    white, black = board.occupied_co[chess.WHITE], board.occupied_co[chess.BLACK]
+    pieces = (board.pawns, board.knights, board.bishops, board.rooks, board.queens, board.kings)
+    return np.array([p & white for p in pieces] + [p & black for p in pieces], dtype=np.uint64)
+
+
+def boards_to_tensor(boards, device=DEVICE) -> torch.Tensor:
+    """Encode a list of boards into one (n,12,8,8) float32 tensor with a single device transfer."""
+    if not boards:
+        return torch.zeros((0, 12, 8, 8), dtype=torch.float32, device=device)
+    bitboards = np.stack([board_bitboards(b) for b in boards])
+    planes = bitboards_to_planes(bitboards).astype(np.float32)
+    return torch.from_numpy(planes).to(device)
+
+
 def board_to_tensor(board: chess.Board) -> torch.Tensor:
-    planes = torch.zeros((12,8,8), dtype = torch.float32)
-    piece_map = board.piece_map()
-    piece_to_plane = {1:0, 2:1, 3:2, 4:3, 5:4, 6:5}
-    #piece_map: dict[int, chess.Piece] = board.piece_map()
-    for square,piece in piece_map.items():
-        color_offset = 0 if piece.color == chess.WHITE else 6
-        plane = color_offset + piece_to_plane[piece.piece_type]
-        row = 7 - (square//8)
-        col = square%8
-        planes[plane, row, col] = 1.0
+    return boards_to_tensor([board])            # (1,12,8,8) on DEVICE
+
+
+class BoardEncoder:
+    """
+    Keeps the (12,8,8) planes of one board up to date move by move.
+    update() only rewrites the squares a move touched, and the device
+    tensor is built at most once per position.
+    """
+
+    def __init__(self, board: chess.Board = None):
+        self.planes = np.zeros((12, 8, 8), dtype=np.float32)
+        self._tensor = None
+        if board is not None:
+            self.reset(board)
+
+    def reset(self, board: chess.Board):
+        self.planes[:] = bitboards_to_planes(board_bitboards(board)[None])[0]
+        self._tensor = None
+
+    @staticmethod
+    def touched_squares(board: chess.Board, move: chess.Move) -> list:
+        """Squares changed by move; call before the move is pushed."""
+        squares = [move.from_square, move.to_square]
+        if board.is_castling(move):
+            rank = chess.square_rank(move.from_square)
+            if chess.square_file(move.to_square) > chess.square_file(move.from_square):
+                squares += [chess.square(7, rank), chess.square(5, rank)]
+            else:
+                squares += [chess.square(0, rank), chess.square(3, rank)]
+        elif board.is_en_passant(move):
+            squares.append(chess.square(chess.square_file(move.to_square), chess.square_rank(move.from_square)))
+        return squares
+
+    def update(self, board: chess.Board, squares: list):
+        """Refresh the given squares from board (after the move was pushed)."""
+        for sq in squares:
+            row, col = 7 - (sq // 8), sq % 8
+            self.planes[:, row, col] = 0.0
+            piece = board.piece_at(sq)
+            if piece is not None:
+                color_offset = 0 if piece.color == chess.WHITE else 6
+                self.planes[color_offset + piece.piece_type - 1, row, col] = 1.0
+        self._tensor = None
+
+    def tensor(self) -> torch.Tensor:
+        """(1,12,8,8) tensor on DEVICE for the current position; treat as read-only."""
+        if self._tensor is None:
+            self._tensor = torch.from_numpy(self.planes.copy()).unsqueeze(0).to(DEVICE)
+        return self._tensor
+
+
+def planes_to_bitboards(planes: np.ndarray) -> np.ndarray:
+    """Pack (n,12,8,8) 0/1 planes into (n,12) uint64 bitboards (bit i = square i)."""
+    planes = np.asarray(planes).reshape(-1, 12, 8, 8)
+    # plane rows run rank 8 -> rank 1; flip so the flattened index is the square
+    bits = (planes[:, :, ::-1, :] > 0).reshape(-1, 12, 64)
+    packed = np.packbits(bits, axis=-1, bitorder="little")          # (n,12,8) bytes
+    return np.ascontiguousarray(packed).view("<u8").reshape(-1, 12).astype(np.uint64)
+
 
-    return planes.unsqueeze(0).to(DEVICE)
+def bitboards_to_planes(bitboards: np.ndarray) -> np.ndarray:
+    """Inverse of planes_to_bitboards: (n,12) uint64 -> (n,12,8,8) uint8 planes."""
+    bb = np.ascontiguousarray(bitboards, dtype="<u8").reshape(-1, 12)
+    bits = np.unpackbits(bb.view(np.uint8).reshape(-1, 12, 8), axis=-1, bitorder="little")
+    return bits.reshape(-1, 12, 8, 8)[:, :, ::-1, :]
+
+
+# ---- action codec ----
+# actions < 4096 are from*64 + to; promotions are 4096 + from*4 + piece index.
+# Promotions do not encode the destination, so it is resolved against the board.
+PROMO_PIECES = [chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT]
+_PROMO_INDEX = {p: i for i, p in enumerate(PROMO_PIECES)}
+
+# precomputed per-action tables (to/promo are -1/0 where not applicable)
+ACTION_FROM = np.concatenate([np.repeat(np.arange(64), 64), np.repeat(np.arange(64), 4)]).astype(np.int16)
+ACTION_TO = np.concatenate([np.tile(np.arange(64), 64), np.full(256, -1)]).astype(np.int16)
+ACTION_PROMO = np.concatenate([np.zeros(4096), np.tile(PROMO_PIECES, 64)]).astype(np.int8)
+_NORMAL_MOVES = [chess.Move(f, t) for f in range(64) for t in range(64)]
 
 
 def move_to_action(move: chess.Move) -> int:
     if move.promotion is None:
         return move.from_square * 64 + move.to_square
-    else:
-        promo_map = {chess.QUEEN:0, chess.ROOK:1, chess.BISHOP:2, chess.KNIGHT:3}
-        return 64*64 + move.from_square*4 + promo_map[move.promotion]
+    return 64*64 + move.from_square*4 + _PROMO_INDEX[move.promotion]
+
 
 def action_to_move(action_idx: int, board: chess.Board) -> chess.Move:
+    """
+    Decode an action in O(1). Normal moves come straight from the table (the
+    caller checks legality); promotions return the legal push or capture from
+    that square (push preferred), or None if there is none.
+    """
     if action_idx < 64*64:
-        from_sq = action_idx // 64
-        to_sq = action_idx % 64
-        move = chess.Move(from_sq, to_sq)
-    else:
-        x = action_idx - 64*64
-        from_sq = x // 4
-        promo_map = [chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT]
-        promotion = promo_map[x % 4]
-
-        move = None
-        for m in board.legal_moves:
-            if m.from_square == from_sq and m.promotion == promotion:
-                move = m
-        
-        if move is None:
-            # fallback to any legal move (should be rare)
-            move = list(board.legal_moves)[0]
-    return move
+        return _NORMAL_MOVES[action_idx]
+
+    from_sq = int(ACTION_FROM[action_idx])
+    promotion = int(ACTION_PROMO[action_idx])
+    forward = 8 if board.turn == chess.WHITE else -8
+    to_sq = from_sq + forward
+    if not 0 <= to_sq < 64:
+        return None
+    file = chess.square_file(from_sq)
+    for to in (to_sq, to_sq - 1 if file > 0 else None, to_sq + 1 if file < 7 else None):
+        if to is None:
+            continue
+        move = chess.Move(from_sq, to, promotion)
+        if board.is_legal(move):
+            return move
+    return None
+
+
+def legal_action_indices(board: chess.Board) -> np.ndarray:
+    """Sorted unique action indices of the legal moves in board."""
+    idxs = [
+        m.from_square*64 + m.to_square if m.promotion is None
+        else 64*64 + m.from_square*4 + _PROMO_INDEX[m.promotion]
+        for m in board.legal_moves
+    ]
+    return np.unique(np.array(idxs, dtype=np.int64))
+
+
+def indices_to_mask(idxs_list, device=DEVICE) -> torch.Tensor:
+    """Scatter per-board legal index arrays into an (n, ACTION_SIZE) bool mask with one transfer."""
+    mask = np.zeros((len(idxs_list), ACTION_SIZE), dtype=np.bool_)
+    if idxs_list:
+        lens = [len(i) for i in idxs_list]
+        rows = np.repeat(np.arange(len(idxs_list)), lens)
+        mask[rows, np.concatenate(idxs_list).astype(np.int64)] = True
+    return torch.from_numpy(mask).to(device)
+
+
+def legal_move_masks(boards, device=DEVICE, sparse: bool = False):
+    """
+    Legal moves of several boards at once: an (n, ACTION_SIZE) bool tensor,
+    or with sparse=True a list of legal index arrays.
+    """
+    idxs_list = [legal_action_indices(b) for b in boards]
+    if sparse:
+        return idxs_list
+    return indices_to_mask(idxs_list, device)
+
 
 def legal_move_mask(board: chess.Board) -> torch.Tensor:
-    mask = torch.zeros(ACTION_SIZE, dtype = torch.bool, device= DEVICE)
-    for move in board.legal_moves:
-        idx = move_to_action(move)
-        if idx < ACTION_SIZE:
-            mask[idx] = True
-    return mask
+    return legal_move_masks([board])[0]
 
 def masked_softmax(logits: torch.Tensor, mask: torch.Tensor) -> torch.Tensor:
     masked_logits = logits.clone()
     masked_logits[~mask] = -1e9
-    return torch.softmax(masked_logits, dim=0)
\ No newline at end of file
+    return torch.softmax(masked_logits, dim=0)
+
+def game_rewards(result: str):
+    """Return (reward_white, reward_black): +1 winner, -1 loser, 0.5 each for a draw."""
+    if result == "1-0":
+        return 1.0, -1.0
+    elif result == "0-1":
+        return -1.0, 1.0
+    return 0.5, 0.5
@@ -0,0 +1,93 @@
+import copy
+import threading
+import time
+import torch
+
+from backend.config import WEIGHT_PUBLISH_INTERVAL, WEIGHT_PUBLISH_EVERY_STEPS
+
+
+class WeightPublisher:
+    """
+    Publishes immutable inference snapshots of a training model.
+
+    The trainer keeps optimizing its own copy; publish() clones it into a
+    fresh eval-mode model with gradients disabled and swaps the reference
+    in one assignment, so readers of current() never see half-applied
+    updates and never wait on the optimizer. Readers still holding an
+    older snapshot keep using it until they are done. Subscribers are
+    called with (model, version) after every publish.
+    """
+
+    def __init__(self, model, publish_interval: float = WEIGHT_PUBLISH_INTERVAL,
+                 publish_every_steps: int = WEIGHT_PUBLISH_EVERY_STEPS):
+        self.source = model
+        self.publish_interval = publish_interval
+        self.publish_every_steps = publish_every_steps
+        self.version = 0
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._current = self._snapshot()
+        self._last_time = time.monotonic()
+        self._last_step = 0
+
+    def _snapshot(self):
+        model = copy.deepcopy(self.source)
+        model.eval()
+        for p in model.parameters():
+            p.requires_grad_(False)
+        return model
+
+    @property
+    def step(self) -> int:
+        """Train step of the latest published snapshot."""
+        return self._last_step
+
+    def current(self):
+        """The latest published inference model; treat as read-only."""
+        return self._current
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def due(self, step: int) -> bool:
+        if step == self._last_step:
+            return False
+        if self.publish_every_steps and step - self._last_step >= self.publish_every_steps:
+            return True
+        return time.monotonic() - self._last_time >= self.publish_interval
+
+    def maybe_publish(self, step: int, notify: bool = True) -> bool:
+        """Publish if the interval policy says so. Call while the source model is not being updated."""
+        if not self.due(step):
+            return False
+        self.publish(step, notify)
+        return True
+
+    def publish(self, step: int = None, notify: bool = True):
+        """
+        Snapshot the source model and swap it in. With notify=False the
+        subscribers are not called; the caller calls notify() once it has
+        released whatever lock kept the source model still, so slow
+        subscribers (e.g. quantization) do not run under it.
+        """
+        with torch.no_grad():
+            snapshot = self._snapshot()
+        with self._lock:
+            self._current = snapshot            # atomic reference swap
+            self.version += 1
+            self._last_time = time.monotonic()
+            if step is not None:
+                self._last_step = step
+        if notify:
+            self.notify()
+
+    def notify(self):
+        """Call every subscriber with the current snapshot."""
+        with self._lock:
+            snapshot, version, subscribers = self._current, self.version, list(self._subscribers)
+        for cb in subscribers:
+            try:
+                cb(snapshot, version)
+            except Exception as e:
+                print("Weight subscriber failed:", e)
@@ -1,291 +1,452 @@
 # run.py
+import time
+_T0 = time.perf_counter()
 import eel
 import os
-import random
-import torch
+import sys
 import chess
 import atexit
-import json
-import time
+import threading
 
-from backend.game_engine import GameEngine
-from backend.model import load_model
-from backend.trainer import Trainer
-from backend.config import DEVICE, EPSILON, MODEL_DIR, SAVE_EVERY_N_GAMES
-from backend.utils import board_to_tensor, legal_move_mask, masked_softmax, action_to_move, move_to_action
+# only torch-free modules here: torch, the model and the trainer are loaded
+# by the background initializer so the UI is served right away
+from backend.startup import Startup
+from backend.profiling import PROFILER, timed, locked, set_sampling, sampling
 
-# ensure folders exist before loading/saving models
-os.makedirs(MODEL_DIR, exist_ok=True)
-os.makedirs("data", exist_ok=True)
+STARTUP = Startup(_T0)
+DEFAULT_SESSION = "default"
 
 eel.init("web")  # your web folder
 
-# global objects
-MODEL_PATH = os.path.join(MODEL_DIR, "latest_model.pth")
-MODEL = load_model(MODEL_PATH)  # load if present, load_model handles missing file
-TRAINER = Trainer(MODEL)
-
-# save model on normal exit
-atexit.register(lambda: TRAINER.save_model("latest_model.pth"))
-
-# instantiate game engine (was missing)
-ENGINE = GameEngine()
+# filled in by _initialize(); eel calls wait on the matching STARTUP milestone
+# ("core": sessions and metrics, "model": model, trainer and inference)
+MODEL = TRAINER = INFERENCE = POLICY_CACHE = SESSIONS = METRICS = BOOK = ARCHIVE = None
 
 # ---- simple training bookkeeping ----
-GAME_STATES_W = []
-GAME_ACTIONS_W = []
-GAME_STATES_B = []
-GAME_ACTIONS_B = []
 GAMES_SINCE_TRAIN = 0
+_TRAIN_LOCK = threading.Lock()
 TRAIN_EVERY_N_GAMES = 1   # tune as needed
-SAVE_EVERY_N_GAMES = 5    # tune as needed
-
-# performance logging file
-PERF_FILE = os.path.join("data", "perf.json")
-# load existing perf or initialize
-if os.path.exists(PERF_FILE):
-    try:
-        with open(PERF_FILE, "r", encoding="utf-8") as f:
-            PERF = json.load(f)
-    except Exception:
-        PERF = {"games": [], "training": []}
-else:
-    PERF = {"games": [], "training": []}
-
-def _save_perf():
-    os.makedirs("data", exist_ok=True)
-    try:
-        with open(PERF_FILE, "w", encoding="utf-8") as f:
-            json.dump(PERF, f, indent=2)
-    except Exception as e:
-        print("Failed saving perf:", e)
-
-def record_game_result(result_str: str):
-    # result_str like "1-0", "0-1", "1/2-1/2"
-    entry = {
-        "ts": int(time.time()),
-        "result": result_str,
-        "moves": len(ENGINE.moves_played) if hasattr(ENGINE, "moves_played") else len(ENGINE.get_move_list()),
-    }
-    PERF["games"].append(entry)
-    # keep last 500 entries to avoid growing forever
-    PERF["games"] = PERF["games"][-500:]
-    _save_perf()
 
-def record_training(loss):
-    entry = {
-        "ts": int(time.time()),
-        "loss": None if loss is None else float(loss)
-    }
-    PERF["training"].append(entry)
-    PERF["training"] = PERF["training"][-500:]
-    _save_perf()
 
-# Start background training so the model improves continuously.
-# We start the trainer after record_training exists so the callback is available.
-TRAINER.start_background_training(interval=1.0, save_every=SAVE_EVERY_N_GAMES, loss_callback=record_training)
+def _initialize(startup: Startup):
+    global MODEL, TRAINER, INFERENCE, POLICY_CACHE, SESSIONS, METRICS, BOOK, ARCHIVE
+    global move_to_action, choose_action_for_board, MCTS, SEARCH_MODE, SEARCH_TIME_BUDGET, SAVE_EVERY_N_GAMES
+
+    with startup.phase("import"):
+        import torch
+        from backend.sessions import SessionManager
+        from backend.model import load_model, model_from_checkpoint, checkpoint_step
+        from backend.trainer import Trainer
+        from backend.dataset import ShardedDataset
+        from backend.config import (
+            DEVICE,
+            MODEL_DIR,
+            DATA_DIR,
+            SAVE_EVERY_N_GAMES,
+            SEARCH_MODE,
+            SEARCH_TIME_BUDGET,
+            QUANTIZED_INFERENCE,
+            INFERENCE_MODEL_PATH,
+            USE_DATASET,
+            GATED_SERVING,
+            SERVED_MODEL_PATH,
+            USE_OPENING_BOOK,
+            USE_ARCHIVE,
+            ARCHIVE_REBUILD_BUFFER
+        )
+        from backend.utils import move_to_action
+        from backend.policy import choose_action_for_board, policy_for_board
+        from backend.inference import InferenceServer
+        from backend.metrics import MetricsStore
+        from backend.policy_cache import PolicyCache
+        from backend.search import MCTS
+        from backend.export import quantize_model, load_inference_model
+        from backend.arena import ServedModelWatcher
+        from backend.opening_book import OpeningBook
+        from backend.perf import set_interop_threads
+        from backend.game_archive import GameArchive
+
+    with startup.phase("core"):
+        # before the first forward pass: the inter-op pool can only be sized once
+        set_interop_threads()
+        # ensure folders exist before loading/saving models
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        os.makedirs(DATA_DIR, exist_ok=True)
+        # performance logging: append-only log + in-memory counters
+        METRICS = MetricsStore()
+        atexit.register(METRICS.close)
+        # early positions are answered from the book (built by `python -m backend.opening_book`)
+        BOOK = OpeningBook() if USE_OPENING_BOOK else None
+        # every finished game is appended to the archive (moves + headers)
+        ARCHIVE = GameArchive() if USE_ARCHIVE else None
+        if ARCHIVE is not None:
+            atexit.register(ARCHIVE.close)
+        # one isolated GameEngine + trajectory buffers per browser session;
+        # the trainer is attached once it exists
+        SESSIONS = SessionManager(None, archive=ARCHIVE)
+    startup.mark("core")
+
+    with startup.phase("load_model"):
+        model_path = os.path.join(MODEL_DIR, "latest_model.pth")
+        MODEL = load_model(model_path)  # load if present, load_model handles missing file
+
+    with startup.phase("trainer"):
+        # finished games are appended to the on-disk dataset, so training data survives restarts
+        trainer = Trainer(MODEL, ShardedDataset() if USE_DATASET else None)
+        # pick up optimizer state / step count from the newest versioned checkpoint
+        if os.path.exists(model_path):
+            trainer.load_checkpoint(restore_model=False)
+        # without the on-disk dataset the replay buffer starts empty: refill it from past games
+        if trainer.dataset is None and ARCHIVE is not None and ARCHIVE_REBUILD_BUFFER:
+            print(f"Replay buffer rebuilt from {ARCHIVE.fill_buffer(trainer.buffer)} archived games")
+
+    with startup.phase("inference"):
+        # batches forward passes from concurrent callers of ai_move; it serves the
+        # trainer's published snapshot, never the copy being optimized
+        def serving_model(model):
+            # with QUANTIZED_INFERENCE every published snapshot is served as int8 on CPU
+            return quantize_model(model) if QUANTIZED_INFERENCE else model
+
+        # archived UI games are tagged with model_version = the training step of the weights
+        # that played, whichever way they are served (self-play tags its games the same way)
+        serving_export = QUANTIZED_INFERENCE and os.path.exists(INFERENCE_MODEL_PATH)
+        if serving_export:
+            served, served_step = load_inference_model(INFERENCE_MODEL_PATH)     # exported by `python -m backend.export`
+        elif GATED_SERVING and os.path.exists(SERVED_MODEL_PATH):
+            ckpt = torch.load(SERVED_MODEL_PATH, map_location=DEVICE)
+            served, served_step = serving_model(model_from_checkpoint(ckpt).eval()), checkpoint_step(ckpt)
+            del ckpt
+        else:
+            served, served_step = serving_model(trainer.weights.current()), trainer.weights.step
+        # ai_move runs in eel greenlets: wait for results cooperatively so concurrent calls can batch
+        INFERENCE = InferenceServer(served, device=torch.device("cpu") if QUANTIZED_INFERENCE else DEVICE,
+                                    sleep=eel.sleep).start()
+        if serving_export:
+            # the exported artifact is served as is: trainer publishes must not replace it
+            version_fn = lambda: 0
+            SESSIONS.model_version = lambda: served_step
+        elif GATED_SERVING:
+            # only checkpoints promoted by `python -m backend.arena --gate` are served
+            watcher = ServedModelWatcher(SERVED_MODEL_PATH, lambda model: INFERENCE.set_model(serving_model(model)),
+                                         step=served_step).start()
+            atexit.register(watcher.stop)
+            version_fn = lambda: watcher.version
+            SESSIONS.model_version = lambda: watcher.step
+        else:
+            trainer.weights.subscribe(lambda model, version: INFERENCE.set_model(serving_model(model)))
+            version_fn = lambda: trainer.weights.version
+            SESSIONS.model_version = lambda: trainer.weights.step
+        # repeated positions skip the forward pass; cleared whenever new weights are served
+        POLICY_CACHE = PolicyCache(version_fn=version_fn)
+
+    with startup.phase("warmup"):
+        # first forward pass (allocator, kernel selection) happens here, not in the first ai_move
+        policy_for_board(chess.Board(), INFERENCE)
+
+    TRAINER = trainer
+    SESSIONS.trainer = trainer
+    # Start background training so the model improves continuously.
+    trainer.start_background_training(save_every=SAVE_EVERY_N_GAMES, loss_callback=record_training)
+    # ensure background trainer stops and model saved on exit
+    atexit.register(trainer.close)
+    atexit.register(INFERENCE.stop)
+    startup.mark("model")
+
+    report = startup.report()
+    print("Startup: " + ", ".join(f"{k} {v:.2f}s" for k, v in report["phases_s"].items())
+          + f"; ready after {report['milestones_s']['model']:.2f}s")
+    startup.save_report(os.path.join(DATA_DIR, "startup.jsonl"))
+
+
+# eel serves exposed calls as gevent greenlets without monkey-patching threading:
+# waits must yield to the hub (eel.sleep), or static files and every other call stall too
+def _core():
+    STARTUP.wait("core", sleep=eel.sleep)
+
+def _model():
+    # only waits if the background initializer hasn't finished yet
+    STARTUP.wait("model", sleep=eel.sleep)
+
+def _loading() -> bool:
+    # "core" needs torch (config/utils), so it is only marked after the import phase;
+    # until then no session exists and read-only calls answer for a fresh game
+    return not STARTUP.ready("core")
+
+def record_game_result(result_str: str, moves: int):
+    # result_str like "1-0", "0-1", "1/2-1/2"
+    METRICS.record_game(result_str, moves)
 
-# ensure background trainer stops and model saved on exit
-atexit.register(lambda: (TRAINER.stop_background_training(), TRAINER.save_model("latest_model.pth")))
+def record_training(loss):
+    METRICS.record_training(loss)
 
 @eel.expose
+@timed("eel.get_performance")
 def get_performance():
     # return a small summary + last few records
-    games = PERF.get("games", [])
-    training = PERF.get("training", [])
-    wins = sum(1 for g in games if g["result"] == "1-0")
-    losses = sum(1 for g in games if g["result"] == "0-1")
-    draws = sum(1 for g in games if g["result"] in ("1/2-1/2", "1/2-1/2"))
-    recent_games = games[-10:]
-    recent_training = training[-5:]
-    return {
-        "counts": {"wins": wins, "losses": losses, "draws": draws, "total": len(games)},
-        "recent_games": recent_games,
-        "recent_training": recent_training
-    }
-
-# helper: choose an action for a board (same logic as earlier choose_action_for_board)
-def choose_action_for_board(board: chess.Board, model, epsilon: float = EPSILON, temperature: float = 1.0):
-    with torch.no_grad():
-        state_t = board_to_tensor(board)          # (1,12,8,8) on DEVICE
-        logits = model(state_t).squeeze(0)       # (ACTION_SIZE,)
-        mask = legal_move_mask(board)            # boolean mask on DEVICE
-
-        if mask.sum().item() == 0:
-            return None, None
-
-        probs = masked_softmax(logits, mask)
-
-        # epsilon-greedy
-        if random.random() < epsilon:
-            legal_idxs = torch.nonzero(mask).squeeze(-1).tolist()
-            if isinstance(legal_idxs, int):
-                idx = int(legal_idxs)
-            else:
-                idx = random.choice(legal_idxs)
-        else:
-            idx = torch.multinomial(probs, num_samples=1).item()
+    if _loading():
+        return {"counts": {}, "recent_games": [], "recent_training": [], "loading": True}
+    return METRICS.summary()
 
-        move = action_to_move(int(idx), board)
-        # fallback if action_to_move produced illegal
-        if move not in board.legal_moves:
-            move = random.choice(list(board.legal_moves))
-            idx = move_to_action(move)
+@eel.expose
+@timed("eel.get_training_stats")
+def get_training_stats():
+    """Train steps, samples/sec and replay buffer fill."""
+    _model()
+    return TRAINER.stats()
 
-    return int(idx), move
+@eel.expose
+@timed("eel.get_inference_stats")
+def get_inference_stats():
+    """Queue depth, batch-size histogram and p50/p99 latency of the inference server, plus cache hit rate."""
+    _model()
+    stats = INFERENCE.stats()
+    stats["policy_cache"] = POLICY_CACHE.stats()
+    if BOOK is not None:
+        stats["opening_book"] = BOOK.stats()
+    return stats
 
 # -----------------------
 # Eel-exposed API
 # -----------------------
+def _finish_game(session, save: bool):
+    """Store a finished game for training, train/save periodically and log the result."""
+    global GAMES_SINCE_TRAIN
+    _model()
+    res = SESSIONS.finish_game(session)
+
+    with _TRAIN_LOCK:
+        GAMES_SINCE_TRAIN += 1
+        # train / save periodically
+        if GAMES_SINCE_TRAIN >= TRAIN_EVERY_N_GAMES:
+            loss = TRAINER.train_step()
+            # record training loss
+            record_training(loss)
+            GAMES_SINCE_TRAIN = 0
+        if save and (GAMES_SINCE_TRAIN % SAVE_EVERY_N_GAMES) == 0:
+            TRAINER.request_checkpoint()
+
+    # record game perf
+    record_game_result(res, len(session.engine.moves_played))
+    return res
+
 @eel.expose
-def get_board_fen():
+@timed("eel.get_board_fen")
+def get_board_fen(session_id: str = DEFAULT_SESSION):
     """Return current board FEN for frontend rendering."""
-    return ENGINE.board_fen()
+    if _loading():
+        return chess.STARTING_FEN
+    return SESSIONS.get(session_id).engine.board_fen()
 
 @eel.expose
-def get_moves():
+@timed("eel.get_moves")
+def get_moves(session_id: str = DEFAULT_SESSION):
     """Return list of moves in SAN notation (strings)."""
-    return ENGINE.get_move_list()
+    if _loading():
+        return []
+    return SESSIONS.get(session_id).engine.get_move_list()
 
 @eel.expose
-def reset_game():
-    global GAME_STATES_W, GAME_ACTIONS_W, GAME_STATES_B, GAME_ACTIONS_B
-    ENGINE.reset()
-    GAME_STATES_W, GAME_ACTIONS_W, GAME_STATES_B, GAME_ACTIONS_B = [], [], [], []
-    return ENGINE.board_fen()
+@timed("eel.reset_game")
+def reset_game(session_id: str = DEFAULT_SESSION):
+    if _loading():
+        return chess.STARTING_FEN
+    session = SESSIONS.get(session_id)
+    with locked(session.lock, "session.lock_wait"):
+        session.reset()
+        return session.engine.board_fen()
 
 @eel.expose
-def make_human_move(move_str: str):
+@timed("eel.make_human_move")
+def make_human_move(move_str: str, session_id: str = DEFAULT_SESSION):
     """
     Expect UCI move like 'e2e4' or UCI with promotion 'e7e8q'.
     """
-    global GAME_STATES_W, GAME_ACTIONS_W, GAME_STATES_B, GAME_ACTIONS_B, GAMES_SINCE_TRAIN
-
-    try:
-        # try UCI
-        move = chess.Move.from_uci(move_str)
-    except Exception:
+    _core()
+    session = SESSIONS.get(session_id)
+    with locked(session.lock, "session.lock_wait"):
+        engine = session.engine
         try:
-            move = ENGINE.board.parse_san(move_str)
+            # try UCI
+            move = chess.Move.from_uci(move_str)
         except Exception:
+            try:
+                move = engine.board.parse_san(move_str)
+            except Exception:
+                return "invalid"
+
+        if move not in engine.board.legal_moves:
             return "invalid"
 
-    if move not in ENGINE.board.legal_moves:
-        return "invalid"
-
-    # record state/action for training (state BEFORE move)
-    state_t = board_to_tensor(ENGINE.board).detach().cpu()
-    aidx = move_to_action(move)
-    if ENGINE.board.turn == chess.WHITE:
-        GAME_STATES_W.append(state_t)
-        GAME_ACTIONS_W.append(aidx)
-    else:
-        GAME_STATES_B.append(state_t)
-        GAME_ACTIONS_B.append(aidx)
-
-    ENGINE.make_move(move)
-
-    if ENGINE.is_game_over():
-        # compute rewards: +1 winner, -1 loser, 0.5 draw
-        res = ENGINE.result()
-        if res == "1-0":
-            reward_w, reward_b = 1.0, -1.0
-        elif res == "0-1":
-            reward_w, reward_b = -1.0, 1.0
-        else:
-            reward_w, reward_b = 0.5, 0.5
+        # record state/action for training (state BEFORE move)
+        session.record(engine.state_tensor().detach().cpu(), move_to_action(move))
+        engine.make_move(move)
 
-        # store episodes into replay buffer (if any moves)
-        if GAME_STATES_W and GAME_ACTIONS_W:
-            TRAINER.store_game(GAME_STATES_W, GAME_ACTIONS_W, reward_w)
-        if GAME_STATES_B and GAME_ACTIONS_B:
-            TRAINER.store_game(GAME_STATES_B, GAME_ACTIONS_B, reward_b)
+        if engine.is_game_over():
+            res = _finish_game(session, save=True)
+            return f"game_over:{res}"
 
-        GAME_STATES_W, GAME_ACTIONS_W, GAME_STATES_B, GAME_ACTIONS_B = [], [], [], []
-        GAMES_SINCE_TRAIN += 1
+    return "ok"
 
-        # train / save periodically
-        if GAMES_SINCE_TRAIN >= TRAIN_EVERY_N_GAMES:
-            loss = TRAINER.train_step()
-            # record training loss
-            record_training(loss)
-            GAMES_SINCE_TRAIN = 0
-        if (GAMES_SINCE_TRAIN % SAVE_EVERY_N_GAMES) == 0:
-            TRAINER.save_model("latest_model.pth")
+@eel.expose
+@timed("eel.ai_move")
+def ai_move(session_id: str = DEFAULT_SESSION, budget_ms: int = None):
+    """
+    Ask the model to pick and play a move, returns move.uci() or game_over.
+    budget_ms > 0 picks the move with MCTS for that long, 0 samples the raw
+    policy; None uses SEARCH_MODE from config. Positions in the opening
+    book are answered from it without using the network.
+    """
+    _model()
+    session = SESSIONS.get(session_id)
+    with locked(session.lock, "session.lock_wait"):
+        engine = session.engine
+        if engine.is_game_over():
+            return f"game_over:{engine.result()}"
+
+        state_t = engine.state_tensor()
+        use_search = (SEARCH_MODE == "mcts") if budget_ms is None else budget_ms > 0
+        move = None
+        if BOOK is not None:
+            # in book: no forward pass at all
+            BOOK.maybe_reload()
+            move = BOOK.choose(engine.board)
+        if move is not None:
+            idx = move_to_action(move)
+        elif use_search:
+            if session.searcher is None:
+                session.searcher = MCTS(INFERENCE)
+            move, _stats = session.searcher.search(engine.board, time_budget=(budget_ms / 1000.0) if budget_ms else SEARCH_TIME_BUDGET)
+            idx = move_to_action(move) if move is not None else None
+        else:
+            idx, move = choose_action_for_board(engine.board, INFERENCE, state_t=state_t, cache=POLICY_CACHE)
+        if move is None:
+            return "invalid"
 
-        # record game perf
-        record_game_result(res)
+        # record AI's state/action (board before AI move)
+        session.record(state_t.detach().cpu(), idx, ai=True)
+        engine.make_move(move)
 
-        return f"game_over:{res}"
+        # persist model periodically: only marks a save as due, the training thread snapshots and writes it
+        try:
+            TRAINER.request_checkpoint()
+        except Exception:
+            pass
 
-    return "ok"
+        if engine.is_game_over():
+            res = _finish_game(session, save=False)
+            return f"game_over:{res}"
+
+    return move.uci()
 
 @eel.expose
-def ai_move():
+@timed("eel.play_move")
+def play_move(move_str: str, since_ply: int = 0, session_id: str = DEFAULT_SESSION, budget_ms: int = None):
     """
-    Ask the model to pick and play a move, returns move.uci() or game_over.
+    One round trip per ply: play the human move, let the AI reply and return
+    the new state. `moves` holds the SAN of every ply after `since_ply` (the
+    number of plies the client already shows), so the client appends it.
+    status is "ok", "invalid" or "game_over".
     """
-    global GAME_STATES_W, GAME_ACTIONS_W, GAME_STATES_B, GAME_ACTIONS_B, GAMES_SINCE_TRAIN
-
-    if ENGINE.is_game_over():
-        return f"game_over:{ENGINE.result()}"
-
-    idx, move = choose_action_for_board(ENGINE.board, MODEL)
-    if move is None:
-        return "invalid"
-
-    # record AI's state/action (board before AI move)
-    state_t = board_to_tensor(ENGINE.board).detach().cpu()
-    if ENGINE.board.turn == chess.WHITE:
-        GAME_STATES_W.append(state_t)
-        GAME_ACTIONS_W.append(int(idx))
-    else:
-        GAME_STATES_B.append(state_t)
-        GAME_ACTIONS_B.append(int(idx))
-
-    ENGINE.make_move(move)
-
-    # persist model periodically (also trainer may already save)
-    try:
-        TRAINER.save_model("latest_model.pth")
-    except Exception:
-        pass
-
-    if ENGINE.is_game_over():
-        res = ENGINE.result()
-        if res == "1-0":
-            reward_w, reward_b = 1.0, -1.0
-        elif res == "0-1":
-            reward_w, reward_b = -1.0, 1.0
-        else:
-            reward_w, reward_b = 0.5, 0.5
+    _core()
+    session = SESSIONS.get(session_id)
+    with locked(session.lock, "session.lock_wait"):
+        engine = session.engine
+        human = make_human_move(move_str, session_id)
+        if human == "invalid":
+            return {"status": "invalid"}
+
+        ai = None
+        if human == "ok":
+            plies_before = len(engine.moves_played)
+            ai_move(session_id, budget_ms)
+            if len(engine.moves_played) > plies_before:
+                ai = engine.moves_played[-1].uci()
+
+        since = max(0, min(int(since_ply or 0), len(engine.san_moves)))
+        game_over = engine.is_game_over()
+        return {
+            "status": "game_over" if game_over else "ok",
+            "result": engine.result() if game_over else None,
+            "human": move_str,
+            "ai": ai,
+            "fen": engine.board_fen(),
+            "ply": len(engine.san_moves),
+            "since": since,
+            "moves": engine.moves_since(since),
+            "performance": METRICS.summary(),
+        }
+
+@eel.expose
+@timed("eel.export_archive")
+def export_archive(filename: str, result: str = None, min_model_version: int = None):
+    """
+    Stream archived games (optionally filtered by result / model version) to
+    data/exports/<filename> as PGN. Only a bare file name is accepted, never
+    a path. Returns {"path", "games"}, or {"status": "invalid", "error"} for
+    a bad name, result or model version.
+    """
+    _core()
+    from backend.config import DATA_DIR
+    from backend.game_archive import RESULT_CODES
+    name = str(filename or "")
+    if not name or name.startswith(".") or os.path.basename(name) != name or "\\" in name:
+        return {"status": "invalid", "error": "filename must be a plain file name"}
+    if result is not None and result not in RESULT_CODES:
+        return {"status": "invalid", "error": f"result must be one of {sorted(RESULT_CODES)}"}
+    if min_model_version is not None:
+        try:
+            min_model_version = int(min_model_version)
+        except (TypeError, ValueError):
+            return {"status": "invalid", "error": "min_model_version must be an integer"}
+    if ARCHIVE is None:
+        return {"path": None, "games": 0}
+    directory = os.path.join(DATA_DIR, "exports")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    games = ARCHIVE.export_pgn(path, ARCHIVE.select(result=result, min_model_version=min_model_version))
+    return {"path": path, "games": games}
 
-        if GAME_STATES_W and GAME_ACTIONS_W:
-            TRAINER.store_game(GAME_STATES_W, GAME_ACTIONS_W, reward_w)
-        if GAME_STATES_B and GAME_ACTIONS_B:
-            TRAINER.store_game(GAME_STATES_B, GAME_ACTIONS_B, reward_b)
+@eel.expose
+@timed("eel.get_search_stats")
+def get_search_stats(session_id: str = DEFAULT_SESSION):
+    """Nodes, nodes/sec and reuse of the last search in this session ({} if none)."""
+    _core()
+    session = SESSIONS.get(session_id)
+    return session.searcher.last_stats if session.searcher is not None else {}
 
-        GAME_STATES_W, GAME_ACTIONS_W, GAME_STATES_B, GAME_ACTIONS_B = [], [], [], []
-        GAMES_SINCE_TRAIN += 1
-        if GAMES_SINCE_TRAIN >= TRAIN_EVERY_N_GAMES:
-            loss = TRAINER.train_step()
-            record_training(loss)
-            GAMES_SINCE_TRAIN = 0
+@eel.expose
+def get_profile(reset: bool = False):
+    """
+    Latency histograms (count, mean/p50/p99/max ms) of every instrumented span:
+    eel calls, encode/forward/mask, train steps, checkpoint writes, lock waits.
+    """
+    spans = PROFILER.summary()
+    if reset:
+        PROFILER.reset()
+    return {"spans": spans, "sampling": sampling()}
 
-        # record game perf
-        record_game_result(res)
+@eel.expose
+def set_profiler(enabled: bool, interval_ms: float = None):
+    """
+    Turn the sampling profiler on/off. Turning it off writes a collapsed-stack
+    file under data/ and returns its path.
+    """
+    return set_sampling(enabled, interval_ms or None)
 
-        return f"game_over:{res}"
+@eel.expose
+def get_startup_report():
+    """Seconds spent in each startup phase (import, core, load_model, trainer, inference, warmup) and when each milestone was reached."""
+    return {**STARTUP.report(), "ready": STARTUP.ready("model")}
 
-    return move.uci()
+STARTUP.start(_initialize)
 
 # -----------------------
 # Start Eel UI
 # -----------------------
 if __name__ == "__main__":
-    # ensure models & data folders exist
-    os.makedirs("models", exist_ok=True)
-    os.makedirs("data", exist_ok=True)
+    # --eager: finish loading the model before serving the page (the old startup behaviour)
+    if "--eager" in sys.argv:
+        STARTUP.wait("model")
     # Option A — use system default browser (recommended)
     eel.start("index.html", size=(900, 900), block=True, mode="system")
 
@@ -0,0 +1,43 @@
+import chess
+import pytest
+import torch
+import torch.nn as nn
+
+from backend.arena import Arena, gate, load_player, play_games
+from backend.config import ACTION_SIZE
+from backend.utils import move_to_action
+
+
+class ScriptedModel(nn.Module):
+    """Same logits for every position: greedy play picks the highest-ranked legal move."""
+
+    def __init__(self, ranked_uci):
+        super().__init__()
+        logits = torch.full((ACTION_SIZE,), -1.0)
+        for rank, uci in enumerate(ranked_uci):
+            logits[move_to_action(chess.Move.from_uci(uci))] = 100.0 - rank
+        self.register_buffer("logits", logits)
+
+    def forward(self, x):
+        return self.logits.expand(x.shape[0], -1)
+
+
+def test_candidate_delivering_mate_is_scored():
+    # fool's mate: white plays f3, g4; black plays e5, then Qh4# once the diagonal opens
+    fools_mate = ScriptedModel(["d8h4", "f2f3", "e7e5", "g2g4"])
+    results = play_games(fools_mate, fools_mate, seed=0, num_games=2, opening_plies=0)
+    # game 0: candidate is white and gets mated; game 1: candidate is black and mates
+    assert results == [(0.0, 4), (1.0, 4)]
+
+
+def test_unloadable_checkpoints_fail_loudly(tmp_path):
+    served = tmp_path / "best_model.pth"
+    with pytest.raises(FileNotFoundError):
+        Arena(str(tmp_path / "typo.pth"), str(served), num_workers=1).run(num_games=2)
+    corrupt = tmp_path / "corrupt.pth"
+    corrupt.write_bytes(b"not a checkpoint")
+    with pytest.raises(Exception):
+        load_player(str(corrupt))
+    with pytest.raises(Exception):
+        gate(str(corrupt), str(served))
+    assert not served.exists()
@@ -0,0 +1,34 @@
+import torch
+
+from backend.checkpoint import CheckpointWriter
+from backend.model import build_model, checkpoint_step, load_model, model_from_checkpoint
+
+
+def _same_weights(a, b):
+    sa, sb = a.state_dict(), b.state_dict()
+    return sa.keys() == sb.keys() and all(torch.equal(sa[k].cpu(), sb[k].cpu()) for k in sa)
+
+
+def test_versioned_checkpoint_loads_as_a_model(tmp_path):
+    model = build_model("conv")
+    writer = CheckpointWriter(model, torch.optim.Adam(model.parameters()), directory=str(tmp_path))
+    writer.save_now(7)
+    path = str(tmp_path / "ckpt_00000007.pth")
+    assert writer.versions() == [path]
+
+    ckpt = torch.load(path, map_location="cpu")
+    assert checkpoint_step(ckpt) == 7
+    assert ckpt["optimizer"] is not None
+    assert _same_weights(model_from_checkpoint(ckpt), model)
+    assert _same_weights(load_model(path), model)
+    assert _same_weights(load_model(str(tmp_path / "latest_model.pth")), model)
+
+
+def test_legacy_versioned_checkpoint_still_loads(tmp_path):
+    # versioned files used to carry an empty state_dict and the weights under "model"
+    model = build_model("conv")
+    ckpt = torch.load(CheckpointWriter(model, directory=str(tmp_path)).save_now(3), map_location="cpu")
+    legacy = {**ckpt, "state_dict": {}, "model": ckpt["state_dict"]}
+    path = str(tmp_path / "ckpt_legacy.pth")
+    torch.save(legacy, path)
+    assert _same_weights(load_model(path), model)
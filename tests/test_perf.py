@@ -0,0 +1,38 @@
+import shutil
+
+import pytest
+import torch
+
+from backend.config import PERF_PARITY_TOLERANCE
+from backend.perf import bf16_supported, loss_parity, parity_batches, run_curve
+
+STEPS = 12
+BATCH = 32
+ARCH = "conv"
+
+
+@pytest.fixture(scope="module")
+def batches():
+    return parity_batches(STEPS, BATCH, seed=0)
+
+
+@pytest.fixture(scope="module")
+def baseline(batches):
+    return run_curve(batches, ARCH, seed=0, channels_last=False, bf16=False, compile_model=False)
+
+
+@pytest.mark.parametrize("mode", [
+    {"channels_last": True},
+    pytest.param({"bf16": True}, marks=pytest.mark.skipif(
+        not bf16_supported(torch.device("cpu")), reason="no native bf16 on this CPU")),
+    pytest.param({"compile_model": True}, marks=pytest.mark.skipif(
+        shutil.which("cc") is None, reason="torch.compile needs a C compiler")),
+], ids=["channels_last", "bf16", "compile"])
+def test_mode_tracks_eager_fp32(batches, baseline, mode):
+    perf = {"channels_last": False, "bf16": False, "compile_model": False, **mode}
+    candidate = run_curve(batches, ARCH, seed=0, **perf)
+    active = candidate["mode"]
+    assert (active["channels_last"], active["bf16"], active["compiled"]) == \
+        (perf["channels_last"], perf["bf16"], perf["compile_model"])     # no silent fallback to eager fp32
+    assert len(candidate["losses"]) == STEPS
+    assert loss_parity(baseline["losses"], candidate["losses"], window=4) <= PERF_PARITY_TOLERANCE
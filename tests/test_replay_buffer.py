@@ -0,0 +1,95 @@
+import chess
+import numpy as np
+import pytest
+import torch
+
+from backend.replay_buffer import ReplayBuffer
+from backend.sum_tree import SumTree
+from backend.utils import boards_to_tensor
+
+
+def _episode(n, rng):
+    return rng.integers(0, 2 ** 63, size=(n, 12), dtype=np.uint64), rng.integers(0, 4096, size=n)
+
+
+def test_sum_tree_totals_follow_updates():
+    tree = SumTree(5)                   # not a power of two: padded leaves stay at zero
+    tree.update([0, 1, 2, 3, 4], [1.0, 2.0, 3.0, 4.0, 5.0])
+    assert tree.total() == pytest.approx(15.0)
+    tree.update([1, 3], [0.0, 10.0])
+    assert tree.total() == pytest.approx(19.0)
+    assert tree.get([0, 1, 2, 3, 4]).tolist() == [1.0, 0.0, 3.0, 10.0, 5.0]
+    # every internal node is the sum of its children
+    inner = np.arange(1, tree.size)
+    assert np.allclose(tree.tree[inner], tree.tree[2 * inner] + tree.tree[2 * inner + 1])
+
+
+def test_sum_tree_samples_in_proportion_to_priority():
+    tree = SumTree(4)
+    tree.update([0, 1, 2, 3], [1.0, 0.0, 3.0, 6.0])
+    assert tree.find([0.0, 0.99, 1.0, 3.99, 4.0, 9.99]).tolist() == [0, 0, 2, 2, 3, 3]
+    counts = np.bincount(tree.sample(20000, rng=np.random.RandomState(0)), minlength=4)
+    assert counts[1] == 0
+    assert np.allclose(counts / counts.sum(), [0.1, 0.0, 0.3, 0.6], atol=0.01)
+
+
+def test_empty_buffer_returns_as_many_values_as_a_batch():
+    assert ReplayBuffer(4, 16, sampling="prioritized").sample(8) == ([], [], [], [], [])
+    assert ReplayBuffer(4, 16, sampling="uniform").sample(8) == ([], [], [])
+
+
+def test_evicted_positions_are_never_sampled():
+    rng = np.random.default_rng(0)
+    buffer = ReplayBuffer(capacity=4, max_positions=10, sampling="prioritized", alpha=1.0)
+    for n in (4, 4, 4):                 # the third episode wraps onto slots 8, 9, 0, 1 and evicts the first
+        buffer.add_packed(*_episode(n, rng), 1.0)
+    assert len(buffer) == 2 and buffer.num_positions() == 8
+    assert buffer.tree.get([2, 3]).tolist() == [0.0, 0.0]
+    keys = buffer.sample(512)[4].numpy()
+    assert set(keys[:, 0].tolist()) <= {4, 5, 6, 7, 8, 9, 0, 1}
+    assert set(keys[:, 1].tolist()) == {1, 2}
+
+
+def test_priority_updates_skip_stale_keys():
+    rng = np.random.default_rng(0)
+    buffer = ReplayBuffer(capacity=2, max_positions=8, sampling="prioritized", alpha=1.0)
+    buffer.add_packed(*_episode(4, rng), 1.0)
+    stale = buffer.sample(4)[4].numpy()
+    buffer.add_packed(*_episode(4, rng), 1.0)
+    buffer.add_packed(*_episode(4, rng), 1.0)      # overwrites the first episode's slots
+    before = buffer.tree.get(np.arange(8)).copy()
+    buffer.update_priorities(stale, np.full(len(stale), 100.0))
+    assert np.array_equal(buffer.tree.get(np.arange(8)), before)
+
+
+def test_sampling_and_is_weights_follow_priorities():
+    rng = np.random.default_rng(0)
+    buffer = ReplayBuffer(capacity=2, max_positions=8, sampling="prioritized", alpha=1.0, beta=1.0)
+    buffer.add_packed(*_episode(4, rng), 1.0)
+    buffer.add_packed(*_episode(4, rng), 1.0)
+    keys = np.stack([np.arange(8), buffer.episode_ids[:8]], axis=1)
+    losses = np.ones(8)
+    losses[5] = 9.0
+    buffer.update_priorities(keys, losses)
+    assert buffer.tree.total() == pytest.approx(16.0, rel=1e-3)
+
+    _, _, _, weights, sampled = buffer.sample(4000)
+    hot = sampled[:, 0].numpy() == 5
+    assert hot.mean() == pytest.approx(9 / 16, abs=0.03)
+    # IS weights (N * P)^-beta, normalized to a max of 1: the over-sampled position counts least
+    assert weights.max().item() == pytest.approx(1.0)
+    assert weights[hot].max().item() == pytest.approx(1 / 9, rel=1e-3)
+
+
+def test_positions_round_trip_through_the_packed_ring():
+    board, boards = chess.Board(), []
+    for uci in "e2e4 e7e5 g1f3 b8c6 f1b5 a7a6 b5c6 d7c6 e1g1 f7f6".split():
+        boards.append(board.copy(stack=False))
+        board.push_uci(uci)
+    states = boards_to_tensor(boards, device="cpu")
+    buffer = ReplayBuffer(capacity=1, max_positions=10, sampling="uniform")
+    buffer.add(list(states), list(range(10)), 0.5)
+    sampled, actions, rewards = buffer.sample(64)
+    assert sampled.dtype == states.dtype and sampled.shape == (64, 12, 8, 8)
+    assert torch.equal(sampled, states[actions])
+    assert torch.all(rewards == 0.5)
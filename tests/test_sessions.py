@@ -0,0 +1,34 @@
+import chess
+import gevent
+
+from backend.sessions import GameSession
+
+
+def test_session_lock_excludes_other_greenlets():
+    # eel runs calls as greenlets on one thread; ai_move yields (inference, search) while holding the lock
+    session = GameSession("s")
+    events = []
+
+    def ai_move():
+        with session.lock:
+            events.append("ai_move start")
+            gevent.sleep(0.01)
+            session.engine.make_move(chess.Move.from_uci("e2e4"))
+            events.append("ai_move end")
+
+    def reset_game():
+        with session.lock:
+            events.append("reset")
+            session.reset()
+
+    gevent.joinall([gevent.spawn(ai_move), gevent.spawn(reset_game)])
+    assert events == ["ai_move start", "ai_move end", "reset"]
+    assert session.engine.board.move_stack == []
+
+
+def test_session_lock_is_reentrant():
+    session = GameSession("s")
+    with session.lock:
+        with session.lock:
+            session.engine.make_move(chess.Move.from_uci("e2e4"))
+    assert len(session.engine.board.move_stack) == 1
@@ -0,0 +1,36 @@
+import pytest
+
+from backend.dataset import ShardedDataset
+from backend.game_archive import GameArchive
+from backend.opening_book import BookBuilder
+from backend.store_lock import StoreLockedError
+
+
+def test_dataset_has_a_single_writer(tmp_path):
+    directory = str(tmp_path / "dataset")
+    writer = ShardedDataset(directory, shard_positions=64)
+    with pytest.raises(StoreLockedError):
+        ShardedDataset(directory, shard_positions=64)
+    ShardedDataset(directory, readonly=True)        # readers are never blocked
+    writer.close()
+    ShardedDataset(directory, shard_positions=64).close()
+
+
+def test_archive_has_a_single_writer(tmp_path):
+    directory = str(tmp_path / "archive")
+    writer = GameArchive(directory, segment_games=16)
+    with pytest.raises(StoreLockedError):
+        GameArchive(directory, segment_games=16)
+    GameArchive(directory, readonly=True)
+    writer.close()
+    GameArchive(directory, segment_games=16).close()
+
+
+def test_opening_book_has_a_single_builder(tmp_path):
+    path = str(tmp_path / "book")
+    builder = BookBuilder(path)
+    with pytest.raises(StoreLockedError):
+        BookBuilder(path)
+    builder.build(min_weight=1)
+    builder.close()
+    BookBuilder(path, rebuild=True).close()
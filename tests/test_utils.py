@@ -0,0 +1,90 @@
+import random
+
+import chess
+import numpy as np
+
+from backend.config import ACTION_SIZE
+from backend.utils import (
+    ACTION_FROM,
+    ACTION_PROMO,
+    ACTION_TO,
+    action_to_move,
+    bitboards_to_planes,
+    board_bitboards,
+    boards_to_tensor,
+    legal_action_indices,
+    legal_move_masks,
+    move_to_action,
+    planes_to_bitboards,
+)
+
+
+def random_boards(n, seed=0, max_plies=120):
+    """Positions from random play, the start position first."""
+    rng = random.Random(seed)
+    boards = [chess.Board()]
+    while len(boards) < n:
+        board = chess.Board()
+        for _ in range(rng.randint(1, max_plies)):
+            if board.is_game_over():
+                break
+            board.push(rng.choice(list(board.legal_moves)))
+        boards.append(board)
+    return boards
+
+
+def test_bitboards_round_trip_through_planes():
+    boards = random_boards(64)
+    planes = boards_to_tensor(boards, device="cpu").numpy()
+    bitboards = planes_to_bitboards(planes)
+    assert bitboards.dtype == np.uint64 and bitboards.shape == (64, 12)
+    assert np.array_equal(bitboards, np.stack([board_bitboards(b) for b in boards]))
+    assert np.array_equal(bitboards_to_planes(bitboards), planes.astype(np.uint8))
+
+
+def test_planes_follow_board_orientation():
+    # row 0 of a plane is rank 8: the white king on e1 is the bottom row, file e
+    planes = boards_to_tensor([chess.Board()], device="cpu").numpy()[0]
+    assert planes[5, 7, 4] == 1 and planes[5].sum() == 1
+    assert planes[11, 0, 4] == 1 and planes[11].sum() == 1
+    assert planes[0, 6].sum() == 8 and planes[6, 1].sum() == 8
+
+
+def test_action_tables_match_the_encoder():
+    assert len(ACTION_FROM) == len(ACTION_TO) == len(ACTION_PROMO) == ACTION_SIZE
+    for move in (chess.Move.from_uci("e2e4"), chess.Move.from_uci("h8a1")):
+        a = move_to_action(move)
+        assert (ACTION_FROM[a], ACTION_TO[a], ACTION_PROMO[a]) == (move.from_square, move.to_square, 0)
+    promo = chess.Move.from_uci("c7c8n")
+    a = move_to_action(promo)
+    assert (ACTION_FROM[a], ACTION_TO[a], ACTION_PROMO[a]) == (promo.from_square, -1, chess.KNIGHT)
+
+
+def test_legal_moves_decode_back():
+    for board in random_boards(200, seed=1):
+        for move in board.legal_moves:
+            decoded = action_to_move(move_to_action(move), board)
+            assert board.is_legal(decoded)
+            # promotions keep only from-square and piece: a push and a capture to the same piece collide
+            assert decoded == move or (move.promotion and decoded.promotion == move.promotion
+                                       and decoded.from_square == move.from_square)
+
+
+def test_promotion_decodes_to_push_then_capture():
+    board = chess.Board("r1n1k3/1P6/8/8/8/8/8/4K3 w - - 0 1")        # b8 free: the push is preferred
+    assert action_to_move(move_to_action(chess.Move.from_uci("b7a8q")), board) == chess.Move.from_uci("b7b8q")
+    assert action_to_move(move_to_action(chess.Move.from_uci("b7c8r")), board) == chess.Move.from_uci("b7b8r")
+    board = chess.Board("rnn1k3/1P6/8/8/8/8/8/4K3 w - - 0 1")       # push blocked: a capture is left
+    assert action_to_move(move_to_action(chess.Move.from_uci("b7c8q")), board).uci() in ("b7a8q", "b7c8q")
+    board = chess.Board("1n2k3/1P6/8/8/8/8/8/4K3 w - - 0 1")        # nothing legal from b7
+    assert action_to_move(move_to_action(chess.Move.from_uci("b7b8q")), board) is None
+
+
+def test_batched_masks_match_per_board_legal_moves():
+    boards = random_boards(32, seed=2)
+    masks = legal_move_masks(boards, device="cpu")
+    assert masks.shape == (32, ACTION_SIZE)
+    for board, mask, idxs in zip(boards, masks, legal_move_masks(boards, sparse=True)):
+        expected = sorted({move_to_action(m) for m in board.legal_moves})
+        assert idxs.tolist() == expected == legal_action_indices(board).tolist()
+        assert np.flatnonzero(mask.numpy()).tolist() == expected
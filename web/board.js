@@ -4,6 +4,9 @@ let boardState = null;      // fen string
 let prevFenMap = null;
 const files = "abcdefgh";
 let dragging = null;        // { origin, imgEl, offsetX, offsetY }
+let moveHistory = [];       // SAN strings, mirrored from the backend
+// each tab plays its own game on the backend
+const SESSION_ID = (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : `s${Date.now()}${Math.random().toString(16).slice(2)}`;
 
 // Create the 8x8 board grid
 function createBoard() {
@@ -254,57 +257,14 @@ async function onPointerUp(e) {
     }
 
     // promotion check
+    let move = origin + dropSquare;
     if (needsPromotion(origEl.alt, dropSquare)) {
         const color = (origEl.alt === origEl.alt.toUpperCase()) ? "w" : "b";
-        const promo = await promptPromotion(color);
-        const move = origin + dropSquare + promo;
-        document.getElementById("status").textContent = `Trying ${move}`;
-        try {
-            const result = await eel.make_human_move(move)();
-            if (result === "invalid") {
-                document.getElementById("status").textContent = "Invalid move!";
-                origEl.style.opacity = "1";
-                return;
-            }
-            if (result.startsWith("game_over")) {
-                document.getElementById("status").textContent = result;
-                await refreshBoard();
-                return;
-            }
-            await refreshBoard();
-            await aiMove();
-        } catch (err) {
-            console.error("make_human_move error", err);
-            origEl.style.opacity = "1";
-        }
-        return;
+        move += await promptPromotion(color);
     }
 
-    // attempt move via backend (UCI origin+dest)
-    const move = origin + dropSquare;
-    document.getElementById("status").textContent = `Trying ${move}`;
-    try {
-        const result = await eel.make_human_move(move)();
-        if (result === "invalid") {
-            document.getElementById("status").textContent = "Invalid move!";
-            // restore original piece
-            origEl.style.opacity = "1";
-            return;
-        }
-
-        if (result.startsWith("game_over")) {
-            document.getElementById("status").textContent = result;
-            await refreshBoard();
-            return;
-        }
-
-        // successful human move — refresh and let AI play
-        await refreshBoard();
-        await aiMove();
-    } catch (err) {
-        console.error("make_human_move error", err);
-        origEl.style.opacity = "1";
-    }
+    // attempt move via backend (UCI origin+dest[+promo]); the AI reply comes back in the same call
+    await playMove(move, origEl);
 }
 
 // click-click fallback, handle promotions
@@ -337,92 +297,109 @@ async function onSquareClick(square) {
 
 async function makeHumanMove(move) {
     // kept for click-click fallback
-    let result = await eel.make_human_move(move)();
+    await playMove(move);
+}
 
-    if (result === "invalid") {
-        document.getElementById("status").textContent = "Invalid move!";
+
+// one backend round trip per ply: human move + AI reply + state delta
+async function playMove(move, origEl = null) {
+    document.getElementById("status").textContent = `Trying ${move}`;
+    let res;
+    try {
+        res = await eel.play_move(move, moveHistory.length, SESSION_ID)();
+    } catch (err) {
+        console.error("play_move error", err);
+        if (origEl) origEl.style.opacity = "1";
         return;
     }
 
-    if (result.startsWith("game_over")) {
-        document.getElementById("status").textContent = result;
-        await refreshBoard();
+    if (res.status === "invalid") {
+        document.getElementById("status").textContent = "Invalid move!";
+        // restore original piece
+        if (origEl) origEl.style.opacity = "1";
         return;
     }
 
-    // Human move was OK → refresh board & call AI
-    await refreshBoard();
-    await aiMove();
+    applyState(res);
+
+    if (res.status === "game_over") {
+        document.getElementById("status").textContent = `game_over:${res.result}`;
+    } else {
+        document.getElementById("status").textContent = `AI played ${res.ai}`;
+    }
 }
 
 
-async function aiMove() {
-    let aiMoveRes = await eel.ai_move()();
+// apply a play_move response: new position, SAN delta and performance
+function applyState(res) {
+    moveHistory = moveHistory.slice(0, res.since).concat(res.moves);
+    renderPieces(res.fen);
+    renderMoveList();
+    if (res.performance) renderPerformance(res.performance);
+    fadeBoard();
+}
 
-    if (aiMoveRes.startsWith("game_over")) {
-        document.getElementById("status").textContent = aiMoveRes;
-        await refreshBoard();
-        return;
+
+// add move list UI update (two-column style: white / black)
+function renderMoveList() {
+    const moves = moveHistory;
+    const list = document.getElementById("moves-list");
+    list.innerHTML = "";
+
+    for (let i = 0; i < moves.length; i += 2) {
+        const moveNumber = Math.floor(i / 2) + 1;
+        const whiteMove = moves[i] || "";
+        const blackMove = moves[i + 1] || "";
+        const li = document.createElement("li");
+        li.className = "move-row";
+        li.innerHTML = `<span class="move-num">${moveNumber}.</span>
+                        <span class="white-move">${whiteMove}</span>
+                        <span class="black-move">${blackMove}</span>`;
+        list.appendChild(li);
     }
+    // scroll to bottom
+    list.scrollTop = list.scrollHeight;
+}
+
 
-    document.getElementById("status").textContent = `AI played ${aiMoveRes}`;
-    await refreshBoard();
+function renderPerformance(perf) {
+    document.getElementById("stat-wins").textContent = perf.counts.wins;
+    document.getElementById("stat-losses").textContent = perf.counts.losses;
+    document.getElementById("stat-draws").textContent = perf.counts.draws;
+    document.getElementById("stat-total").textContent = perf.counts.total;
+
+    const recent = perf.recent_games || [];
+    const recentEl = document.getElementById("perf-recent");
+    recentEl.innerHTML = "<div style='margin-top:8px;font-size:12px;color:#cbd5e1;'>Recent</div>";
+    recent.slice().reverse().forEach(g => {
+        const d = new Date(g.ts * 1000);
+        const node = document.createElement("div");
+        node.style.fontSize = "12px";
+        node.style.opacity = "0.9";
+        node.textContent = `${d.toISOString().slice(0,19).replace("T"," ")} — ${g.result} (${g.moves} moves)`;
+        recentEl.appendChild(node);
+    });
 }
 
 
-// add move list UI update (two-column style: white / black)
 async function updateMoveList() {
     try {
-        const moves = await eel.get_moves()(); // array of SAN strings
-        const list = document.getElementById("moves-list");
-        list.innerHTML = "";
-
-        for (let i = 0; i < moves.length; i += 2) {
-            const moveNumber = Math.floor(i / 2) + 1;
-            const whiteMove = moves[i] || "";
-            const blackMove = moves[i + 1] || "";
-            const li = document.createElement("li");
-            li.className = "move-row";
-            li.innerHTML = `<span class="move-num">${moveNumber}.</span>
-                            <span class="white-move">${whiteMove}</span>
-                            <span class="black-move">${blackMove}</span>`;
-            list.appendChild(li);
-        }
-        // scroll to bottom
-        list.scrollTop = list.scrollHeight;
+        moveHistory = await eel.get_moves(SESSION_ID)(); // array of SAN strings
+        renderMoveList();
     } catch (e) {
         console.error("Failed to update moves:", e);
     }
 
     // update performance panel
     try {
-        const perf = await eel.get_performance()();
-        document.getElementById("stat-wins").textContent = perf.counts.wins;
-        document.getElementById("stat-losses").textContent = perf.counts.losses;
-        document.getElementById("stat-draws").textContent = perf.counts.draws;
-        document.getElementById("stat-total").textContent = perf.counts.total;
-
-        const recent = perf.recent_games || [];
-        const recentEl = document.getElementById("perf-recent");
-        recentEl.innerHTML = "<div style='margin-top:8px;font-size:12px;color:#cbd5e1;'>Recent</div>";
-        recent.slice().reverse().forEach(g => {
-            const d = new Date(g.ts * 1000);
-            const node = document.createElement("div");
-            node.style.fontSize = "12px";
-            node.style.opacity = "0.9";
-            node.textContent = `${d.toISOString().slice(0,19).replace("T"," ")} — ${g.result} (${g.moves} moves)`;
-            recentEl.appendChild(node);
-        });
+        renderPerformance(await eel.get_performance()());
     } catch (e) {
         console.warn("perf fetch failed", e);
     }
 }
 
 
-async function refreshBoard() {
-    let fen = await eel.get_board_fen()();
-    renderPieces(fen);
-    updateMoveList();
+function fadeBoard() {
     const board = document.getElementById("board");
     board.classList.remove("board-fade");
     void board.offsetWidth;
@@ -430,6 +407,15 @@ async function refreshBoard() {
 }
 
 
+// full resync (initial load / reset); moves go through playMove
+async function refreshBoard() {
+    let fen = await eel.get_board_fen(SESSION_ID)();
+    renderPieces(fen);
+    updateMoveList();
+    fadeBoard();
+}
+
+
 // Parallax: update CSS vars on mouse move for subtle depth
 window.addEventListener("mousemove", (e) => {
     const cx = window.innerWidth / 2;
@@ -451,7 +437,7 @@ document.addEventListener("DOMContentLoaded", () => {
     const btn = document.getElementById("resetBtn");
     if (btn) {
         btn.addEventListener("click", async () => {
-            await eel.reset_game()();
+            await eel.reset_game(SESSION_ID)();
             await refreshBoard();
             document.getElementById("status").textContent = "Game reset";
         });